@@ -0,0 +1,460 @@
+"""
+Output side of extract_object_crops.py.
+
+CropWriter encodes and writes crops on a bounded thread pool, so image compression
+runs in parallel with video decoding. OpenCV releases the GIL while encoding, so
+the threads scale across cores. When max_pending crops are queued, submit() blocks
+(backpressure) to bound the memory held by queued crops.
+
+CropWriter writes one image file per crop. ShardedCropWriter instead packs crops into
+size-bounded tar shards in WebDataset layout (<key>.<ext> plus <key>.json per crop) and
+writes an index with the shard and byte offset of every crop, so CropShardReader can
+read any crop with a single pread, without scanning or unpacking the tar files. Reruns
+append new shards; old shards left mostly stale by a rerun are compacted on close().
+
+CropManifest records which crops an output directory holds, keyed by crop_key (video_id,
+mask_id, frame and bbox), and which scene-graph entries refer to each of them. Reruns only extract
+crops whose key is new, and entries referring to the same crop share one stored image.
+"""
+
+import io
+import os
+import glob
+import hashlib
+import json
+import time
+import tarfile
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+import cv2
+import numpy as np
+
+
+# format -> (file extension, OpenCV quality/compression flag, default value)
+CROP_FORMATS = {
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION, 3),
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, 95),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, 90),
+}
+
+
+def encode_crop(crop: np.ndarray, fmt: str = "png", quality: Optional[int] = None) -> bytes:
+    """
+    Encode a BGR crop.
+
+    Args:
+        crop: BGR image
+        fmt: One of CROP_FORMATS
+        quality: PNG compression level (0-9) or JPEG/WebP quality (0-100); format default if None
+    """
+    ext, flag, default = CROP_FORMATS[fmt]
+    ok, buffer = cv2.imencode(ext, crop, [flag, default if quality is None else quality])
+    if not ok:
+        raise ValueError(f"Could not encode crop as {fmt}")
+    return buffer.tobytes()
+
+
+class CropWriter:
+    """Encodes crops and writes them to a directory on a bounded thread pool."""
+
+    def __init__(self, output_dir: str, fmt: str = "png", quality: Optional[int] = None,
+                 num_threads: int = 4, max_pending: int = 64, executor: Optional[Executor] = None):
+        """
+        Args:
+            output_dir: Directory the crop files are written to
+            fmt: Image format, one of CROP_FORMATS
+            quality: PNG compression level or JPEG/WebP quality (format default if None)
+            num_threads: Encoder threads
+            max_pending: Crops that may be queued before submit() blocks
+            executor: Existing thread pool to encode on (e.g. one per batch worker process);
+                it is not shut down by close(). If None, a pool of num_threads is created.
+        """
+        if fmt not in CROP_FORMATS:
+            raise ValueError(f"Unknown crop format {fmt!r}; expected one of {list(CROP_FORMATS)}")
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.quality = quality
+        self.extension = CROP_FORMATS[fmt][0]
+        self.num_threads = num_threads
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._owns_pool = executor is None
+        self._pool = ThreadPoolExecutor(max_workers=num_threads) if executor is None else executor
+        self._pending = set()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._errors = []
+        self.stats = {"crops": 0, "bytes": 0, "encode_seconds": 0.0, "write_seconds": 0.0, "blocked_seconds": 0.0}
+        self._start = time.perf_counter()
+
+    def submit(self, name: str, crop: np.ndarray, metadata: Optional[Dict] = None) -> str:
+        """
+        Queue a crop for encoding; blocks while max_pending crops are in flight.
+
+        Args:
+            name: File name without extension
+            crop: BGR image (copied, so the source frame can be released)
+            metadata: Fields stored with the crop (used by ShardedCropWriter)
+
+        Returns:
+            Path the crop will be written to
+        """
+        path = os.path.join(self.output_dir, name + self.extension)
+        self._queue(path, crop, metadata)
+        return path
+
+    def _queue(self, name: str, crop: np.ndarray, metadata: Optional[Dict]):
+        # Crops are views into the decoded frame; copy so queued work does not pin whole frames
+        crop = np.ascontiguousarray(crop)
+
+        wait_start = time.perf_counter()
+        self._slots.acquire()
+        self.stats["blocked_seconds"] += time.perf_counter() - wait_start
+
+        future = self._pool.submit(self._encode_and_write, name, crop, metadata)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+
+    def _encode_and_write(self, name: str, crop: np.ndarray, metadata: Optional[Dict]):
+        encode_start = time.perf_counter()
+        data = encode_crop(crop, self.fmt, self.quality)
+        write_start = time.perf_counter()
+        self._store(name, data, metadata)
+        write_end = time.perf_counter()
+        with self._lock:
+            self.stats["crops"] += 1
+            self.stats["bytes"] += len(data)
+            self.stats["encode_seconds"] += write_start - encode_start
+            self.stats["write_seconds"] += write_end - write_start
+
+    def _store(self, path: str, data: bytes, metadata: Optional[Dict]):
+        """Write one encoded crop; runs on the encoder threads."""
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def _finished(self, future):
+        self._slots.release()
+        with self._lock:
+            self._pending.discard(future)
+            if future.exception() is not None:
+                self._errors.append(future.exception())
+
+    def close(self):
+        """Wait for all queued crops; re-raises the first encoding or write error."""
+        errors = []
+        if self._owns_pool:
+            # Joins the encoder threads, so every done-callback has run
+            self._pool.shutdown(wait=True)
+        else:
+            # _finished may still be running for these after wait() returns, so take their
+            # errors directly; futures missing from the snapshot already recorded theirs
+            with self._lock:
+                pending = list(self._pending)
+            done, _ = wait(pending)
+            errors = [future.exception() for future in done if future.exception() is not None]
+        self.stats["wall_seconds"] = time.perf_counter() - self._start
+        with self._lock:
+            errors = self._errors + [error for error in errors if error not in self._errors]
+        if errors:
+            raise errors[0]
+
+    def report(self):
+        """Print crops written, throughput and how long the decoder waited on the encoders."""
+        stats = self.stats
+        wall = stats.get("wall_seconds", time.perf_counter() - self._start)
+        rate = stats["crops"] / wall if wall > 0 else 0.0
+        print(f"Crop writer ({self.fmt}, {self.num_threads} threads): {stats['crops']} crops, "
+              f"{stats['bytes'] / 1024**2:.1f} MB in {wall:.1f}s ({rate:.1f} crops/s)")
+        print(f"  encode {stats['encode_seconds']:.1f}s, write {stats['write_seconds']:.1f}s (summed over threads), "
+              f"decoder blocked {stats['blocked_seconds']:.1f}s")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+SHARD_INDEX_FIELDS = ("key", "mask_id", "object_name", "action", "time", "frame", "bbox", "shard", "offset", "size")
+
+
+class ShardedCropWriter(CropWriter):
+    """
+    CropWriter that packs crops into tar shards of at most max_shard_bytes.
+
+    Shards are <output_dir>/crops-NNNNNN.tar. close() writes <output_dir>/index.json or
+    index.parquet with one record per crop: the metadata passed to submit() (mask_id,
+    object_name, action, time, frame, bbox) plus key, shard, offset and size, where offset
+    is the byte position of the image data inside the shard.
+
+    Shards are append-only: crops superseded by a rerun stay in their old shard. On close(),
+    old shards whose live crops fill less than compact_below of the file are compacted (their
+    live crops are copied into the new shards under the same keys and the old shard is
+    deleted), so stale data does not accumulate over reruns.
+    """
+
+    def __init__(self, output_dir: str, fmt: str = "png", quality: Optional[int] = None,
+                 num_threads: int = 4, max_pending: int = 64, executor: Optional[Executor] = None,
+                 max_shard_bytes: int = 256 * 1024**2, index_format: str = "json",
+                 existing_records: Optional[List[Dict]] = None, compact_below: float = 0.5):
+        """
+        Args:
+            output_dir: Directory the shards and the index are written to
+            fmt, quality, num_threads, max_pending, executor: As for CropWriter
+            max_shard_bytes: A new shard is started before a crop would make the current one larger
+            index_format: "json" or "parquet" (needs pandas with pyarrow)
+            existing_records: Index records of crops kept from a previous run. Their shards are
+                left untouched and new crops go to new shards; shards no record refers to any
+                more are deleted on close().
+            compact_below: Live fraction of an old shard below which close() compacts it; 0 disables
+        """
+        if index_format not in ("json", "parquet"):
+            raise ValueError(f"Unknown index format {index_format!r}; expected json or parquet")
+        if index_format == "parquet" and not PANDAS_AVAILABLE:
+            raise ImportError("pandas is required for a parquet crop index")
+        super().__init__(output_dir, fmt, quality, num_threads, max_pending, executor)
+        self.max_shard_bytes = max_shard_bytes
+        self.index_format = index_format
+        self.records: List[Dict] = list(existing_records or [])
+        self._shard_lock = threading.Lock()
+        self._shard_id = max((int(r["shard"][len("crops-"):-len(".tar")]) for r in self.records), default=-1)
+        self._first_new_shard = self._shard_id + 1
+        self._tar = None
+        self.compact_below = compact_below
+        self.compacted_shards = 0
+
+    def submit(self, name: str, crop: np.ndarray, metadata: Optional[Dict] = None) -> str:
+        """
+        Queue a crop for encoding and appending to the current shard.
+
+        Args:
+            name: Sample key; dots are replaced because WebDataset splits keys at the first dot
+            crop: BGR image
+            metadata: Index fields of the crop, also stored as <key>.json in the shard
+
+        Returns:
+            The sample key
+        """
+        key = name.replace('.', '_')
+        self._queue(key, crop, metadata)
+        return key
+
+    def _shard_name(self, shard_id: int) -> str:
+        return f"crops-{shard_id:06d}.tar"
+
+    def _add_member(self, name: str, data: bytes) -> int:
+        """Append a file to the open shard; returns the offset of its data."""
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        header_size = len(info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors))
+        offset = self._tar.offset + header_size
+        self._tar.addfile(info, io.BytesIO(data))
+        return offset
+
+    @staticmethod
+    def _sidecar(record: Dict) -> bytes:
+        return json.dumps({k: v for k, v in record.items() if k not in ("shard", "offset", "size")},
+                          default=str).encode('utf-8')
+
+    def _store(self, key: str, data: bytes, metadata: Optional[Dict]):
+        record = {field: None for field in SHARD_INDEX_FIELDS}
+        record.update(metadata or {})
+        record["key"] = key
+        sidecar = self._sidecar(record)
+        with self._shard_lock:
+            sample_bytes = len(data) + len(sidecar) + 4 * tarfile.BLOCKSIZE
+            if self._tar is None or (self._tar.offset > 0 and
+                                     self._tar.offset + sample_bytes > self.max_shard_bytes):
+                self._roll_shard()
+            record.update(key=key, shard=self._shard_name(self._shard_id), size=len(data))
+            record["offset"] = self._add_member(key + self.extension, data)
+            self._add_member(key + ".json", sidecar)
+            self.records.append(record)
+
+    def _roll_shard(self):
+        if self._tar is not None:
+            self._tar.close()
+        self._shard_id += 1
+        self._tar = tarfile.open(os.path.join(self.output_dir, self._shard_name(self._shard_id)), 'w',
+                                 format=tarfile.PAX_FORMAT)
+
+    def _live_bytes(self, record: Dict) -> int:
+        """Upper bound of the bytes a crop occupies in its shard: padded data and sidecar plus headers."""
+        padded = lambda n: -(-n // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        # Up to 3 header blocks per member (a PAX header is added for long names)
+        return padded(record["size"]) + padded(len(self._sidecar(record))) + 6 * tarfile.BLOCKSIZE
+
+    def _compact(self):
+        """Copy the live crops of sparse old shards into the new shards; the old shards become unreferenced."""
+        old_shards = {}
+        for record in self.records:
+            if int(record["shard"][len("crops-"):-len(".tar")]) < self._first_new_shard:
+                old_shards.setdefault(record["shard"], []).append(record)
+        for shard, records in sorted(old_shards.items()):
+            path = os.path.join(self.output_dir, shard)
+            if sum(self._live_bytes(r) for r in records) >= self.compact_below * os.path.getsize(path):
+                continue
+            samples = []
+            with open(path, 'rb') as f:
+                for record in records:
+                    f.seek(record["offset"])
+                    samples.append((record, f.read(record["size"])))
+            self.records = [r for r in self.records if r["shard"] != shard]
+            for record, data in samples:
+                self._store(record["key"], data,
+                            {k: v for k, v in record.items() if k not in ("key", "shard", "offset", "size")})
+            self.compacted_shards += 1
+
+    def close(self):
+        """Wait for all queued crops, compact sparse old shards, close the last shard and write the index."""
+        try:
+            super().close()
+            if self.compact_below > 0:
+                self._compact()
+        finally:
+            if self._tar is not None:
+                self._tar.close()
+                self._tar = None
+        self.records.sort(key=lambda r: (r["shard"], r["offset"]))
+        write_shard_index(self.output_dir, self.records, self.index_format)
+
+        referenced = {record["shard"] for record in self.records}
+        for path in glob.glob(os.path.join(self.output_dir, "crops-*.tar")):
+            if os.path.basename(path) not in referenced:
+                os.remove(path)
+
+    def report(self):
+        super().report()
+        print(f"  {self._shard_id + 1 - self._first_new_shard} new shards, {self.compacted_shards} compacted, "
+              f"index: {self.index_format}")
+
+
+def write_shard_index(output_dir: str, records: List[Dict], index_format: str = "json"):
+    """Write the crop index of a shard directory atomically."""
+    if index_format == "parquet":
+        path = os.path.join(output_dir, "index.parquet")
+        pd.DataFrame(records, columns=list(SHARD_INDEX_FIELDS)).to_parquet(path + ".tmp", index=False)
+    else:
+        path = os.path.join(output_dir, "index.json")
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_shard_index(output_dir: str) -> List[Dict]:
+    """Records of index.parquet or index.json in a shard directory."""
+    parquet_path = os.path.join(output_dir, "index.parquet")
+    if os.path.exists(parquet_path):
+        if not PANDAS_AVAILABLE:
+            raise ImportError("pandas is required to read a parquet crop index")
+        records = pd.read_parquet(parquet_path).to_dict("records")
+        for record in records:
+            record["bbox"] = list(record["bbox"]) if record["bbox"] is not None else None
+        return records
+    with open(os.path.join(output_dir, "index.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class CropShardReader:
+    """Random access to the crops of a ShardedCropWriter output directory."""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.records = load_shard_index(output_dir)
+        self._by_key = {record["key"]: record for record in self.records}
+        self._by_mask = {}
+        for record in self.records:
+            self._by_mask.setdefault(record["mask_id"], []).append(record)
+        self._fds = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def keys(self) -> List[str]:
+        return list(self._by_key)
+
+    def find(self, mask_id: str) -> List[Dict]:
+        """Index records of all crops of a mask."""
+        return self._by_mask.get(mask_id, [])
+
+    def get_bytes(self, key: str) -> bytes:
+        """Encoded image of a crop."""
+        record = self._by_key[key]
+        fd = self._fds.get(record["shard"])
+        if fd is None:
+            fd = os.open(os.path.join(self.output_dir, record["shard"]), os.O_RDONLY)
+            self._fds[record["shard"]] = fd
+        return os.pread(fd, int(record["size"]), int(record["offset"]))
+
+    def get_image(self, key: str) -> np.ndarray:
+        """Decoded BGR crop."""
+        return cv2.imdecode(np.frombuffer(self.get_bytes(key), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def close(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+CROP_MANIFEST_NAME = "crop_manifest.json"
+
+
+def crop_key(video_id: str, mask_id: str, frame_number: int, bbox) -> str:
+    """Identity of a stored crop: a changed bbox or frame of a mask gives a new key."""
+    return f"{video_id}@{mask_id}@{int(frame_number)}@" + ",".join(f"{float(v):.2f}" for v in bbox)
+
+
+def crop_key_tag(key: str) -> str:
+    """Short hash of a crop_key, so crops of one mask and frame with different boxes get distinct names."""
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=4).hexdigest()
+
+
+class CropManifest:
+    """
+    Crops stored in an output directory, for incremental reruns.
+
+    <output_dir>/crop_manifest.json maps crop_key to the crop's mask_id, frame, bbox, where
+    it is stored (file name, or sample key of a shard) and the scene-graph references to it
+    (object_name, action, time). The manifest is only reused for the same video and config
+    (output format, image format, quality); otherwise it starts empty.
+    """
+
+    def __init__(self, output_dir: str, video_id: str, config: Dict):
+        self.path = os.path.join(output_dir, CROP_MANIFEST_NAME)
+        self.video_id = video_id
+        self.config = config
+        self.crops: Dict[str, Dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("video_id") == video_id and data.get("config") == config:
+                self.crops = data["crops"]
+            else:
+                print(f"Crop manifest {self.path} is for a different video or config; extracting all crops")
+
+    def stored(self, key: str) -> Optional[str]:
+        """Where the crop is stored, or None if it is not in the manifest."""
+        entry = self.crops.get(key)
+        return entry["stored"] if entry else None
+
+    def save(self):
+        """Write the manifest atomically."""
+        with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"video_id": self.video_id, "config": self.config, "crops": self.crops}, f)
+        os.replace(self.path + ".tmp", self.path)
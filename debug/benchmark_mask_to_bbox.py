@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark mask-to-bbox conversion as done in the dense annotation loops.
+
+Compares the per-object path (threshold, copy the full mask to the host, np.where)
+with the batched masks_to_bboxes from mask_utils on random SAM 2-shaped logits.
+Usage: python benchmark_mask_to_bbox.py [--device cuda] [--num_objects 30]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mask_utils import masks_to_bboxes
+
+
+def per_object_bboxes(out_mask_logits):
+    """The original per-object conversion from generate_dense_annotations*.py."""
+    bboxes = []
+    for i in range(out_mask_logits.shape[0]):
+        mask = (out_mask_logits[i] > 0.0).cpu().numpy()
+        if mask.any():
+            y, x = np.where(mask[0])
+            bboxes.append([float(np.min(x)), float(np.min(y)), float(np.max(x)), float(np.max(y))])
+        else:
+            bboxes.append(None)
+    return bboxes
+
+
+def batched_bboxes(out_mask_logits):
+    bboxes, valid = masks_to_bboxes(out_mask_logits)
+    return [[float(v) for v in bbox] if is_valid else None for bbox, is_valid in zip(bboxes, valid)]
+
+
+def make_logits(num_objects, height, width, device):
+    """Random logits with one blob per object and a few empty masks."""
+    logits = torch.full((num_objects, 1, height, width), -10.0)
+    rng = np.random.default_rng(0)
+    for i in range(num_objects):
+        if i % 7 == 6:
+            continue  # empty mask
+        h, w = rng.integers(10, height // 3), rng.integers(10, width // 3)
+        y, x = rng.integers(0, height - h), rng.integers(0, width - w)
+        logits[i, 0, y:y + h, x:x + w] = 5.0
+    return logits.to(device)
+
+
+def time_fn(fn, logits, repeats, device):
+    fn(logits)  # warm-up
+    if device == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(logits)
+    if device == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mask-to-bbox conversion")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--num_objects", type=int, default=30)
+    parser.add_argument("--height", type=int, default=720, help="Mask height (1408x1408 video at scale 0.5 ~ 704)")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    logits = make_logits(args.num_objects, args.height, args.width, args.device)
+    assert per_object_bboxes(logits) == batched_bboxes(logits), "Batched bboxes differ from per-object bboxes"
+    # A frame without tracked objects
+    empty = logits[:0]
+    assert per_object_bboxes(empty) == batched_bboxes(empty) == [], "Empty frames must give no bboxes"
+
+    print(f"{args.num_objects} objects, {args.height}x{args.width} masks on {args.device}, {args.repeats} repeats")
+    t_per_object = time_fn(per_object_bboxes, logits, args.repeats, args.device)
+    t_batched = time_fn(batched_bboxes, logits, args.repeats, args.device)
+    print(f"  Per-object (full mask transfer): {t_per_object * 1000:.2f} ms/frame")
+    print(f"  Batched (N x 4 transfer):        {t_batched * 1000:.2f} ms/frame")
+    print(f"  Speedup: {t_per_object / t_batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
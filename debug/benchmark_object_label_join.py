@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the usage label / scene-graph event joins of process_all_object_labels.
+
+Checks that the bisect index join and the pandas merge return the same object labels, on
+synthetic labels and events and on the edge cases of a video without usage labels and/or
+scene-graph events, then times both.
+Usage: python benchmark_object_label_join.py [--num_objects 60] [--num_labels 3000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import process_all_object_labels
+from process_all_object_labels import combine_object_labels_from_usage_labels, combine_object_labels_vectorized
+
+
+def make_video(num_objects, num_labels, num_events, duration=3600.0, seed=0):
+    """Random usage labels, scene-graph events and mask fixtures of one video."""
+    rng = random.Random(seed)
+    objects = [f"object{i}" for i in range(num_objects)]
+    labels = []
+    for _ in range(num_labels):
+        start = rng.uniform(0, duration)
+        labels.append({
+            "object_name": rng.choice(objects),
+            "time_start": start,
+            "time_end": start + rng.uniform(1, 120),
+            "llm_response_json": {"is_used": rng.random() < 0.5, "explanation": ""},
+        })
+    scene_graphs = [{"time": 0.0, "action": "INITIAL", "object_name": None, "mask_id": None}]
+    mask_fixtures = {}
+    for i in range(num_events):
+        mask_id = f"mask{i}" if rng.random() < 0.9 else None
+        scene_graphs.append({"time": rng.uniform(0, duration), "action": rng.choice(["PICK", "DROP"]),
+                             "object_name": rng.choice(objects), "mask_id": mask_id})
+        if mask_id is not None and rng.random() < 0.9:
+            mask_fixtures[mask_id] = {"frame_number": i, "bbox": [0, 0, 1, 1]}
+    scene_graphs.sort(key=lambda scene_graph: scene_graph["time"])
+    return labels, scene_graphs, mask_fixtures
+
+
+def time_fn(fn, video, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(*video)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the object label joins")
+    parser.add_argument("--num_objects", type=int, default=60)
+    parser.add_argument("--num_labels", type=int, default=3000)
+    parser.add_argument("--num_events", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    process_all_object_labels.VERBOSE = False
+
+    labels, scene_graphs, mask_fixtures = make_video(args.num_objects, args.num_labels, args.num_events)
+    cases = {
+        "synthetic": (labels, scene_graphs, mask_fixtures),
+        "no labels, no events": ([], [], {}),
+        "no labels": ([], scene_graphs, mask_fixtures),
+        "no events": (labels, [], {}),
+        "only INITIAL": (labels, scene_graphs[:1], {}),
+    }
+    for name, video in cases.items():
+        assert combine_object_labels_from_usage_labels(*video) == combine_object_labels_vectorized(*video), \
+            f"Joins differ on {name}"
+    print(f"Joins agree on: {', '.join(cases)}")
+
+    video = cases["synthetic"]
+    print(f"{args.num_labels} labels, {args.num_events} events, {args.num_objects} objects, {args.repeats} repeats")
+    t_index = time_fn(combine_object_labels_from_usage_labels, video, args.repeats)
+    t_pandas = time_fn(combine_object_labels_vectorized, video, args.repeats)
+    print(f"  Bisect index join: {t_index * 1000:.1f} ms")
+    print(f"  Pandas merge join: {t_pandas * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
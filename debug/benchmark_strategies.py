@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Compare the dense annotation tracking strategies on the same video.
+
+Runs dense_annotation_engine with each --strategies entry (full, proxy, windowed) into its
+own output directory under --output_dir, with one shared predictor, and prints wall time,
+time per main stage, peak GPU memory and agreement of the bboxes with the first strategy
+(mean IoU over (frame, assoc_id) pairs both produced, and coverage of the reference pairs).
+Usage: python benchmark_strategies.py --video_id P01-20240202-171220 [--strategies proxy,windowed]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dense_annotation_engine import (
+    DenseAnnotationEngine, STRATEGIES, add_processing_args, validate_processing_args, resolve_video_path
+)
+from dense_annotation_utils import bbox_iou
+
+
+def load_boxes(path):
+    """{(frame_number, assoc_id): bbox} from a dense annotations file."""
+    boxes = {}
+    with open(path, 'r') as f:
+        for line in f:
+            frame = json.loads(line)
+            for obj in frame["objects"]:
+                boxes[(frame["frame_number"], obj["assoc_id"])] = obj["bbox"]
+    return boxes
+
+
+def compare_boxes(reference, boxes):
+    """Mean IoU over shared keys and the fraction of reference keys present in boxes."""
+    shared = [key for key in reference if key in boxes]
+    if not shared:
+        return 0.0, 0.0
+    mean_iou = sum(bbox_iou(reference[key], boxes[key]) for key in shared) / len(shared)
+    return mean_iou, len(shared) / len(reference)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dense annotation strategies on one video")
+    parser.add_argument("--video_id", type=str, required=True)
+    parser.add_argument("--strategies", type=str, default="full,proxy,windowed",
+                        help="Comma-separated strategies; the first one is the IoU reference")
+    add_processing_args(parser)
+    parser.set_defaults(output_dir="outputs/benchmark_strategies")
+    args = parser.parse_args()
+    validate_processing_args(parser, args)
+
+    strategies = [name.strip() for name in args.strategies.split(',') if name.strip()]
+    for name in strategies:
+        if name not in STRATEGIES:
+            parser.error(f"Unknown strategy {name!r}; expected one of {list(STRATEGIES)}")
+
+    args.video_path = resolve_video_path(args.video_path, args.video_id)
+    args.resume = False
+    with open(args.assoc_info, 'r') as f:
+        assoc_info = json.load(f)
+    with open(args.mask_info, 'r') as f:
+        mask_info = json.load(f)
+
+    engine = None
+    results = {}
+    for name in strategies:
+        run_args = argparse.Namespace(**vars(args))
+        run_args.strategy = name
+        run_args.output_dir = os.path.join(args.output_dir, name)
+        if engine is None:
+            engine = DenseAnnotationEngine(run_args, assoc_info, mask_info)
+        engine.args = run_args
+
+        print(f"\n{'#'*60}\nSTRATEGY: {name}\n{'#'*60}")
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+        start = time.perf_counter()
+        stages = engine.process_video() or {}
+        wall = time.perf_counter() - start
+        peak_gb = torch.cuda.max_memory_allocated() / 1024**3 if torch.cuda.is_available() else float("nan")
+
+        output_file = os.path.join(run_args.output_dir, f"dense_annotations_{args.video_id}.jsonl")
+        results[name] = {
+            "wall": wall,
+            "stages": stages,
+            "peak_gb": peak_gb,
+            "boxes": load_boxes(output_file) if os.path.exists(output_file) else {},
+        }
+
+    reference = results[strategies[0]]["boxes"]
+    print(f"\nStrategy comparison for {args.video_id} (reference: {strategies[0]})")
+    print(f"{'strategy':<10} {'wall s':>9} {'segment s':>10} {'init s':>8} {'track s':>9} "
+          f"{'post s':>8} {'peak GB':>8} {'boxes':>7} {'mIoU':>6} {'cover':>6}")
+    for name in strategies:
+        result = results[name]
+        stage_seconds = lambda *keys: sum(result["stages"].get(key, {}).get("seconds", 0.0) for key in keys)
+        mean_iou, coverage = compare_boxes(reference, result["boxes"])
+        print(f"{name:<10} {result['wall']:9.1f} {stage_seconds('segment'):10.1f} "
+              f"{stage_seconds('init_state'):8.1f} {stage_seconds('track'):9.1f} "
+              f"{stage_seconds('bbox', 'rle', 'results', 'checkpoint', 'merge'):8.1f} "
+              f"{result['peak_gb']:8.2f} {len(result['boxes']):7d} {mean_iou:6.3f} {coverage:6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,265 @@
 #!/usr/bin/env python3
-"""Simple script to count tokens for system prompt, input prompt, and output response in JSONL files."""
+"""
+Token statistics of object usage labeling runs (label_object_usage_llm.py outputs).
 
-import json
+For every run directory, counts the tokens of the system prompt, the input (user prompt plus
+in-context examples) and the output response of each labeled entry, and summarizes them as
+totals, mean and percentiles. Files are processed in parallel; each worker tokenizes a
+repeated string (system prompt, examples) only once, memoized by its hash, and keeps exact
+integer histograms instead of per-entry lists, which are merged per run. The summary is
+written as JSON, one record per run with the model/config parsed from the run directory name,
+to size num_ctx and estimate run cost.
+
+Usage:
+    python count_input_output_tokens.py "../outputs/object_usage_labels*" --output token_stats.json
+"""
+
+import os
+import re
 import glob
+import json
+import hashlib
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
 
 try:
     import tiktoken
-    encoding = tiktoken.get_encoding("cl100k_base")
-    def count_tokens(text):
-        if not text:
-            return 0
-        if not isinstance(text, str):
-            text = str(text)
-        return len(encoding.encode(text))
+    TIKTOKEN_AVAILABLE = True
 except ImportError:
-    def count_tokens(text):
+    TIKTOKEN_AVAILABLE = False
+
+try:
+    from transformers import AutoTokenizer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+
+
+# gpt-oss uses the o200k_harmony encoding; older tiktoken releases only have the others
+DEFAULT_TOKENIZER = "tiktoken:o200k_harmony"
+TIKTOKEN_FALLBACKS = ["o200k_harmony", "o200k_base", "cl100k_base"]
+COUNTS = ["system", "input", "output", "total"]
+PERCENTILES = [50, 90, 95, 99]
+
+
+class TokenCounter:
+    """Token counts of strings, memoized by a hash of the text."""
+
+    def __init__(self, tokenizer: str = DEFAULT_TOKENIZER):
+        """
+        Args:
+            tokenizer: "tiktoken:<encoding>", "hf:<model name>" or "estimate:chars/4". If the tokenizer cannot be
+                loaded (library missing, unknown encoding or model, download failure), a tiktoken
+                tokenizer falls back to the other tiktoken encodings and then, like an hf
+                tokenizer, to the len(text) // 4 estimate, with a warning naming the fallback
+        """
+        self._encode = None
+        self.name = "estimate:chars/4"
+        kind, _, name = tokenizer.partition(":")
+        errors = []
+        if kind == "hf":
+            if not TRANSFORMERS_AVAILABLE:
+                errors.append("transformers is not installed")
+            else:
+                try:
+                    hf_tokenizer = AutoTokenizer.from_pretrained(name)
+                    self._encode = lambda text: hf_tokenizer.encode(text, add_special_tokens=False)
+                    self.name = tokenizer
+                except Exception as e:
+                    errors.append(f"{name}: {e!r}")
+        elif kind == "tiktoken":
+            if not TIKTOKEN_AVAILABLE:
+                errors.append("tiktoken is not installed")
+            else:
+                for encoding_name in [name] + [e for e in TIKTOKEN_FALLBACKS if e != name]:
+                    try:
+                        encoding = tiktoken.get_encoding(encoding_name)
+                    except Exception as e:
+                        errors.append(f"{encoding_name}: {e!r}")
+                        continue
+                    self._encode = lambda text: encoding.encode(text, disallowed_special=())
+                    self.name = f"tiktoken:{encoding_name}"
+                    break
+        elif tokenizer != self.name:
+            errors.append(f"unknown tokenizer kind {kind!r}")
+        if self.name != tokenizer:
+            print(f"Warning: could not load tokenizer {tokenizer} ({'; '.join(errors)}), using {self.name}")
+        self._memo: Dict[bytes, int] = {}
+        self.calls = 0
+        self.hits = 0
+
+    @property
+    def exact(self) -> bool:
+        return self._encode is not None
+
+    def count(self, text) -> int:
         if not text:
             return 0
         if not isinstance(text, str):
             text = str(text)
-        return len(text) // 4  # Rough estimate
+        self.calls += 1
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        tokens = self._memo.get(key)
+        if tokens is None:
+            tokens = len(self._encode(text)) if self._encode is not None else len(text) // 4
+            self._memo[key] = tokens
+        else:
+            self.hits += 1
+        return tokens
+
 
+_counter = None
 
-# Process all JSONL files
-jsonl_files = sorted(glob.glob("../outputs/object_usage_labels_temp1_gptoss_noOutputLimit/*.jsonl"))
 
-print(f"Processing {len(jsonl_files)} file(s)...\n")
+def _init_worker(tokenizer: str):
+    global _counter
+    _counter = TokenCounter(tokenizer)
 
-system_token_counts = []
-input_token_counts = []
-output_token_counts = []
-total_token_counts = []
 
-for filepath in jsonl_files:
-    print(f"{filepath}:")
-    
-    with open(filepath, 'r') as f:
+def count_file(path: str) -> Dict:
+    """Histograms ({tokens: entries}) of the system, input, output and total counts of one file."""
+    histograms = {name: Counter() for name in COUNTS}
+    hits_before, calls_before = _counter.hits, _counter.calls
+    with open(path, "r", encoding="utf-8") as f:
         for line in f:
+            if not line.strip():
+                continue
             entry = json.loads(line)
-            
-            # Count system prompt tokens
-            system_prompt = entry.get('system_prompt', '')
-            system_tokens = count_tokens(system_prompt)
-            
-            # Count input/user prompt tokens
-            user_prompt = entry.get('user_prompt', '')
-            input_tokens = count_tokens(user_prompt) + sum(count_tokens(example["prompt"] + example["response"]["explanation"] + str(example["response"]["is_used"])) for example in entry.get('examples', []))
-            
-            # Count output response tokens
-            response_text = entry.get('llm_response_text', '')
+            system_tokens = _counter.count(entry.get("system_prompt", ""))
+            input_tokens = _counter.count(entry.get("user_prompt", "")) + sum(
+                _counter.count(example["prompt"] + example["response"]["explanation"] + str(example["response"]["is_used"]))
+                for example in entry.get("examples", [])
+            )
+            response_text = entry.get("llm_response_text", "")
             if not response_text:
-                response_text = json.dumps(entry.get('llm_response_json', {}))
-            output_tokens = count_tokens(response_text)
-            
-            # Total tokens (system + input + output)
-            total_tokens = system_tokens + input_tokens + output_tokens
-            
-            system_token_counts.append(system_tokens)
-            input_token_counts.append(input_tokens)
-            output_token_counts.append(output_tokens)
-            total_token_counts.append(total_tokens)
-            
-            object_name = entry.get('object_name', 'unknown')
-            print(f"  {object_name}:")
-            print(f"    System prompt: {system_tokens} tokens")
-            print(f"    Input prompt: {input_tokens} tokens")
-            print(f"    Output response: {output_tokens} tokens")
-            print(f"    Total: {total_tokens} tokens")
-            
-            # if output_tokens > 300:
-            #     print(f"    WARNING: Large output response ({output_tokens} tokens)")
-            #     print(response_text)
-            #     input("Look at this response, so big?")
-    
-if system_token_counts:
-    print(f"\nSummary for {filepath}:")
-    print(f"  System prompt tokens - Total: {sum(system_token_counts)}, Avg: {sum(system_token_counts)/len(system_token_counts):.1f}, Min: {min(system_token_counts)}, Max: {max(system_token_counts)}")
-    print(f"  Input prompt tokens - Total: {sum(input_token_counts)}, Avg: {sum(input_token_counts)/len(input_token_counts):.1f}, Min: {min(input_token_counts)}, Max: {max(input_token_counts)}")
-    print(f"  Output response tokens - Total: {sum(output_token_counts)}, Avg: {sum(output_token_counts)/len(output_token_counts):.1f}, Min: {min(output_token_counts)}, Max: {max(output_token_counts)}")
-    print(f"  Total tokens (system+input+output) - Total: {sum(total_token_counts)}, Avg: {sum(total_token_counts)/len(total_token_counts):.1f}, Min: {min(total_token_counts)}, Max: {max(total_token_counts)}")
-print()
+                response_text = json.dumps(entry.get("llm_response_json", {}))
+            output_tokens = _counter.count(response_text)
+
+            histograms["system"][system_tokens] += 1
+            histograms["input"][input_tokens] += 1
+            histograms["output"][output_tokens] += 1
+            histograms["total"][system_tokens + input_tokens + output_tokens] += 1
+    return {
+        "path": path,
+        "histograms": histograms,
+        "tokenizer": _counter.name,
+        "exact": _counter.exact,
+        "memo_hits": _counter.hits - hits_before,
+        "memo_calls": _counter.calls - calls_before,
+    }
+
+
+def histogram_stats(histogram: Counter) -> Dict:
+    """Count, total, mean, min, max and percentiles (nearest rank) of an integer histogram."""
+    entries = sum(histogram.values())
+    if entries == 0:
+        return {"entries": 0}
+    values = sorted(histogram)
+    stats = {
+        "entries": entries,
+        "total": sum(value * n for value, n in histogram.items()),
+        "min": values[0],
+        "max": values[-1],
+    }
+    stats["mean"] = round(stats["total"] / entries, 1)
+    targets = {p: max(1, -(-p * entries // 100)) for p in PERCENTILES}
+    seen = 0
+    for value in values:
+        seen += histogram[value]
+        for p, rank in list(targets.items()):
+            if seen >= rank:
+                stats[f"p{p}"] = value
+                del targets[p]
+    return stats
+
+
+def parse_run_config(run_dir: str) -> Dict:
+    """Model and settings encoded in an outputs/object_usage_labels_model-..._tries-N directory name."""
+    name = os.path.basename(os.path.normpath(run_dir))
+    config = {"run": name}
+    patterns = {
+        "model": r"model-(.+?)_max-segment-length",
+        "max_segment_length": r"max-segment-length-(\d+)",
+        "temperature": r"_temp-(\d+)",
+        "num_predict": r"numPredict-(\d+)",
+        "num_tries": r"tries-(\d+)",
+    }
+    for key, pattern in patterns.items():
+        match = re.search(pattern, name)
+        if match:
+            config[key] = match.group(1)
+    if "temperature" in config:
+        config["temperature"] = int(config["temperature"]) / 100
+    for key in ("max_segment_length", "num_predict", "num_tries"):
+        if key in config:
+            config[key] = int(config[key])
+    config["long"] = "_long" in name
+    return config
+
+
+def summarize_runs(run_dirs: List[str], tokenizer: str = DEFAULT_TOKENIZER, workers: int = None) -> List[Dict]:
+    """Token statistics per run directory, with its files counted in parallel."""
+    files = {run_dir: sorted(glob.glob(os.path.join(run_dir, "*.jsonl"))) for run_dir in run_dirs}
+    all_files = [path for paths in files.values() for path in paths]
+    # Resolve fallbacks once here, so workers load the same tokenizer without repeating the warning
+    tokenizer = TokenCounter(tokenizer).name
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tokenizer,)) as pool:
+        results = dict(zip(all_files, pool.map(count_file, all_files, chunksize=4)))
+
+    summaries = []
+    for run_dir, paths in files.items():
+        histograms = {name: Counter() for name in COUNTS}
+        memo_hits = memo_calls = 0
+        for path in paths:
+            for name in COUNTS:
+                histograms[name].update(results[path]["histograms"][name])
+            memo_hits += results[path]["memo_hits"]
+            memo_calls += results[path]["memo_calls"]
+        summary = parse_run_config(run_dir)
+        summary.update({
+            "files": len(paths),
+            "tokenizer": results[paths[0]]["tokenizer"] if paths else None,
+            "exact": results[paths[0]]["exact"] if paths else None,
+            "memo_hit_rate": round(memo_hits / memo_calls, 3) if memo_calls else None,
+            "tokens": {name: histogram_stats(histograms[name]) for name in COUNTS},
+        })
+        summaries.append(summary)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token statistics of object usage labeling runs")
+    parser.add_argument("runs", nargs="+", help="Run directories with JSONL label files (glob patterns allowed)")
+    parser.add_argument("--tokenizer", default=DEFAULT_TOKENIZER,
+                        help=f"tiktoken:<encoding> or hf:<model name> (default: {DEFAULT_TOKENIZER})")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output", default="token_stats.json", help="JSON summary, one record per run")
+    args = parser.parse_args()
+
+    run_dirs = sorted({path for pattern in args.runs for path in glob.glob(pattern) if os.path.isdir(path)})
+    if not run_dirs:
+        parser.error(f"No run directories match {args.runs}")
+    print(f"Processing {len(run_dirs)} run(s)...\n")
+    summaries = summarize_runs(run_dirs, args.tokenizer, args.workers)
+
+    for summary in summaries:
+        tokens = summary["tokens"]
+        print(f"{summary['run']} ({summary['files']} files, {tokens['total'].get('entries', 0)} entries, "
+              f"{summary['tokenizer']}, memo hit rate {summary['memo_hit_rate']})")
+        for name in COUNTS:
+            stats = tokens[name]
+            if not stats["entries"]:
+                continue
+            print(f"  {name:<7} total {stats['total']:>12}  mean {stats['mean']:>8.1f}  "
+                  + "  ".join(f"p{p} {stats[f'p{p}']:>6}" for p in PERCENTILES)
+                  + f"  max {stats['max']:>6}")
+
+    with open(args.output, "w") as f:
+        json.dump(summaries, f, indent=2)
+    print(f"\nSummary written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
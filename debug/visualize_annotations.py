@@ -1,137 +1,384 @@
 #!/usr/bin/env python3
 """
-Simple debugging script to visualize bounding boxes on video.
-Usage: python visualize_annotations.py <video_path> <annotations_jsonl> [output_video]
+Debugging script to visualize bounding boxes on video.
+
+The video is split into chunks of --chunk_seconds that worker processes render in parallel:
+each worker decodes its chunk with OpenCV, draws boxes on the annotated frames only (all
+other frames are passed through unchanged) and pipes raw frames to ffmpeg, which encodes
+H.264 with a fast preset. The chunks are then concatenated without re-encoding.
+
+For quick visual QA, --preview only fetches the annotated frames (short gaps are decoded
+forward with cap.grab(), which skips the BGR conversion of the frames in between, long gaps
+are seeked; see frame_reader.py), downsamples them and writes
+either a low-fps preview video of the annotated frames ("video") or one contact sheet per
+object with a tile of the object in each annotated frame ("sheet").
+
+Usage: python visualize_annotations.py <video_path> <annotations_jsonl> [output]
+           [--workers 8] [--chunk_seconds 60] [--preset veryfast] [--crf 23] [--max_frames N]
+           [--preview video|sheet] [--preview_scale 0.25] [--preview_fps 4] [--max_tiles 64]
 """
 
 import cv2
 import json
 import sys
 import os
-from pathlib import Path
+import zlib
+import shutil
+import argparse
+import tempfile
+import subprocess
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def visualize_annotations(video_path, annotations_path, output_path=None):
-    """Draw bounding boxes from annotations on video frames."""
-    
-    # Load annotations
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_reader import DEFAULT_MAX_GRAB_GAP, iter_frames
+
+
+# Colors for different objects (cycling through a palette)
+COLORS = [
+    (0, 255, 0),    # Green
+    (255, 0, 0),    # Blue
+    (0, 0, 255),    # Red
+    (255, 255, 0),  # Cyan
+    (255, 0, 255),  # Magenta
+    (0, 255, 255),  # Yellow
+    (128, 0, 128),  # Purple
+    (255, 165, 0),  # Orange
+]
+
+TILE_SIZE = 128
+SHEET_COLUMNS = 8
+
+
+def load_annotations(annotations_path):
+    """{frame_number: objects} from a dense annotations JSONL file."""
     annotations = {}
     with open(annotations_path, 'r') as f:
         for line in f:
             if line.strip():
                 data = json.loads(line)
-                frame_num = data['frame_number']
-                annotations[frame_num] = data.get('objects', [])
-    
+                annotations[data['frame_number']] = data.get('objects', [])
+    return annotations
+
+
+def object_color(assoc_id):
+    """Color of an object (crc32 is stable across runs and processes, unlike hash())."""
+    return COLORS[zlib.crc32(assoc_id.encode()) % len(COLORS)]
+
+
+def draw_annotations(frame, objects, frame_idx, scale=1.0):
+    """Draw the boxes and labels of objects and the frame number onto frame in place."""
+    font_scale = max(0.35, 0.5 * scale)
+    for obj in objects:
+        bbox = obj['bbox']  # [xmin, ymin, xmax, ymax] in original video coordinates
+        assoc_id = obj.get('assoc_id', 'unknown')
+        x1, y1, x2, y2 = [int(coord * scale) for coord in bbox]
+        color = object_color(assoc_id)
+
+        # Draw rectangle
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+        # Draw label
+        label = f"{assoc_id}"
+        label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        label_y = max(y1 - 5, label_size[1])
+        cv2.rectangle(frame, (x1, label_y - label_size[1] - 2),
+                    (x1 + label_size[0], label_y), color, -1)
+        cv2.putText(frame, label, (x1, label_y),
+                  cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), 1)
+
+    # Draw frame number
+    cv2.putText(frame, f"Frame: {frame_idx}", (10, 30),
+               cv2.FONT_HERSHEY_SIMPLEX, max(0.5, scale), (255, 255, 255), 2)
+
+
+def ffmpeg_writer(output_path, width, height, fps, preset="veryfast", crf=23):
+    """ffmpeg process encoding raw BGR frames written to its stdin as H.264."""
+    cmd = [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps}',
+        '-i', '-',
+        '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p',
+        output_path,
+    ]
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+
+def close_ffmpeg_writer(encoder, output_path):
+    """Finish an ffmpeg_writer, raising if the encode failed."""
+    encoder.stdin.close()
+    if encoder.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed encoding {output_path}")
+
+
+def render_chunk(video_path, annotations, start_frame, end_frame, chunk_path, fps, preset, crf):
+    """
+    Render frames [start_frame, end_frame) of the video into chunk_path.
+
+    Args:
+        annotations: Objects of the annotated frames inside the chunk only
+
+    Returns:
+        (frames written, annotated frames drawn)
+    """
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    encoder = ffmpeg_writer(chunk_path, width, height, fps, preset, crf)
+
+    written = annotated_count = 0
+    try:
+        for frame_idx in range(start_frame, end_frame):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame_idx in annotations:
+                draw_annotations(frame, annotations[frame_idx], frame_idx)
+                annotated_count += 1
+            encoder.stdin.write(frame.tobytes())
+            written += 1
+    finally:
+        cap.release()
+        close_ffmpeg_writer(encoder, chunk_path)
+    return written, annotated_count
+
+
+def concat_chunks(chunk_paths, output_path):
+    """Concatenate same-codec chunks with ffmpeg's concat demuxer, without re-encoding."""
+    list_path = output_path + '.chunks.txt'
+    with open(list_path, 'w') as f:
+        for path in chunk_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                        '-i', list_path, '-c', 'copy', output_path], check=True)
+    finally:
+        os.remove(list_path)
+
+
+def visualize_annotations(video_path, annotations_path, output_path=None, workers=None, chunk_seconds=60,
+                          preset="veryfast", crf=23, max_frames=None):
+    """Draw bounding boxes from annotations on video frames, rendering chunks in parallel."""
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError("ffmpeg not found in PATH")
+
+    # Load annotations
+    annotations = load_annotations(annotations_path)
     print(f"Loaded {len(annotations)} annotated frames")
-    
+
     # Open video
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         print(f"Error: Could not open video {video_path}")
         return
-    
+
     # Get video properties
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    fps = cap.get(cv2.CAP_PROP_FPS)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    print(f"Video: {width}x{height} @ {fps} fps, {total_frames} frames")
-    
-    # Setup output video writer
+    cap.release()
+    print(f"Video: {width}x{height} @ {fps:.2f} fps, {total_frames} frames")
+    if max_frames is not None:
+        total_frames = min(total_frames, max_frames)
+
     if output_path is None:
         output_path = annotations_path.replace('.jsonl', '_visualized.mp4')
-    
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-    
-    frame_idx = 0
-    annotated_count = 0
-    
-    # Colors for different objects (cycling through a palette)
-    colors = [
-        (0, 255, 0),    # Green
-        (255, 0, 0),    # Blue
-        (0, 0, 255),    # Red
-        (255, 255, 0),  # Cyan
-        (255, 0, 255),  # Magenta
-        (0, 255, 255),  # Yellow
-        (128, 0, 128),  # Purple
-        (255, 165, 0),  # Orange
-    ]
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Draw bounding boxes if this frame has annotations
-        if frame_idx in annotations:
-            objects = annotations[frame_idx]
-            annotated_count += 1
-            
-            for i, obj in enumerate(objects):
-                bbox = obj['bbox']  # [xmin, ymin, xmax, ymax]
-                assoc_id = obj.get('assoc_id', 'unknown')
-                
-                # Convert to integers
-                x1, y1, x2, y2 = [int(coord) for coord in bbox]
-                
-                # Get color for this object (based on assoc_id hash)
-                color_idx = hash(assoc_id) % len(colors)
-                color = colors[color_idx]
-                
-                # Draw rectangle
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                
-                # Draw label
-                label = f"{assoc_id}"
-                label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-                label_y = max(y1 - 5, label_size[1])
-                cv2.rectangle(frame, (x1, label_y - label_size[1] - 2), 
-                            (x1 + label_size[0], label_y), color, -1)
-                cv2.putText(frame, label, (x1, label_y), 
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        # Draw frame number
-        cv2.putText(frame, f"Frame: {frame_idx}", (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        
-        out.write(frame)
-        frame_idx += 1
-        
-        if frame_idx % 100 == 0:
-            print(f"Processed {frame_idx}/{total_frames} frames...")
-    
-        if frame_idx > 500: ## Checking if script is running
-            break
 
-    cap.release()
-    out.release()
-    
-    print(f"\nDone! Processed {frame_idx} frames, {annotated_count} had annotations")
+    chunk_frames = max(1, int(round(chunk_seconds * fps)))
+    chunks = [(start, min(start + chunk_frames, total_frames)) for start in range(0, total_frames, chunk_frames)]
+    print(f"Rendering {len(chunks)} chunks of {chunk_frames} frames with {workers or os.cpu_count()} workers")
+
+    chunk_dir = tempfile.mkdtemp(prefix='visualize_', dir=os.path.dirname(os.path.abspath(output_path)))
+    chunk_paths = [os.path.join(chunk_dir, f"chunk_{i:05d}.mp4") for i in range(len(chunks))]
+    frame_count = annotated_count = 0
+    try:
+        annotated_frames = sorted(annotations)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for (start, end), chunk_path in zip(chunks, chunk_paths):
+                frames_in_chunk = annotated_frames[bisect_left(annotated_frames, start):bisect_left(annotated_frames, end)]
+                chunk_annotations = {f: annotations[f] for f in frames_in_chunk}
+                futures[pool.submit(render_chunk, video_path, chunk_annotations, start, end,
+                                    chunk_path, fps, preset, crf)] = chunk_path
+            for done, future in enumerate(as_completed(futures), 1):
+                written, drawn = future.result()
+                frame_count += written
+                annotated_count += drawn
+                print(f"Chunk {done}/{len(chunks)} done ({frame_count}/{total_frames} frames)")
+
+        concat_chunks(chunk_paths, output_path)
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    print(f"\nDone! Processed {frame_count} frames, {annotated_count} had annotations")
     print(f"Output saved to: {output_path}")
 
+
+def select_tile_frames(annotations, max_tiles):
+    """{assoc_id: frames} with at most max_tiles frames per object, evenly spread over its track."""
+    frames_by_object = defaultdict(list)
+    for frame_idx in sorted(annotations):
+        for obj in annotations[frame_idx]:
+            frames_by_object[obj.get('assoc_id', 'unknown')].append(frame_idx)
+    selected = {}
+    for assoc_id, frames in frames_by_object.items():
+        if len(frames) > max_tiles:
+            frames = [frames[i] for i in np.linspace(0, len(frames) - 1, max_tiles).round().astype(int)]
+        selected[assoc_id] = sorted(set(frames))
+    return selected
+
+
+def object_tile(frame, bbox, frame_idx, tile_size=TILE_SIZE):
+    """Square tile of the object's box (with some context), letterboxed and labeled with the frame number."""
+    height, width = frame.shape[:2]
+    x1, y1, x2, y2 = bbox
+    margin = 0.1 * max(x2 - x1, y2 - y1)
+    x1, y1 = max(0, int(x1 - margin)), max(0, int(y1 - margin))
+    x2, y2 = min(width, int(x2 + margin) + 1), min(height, int(y2 + margin) + 1)
+    tile = np.zeros((tile_size, tile_size, 3), dtype=np.uint8)
+    if x2 <= x1 or y2 <= y1:
+        return tile
+    crop = frame[y1:y2, x1:x2]
+    factor = tile_size / max(crop.shape[:2])
+    crop = cv2.resize(crop, (max(1, int(crop.shape[1] * factor)), max(1, int(crop.shape[0] * factor))),
+                      interpolation=cv2.INTER_AREA)
+    top, left = (tile_size - crop.shape[0]) // 2, (tile_size - crop.shape[1]) // 2
+    tile[top:top + crop.shape[0], left:left + crop.shape[1]] = crop
+    cv2.putText(tile, str(frame_idx), (3, tile_size - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+    return tile
+
+
+def contact_sheet(tiles, columns=SHEET_COLUMNS):
+    """Mosaic of equally sized tiles, row by row."""
+    rows = -(-len(tiles) // columns)
+    tile_h, tile_w = tiles[0].shape[:2]
+    sheet = np.zeros((rows * tile_h, min(columns, len(tiles)) * tile_w, 3), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        r, c = divmod(i, columns)
+        sheet[r * tile_h:(r + 1) * tile_h, c * tile_w:(c + 1) * tile_w] = tile
+    return sheet
+
+
+def preview_annotations(video_path, annotations_path, output_path=None, mode="video", scale=0.25,
+                        preview_fps=4, max_tiles=64, max_grab_gap=DEFAULT_MAX_GRAB_GAP):
+    """
+    Preview of the annotated frames only, without decoding the frames in between.
+
+    Args:
+        mode: "video" writes the downsampled annotated frames as a preview_fps video;
+            "sheet" writes one contact sheet image per object into the output directory
+        scale: Downsampling factor of preview video frames
+        max_tiles: Largest number of tiles per object contact sheet
+        max_grab_gap: Largest gap between annotated frames that is decoded forward instead of seeking
+    """
+    annotations = load_annotations(annotations_path)
+    print(f"Loaded {len(annotations)} annotated frames")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {video_path}")
+        return
+
+    stats = {}
+    if mode == "video":
+        if output_path is None:
+            output_path = annotations_path.replace('.jsonl', '_preview.mp4')
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * scale) // 2 * 2
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * scale) // 2 * 2
+        encoder = writer = None
+        if shutil.which('ffmpeg') is not None:
+            encoder = ffmpeg_writer(output_path, width, height, preview_fps)
+        else:
+            writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), preview_fps, (width, height))
+        try:
+            for frame_idx, frame in iter_frames(cap, annotations, max_grab_gap, stats):
+                small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                draw_annotations(small, annotations[frame_idx], frame_idx, scale=width / frame.shape[1])
+                if encoder is not None:
+                    encoder.stdin.write(small.tobytes())
+                else:
+                    writer.write(small)
+        finally:
+            cap.release()
+            if encoder is not None:
+                close_ffmpeg_writer(encoder, output_path)
+            else:
+                writer.release()
+    else:
+        if output_path is None:
+            output_path = annotations_path.replace('.jsonl', '_sheets')
+        os.makedirs(output_path, exist_ok=True)
+        tile_frames = select_tile_frames(annotations, max_tiles)
+        wanted = defaultdict(set)
+        for assoc_id, frames in tile_frames.items():
+            for frame_idx in frames:
+                wanted[frame_idx].add(assoc_id)
+        tiles = defaultdict(list)
+        try:
+            for frame_idx, frame in iter_frames(cap, wanted, max_grab_gap, stats):
+                for obj in annotations[frame_idx]:
+                    assoc_id = obj.get('assoc_id', 'unknown')
+                    if assoc_id in wanted[frame_idx]:
+                        tiles[assoc_id].append(object_tile(frame, obj['bbox'], frame_idx))
+        finally:
+            cap.release()
+        for assoc_id, object_tiles in tiles.items():
+            safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in assoc_id)
+            cv2.imwrite(os.path.join(output_path, f"{safe_name}.jpg"), contact_sheet(object_tiles))
+        print(f"Wrote contact sheets of {len(tiles)} objects")
+
+    print(f"\nDone! Retrieved {stats.get('retrieved', 0)} frames "
+          f"({stats.get('grabbed', 0)} grabbed without decoding, {stats.get('seeks', 0)} seeks)")
+    print(f"Output saved to: {output_path}")
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python visualize_annotations.py <video_path> <annotations_jsonl> [output_video]")
-        print("\nExample:")
-        print("  python visualize_annotations.py \\")
-        print("    /coc/flash5/kvr6/data/hd-epic-data-files/HD-EPIC/Videos/P01/P01-20240202-171220.mp4 \\")
-        print("    outputs/dense_annotations_P01-20240202-171220.jsonl")
+    parser = argparse.ArgumentParser(
+        description="Draw dense annotation boxes on a video",
+        epilog="Example:\n  python visualize_annotations.py \\\n"
+               "    /coc/flash5/kvr6/data/hd-epic-data-files/HD-EPIC/Videos/P01/P01-20240202-171220.mp4 \\\n"
+               "    outputs/dense_annotations_P01-20240202-171220.jsonl",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("video_path")
+    parser.add_argument("annotations_path")
+    parser.add_argument("output_path", nargs="?", default=None,
+                        help="Output video, or directory of contact sheets with --preview sheet "
+                             "(default: next to the annotations)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk_seconds", type=float, default=60, help="Length of the chunk each worker renders")
+    parser.add_argument("--preset", default="veryfast", help="libx264 preset")
+    parser.add_argument("--crf", type=int, default=23, help="libx264 quality (lower is better)")
+    parser.add_argument("--max_frames", type=int, default=None, help="Only render the first N frames")
+    parser.add_argument("--preview", choices=["video", "sheet"], default=None,
+                        help="Only fetch annotated frames: low-fps preview video or per-object contact sheets")
+    parser.add_argument("--preview_scale", type=float, default=0.25, help="Downsampling of preview video frames")
+    parser.add_argument("--preview_fps", type=float, default=4, help="Frame rate of the preview video")
+    parser.add_argument("--max_tiles", type=int, default=64, help="Largest number of tiles per contact sheet")
+    parser.add_argument("--max_grab_gap", type=int, default=DEFAULT_MAX_GRAB_GAP,
+                        help="Largest gap between annotated frames decoded forward instead of seeking")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.video_path):
+        print(f"Error: Video file not found: {args.video_path}")
         sys.exit(1)
-    
-    video_path = sys.argv[1]
-    annotations_path = sys.argv[2]
-    output_path = sys.argv[3] if len(sys.argv) > 3 else None
-    
-    if not os.path.exists(video_path):
-        print(f"Error: Video file not found: {video_path}")
+
+    if not os.path.exists(args.annotations_path):
+        print(f"Error: Annotations file not found: {args.annotations_path}")
         sys.exit(1)
-    
-    if not os.path.exists(annotations_path):
-        print(f"Error: Annotations file not found: {annotations_path}")
+
+    if not args.preview and shutil.which('ffmpeg') is None:
+        print("Error: ffmpeg not found in PATH (required unless --preview is given)")
         sys.exit(1)
-    
-    visualize_annotations(video_path, annotations_path, output_path)
 
+    if args.preview:
+        preview_annotations(args.video_path, args.annotations_path, args.output_path, args.preview,
+                            args.preview_scale, args.preview_fps, args.max_tiles, args.max_grab_gap)
+    else:
+        visualize_annotations(args.video_path, args.annotations_path, args.output_path, args.workers,
+                              args.chunk_seconds, args.preset, args.crf, args.max_frames)
@@ -0,0 +1,773 @@
+"""
+Dense annotation engine: tracks the moved objects of a video with a video predictor
+(SAM 2 by default) and writes per-frame bboxes to dense_annotations_<video_id>.jsonl.
+
+Tracking strategies (--strategy):
+    full      One predictor state over the whole video at its original resolution.
+    proxy     The whole video, tracked on a proxy downscaled by --video_scale_factor.
+    windowed  Overlapping temporal windows (--window_duration, --window_overlap), each cut
+              and downscaled by --video_scale_factor. Bounds memory for 60-90 minute videos.
+
+Every strategy is a window plan: full and proxy are a single window over the whole video.
+They all share the prompt planner (collect_window_prompts), the per-window tracking loop
+with checkpoints, and the streaming JSONL writer. The command-line entry point is
+generate_dense_annotations.py; dense_annotations_job_runner.py runs a queue of videos.
+"""
+
+import os
+import json
+import argparse
+import torch
+import numpy as np
+import subprocess
+import tempfile
+from typing import List, Tuple, Dict, Optional
+import gc
+
+from dense_annotation_utils import (
+    WindowCheckpoint, StageTimer, JSONLFrameWriter, ObjectIdAllocator, iter_sampled_frames,
+    peek_completed_windows, MERGE_POLICIES
+)
+from mask_utils import masks_to_bboxes, masks_to_rle, MaskRLEWriter
+from video_predictors import (
+    PREDICTORS, DEFAULT_SAM2_CHECKPOINT, DEFAULT_SAM2_CONFIG, VideoPredictor, build_video_predictor
+)
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+
+def load_jsonl(path):
+    """Load JSONL file line by line to save memory."""
+    data = []
+    with open(path, 'r') as f:
+        for line in f:
+            data.append(json.loads(line))
+    return data
+
+
+def get_video_info(video_path: str) -> Tuple[int, int, float, int]:
+    """
+    Get video information: width, height, fps, and total frame count.
+    """
+    if CV2_AVAILABLE:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        cap.release()
+        return width, height, fps, total_frames
+    else:
+        # Fallback: use ffprobe
+        try:
+            cmd = [
+                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                '-show_entries', 'stream=width,height,r_frame_rate,nb_frames',
+                '-of', 'json', video_path
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            info = json.loads(result.stdout)
+            stream = info['streams'][0]
+
+            width = stream['width']
+            height = stream['height']
+
+            # Parse fps fraction
+            fps_str = stream['r_frame_rate']
+            if '/' in fps_str:
+                num, den = fps_str.split('/')
+                fps = float(num) / float(den)
+            else:
+                fps = float(fps_str)
+
+            total_frames = int(stream['nb_frames'])
+
+            return width, height, fps, total_frames
+        except (subprocess.CalledProcessError, KeyError, json.JSONDecodeError) as e:
+            raise ValueError(f"Could not get video info: {e}")
+
+
+def scaled_resolution(width: int, height: int, scale_factor: float) -> Tuple[int, int]:
+    """Resolution of a video downscaled by scale_factor, rounded down to even sizes for libx264."""
+    return max(2, int(width * scale_factor) // 2 * 2), max(2, int(height * scale_factor) // 2 * 2)
+
+
+def create_video_segment(input_path: str, output_path: str, start_frame: int = 0,
+                         end_frame: Optional[int] = None, fps: Optional[float] = None,
+                         size: Optional[Tuple[int, int]] = None) -> bool:
+    """
+    Re-encode frames [start_frame, end_frame) of a video with ffmpeg, optionally resized.
+
+    Args:
+        input_path: Source video
+        output_path: Output video
+        start_frame: First frame to keep (requires fps when > 0)
+        end_frame: End of the segment (exclusive); None keeps everything up to the end
+        fps: Frame rate of the source, to convert start_frame to a seek time
+        size: Output (width, height), or None to keep the source resolution
+
+    Returns:
+        True if successful, False otherwise.
+    """
+    cmd = ['ffmpeg', '-v', 'error']
+    if start_frame > 0:
+        # Input seeking is frame-accurate when re-encoding and avoids decoding from the start
+        cmd += ['-ss', f'{start_frame / fps:.6f}']
+    cmd += ['-i', input_path]
+    if end_frame is not None:
+        cmd += ['-frames:v', str(end_frame - start_frame)]
+    if size is not None:
+        cmd += ['-vf', f'scale={size[0]}:{size[1]}']
+    cmd += [
+        '-an',
+        '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+        '-y',  # Overwrite output file
+        output_path
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"Failed to create video segment: {e}")
+        return False
+
+
+def get_stationary_objects(scene_graph_path: str, assoc_info: Dict, video_id: str) -> List[str]:
+    """Get stationary objects that don't move in the video."""
+    scene_graph = load_jsonl(scene_graph_path)
+    all_objects = set()
+
+    for frame in scene_graph:
+        for obj in frame.get('objects', []):
+            all_objects.add(obj['name'])
+
+    moved_objects = set()
+    if video_id in assoc_info:
+        for assoc_id, assoc_data in assoc_info[video_id].items():
+            moved_objects.add(assoc_data['name'])
+
+    stationary_objects = all_objects - moved_objects
+    return sorted(list(stationary_objects))
+
+
+def plan_temporal_windows(total_frames: int, window_frames: int, overlap_frames: int) -> List[Tuple[int, int]]:
+    """Split [0, total_frames) into (start_frame, end_frame) windows that overlap by overlap_frames."""
+    windows = []
+    current_start = 0
+
+    while current_start < total_frames:
+        # Calculate end frame for this window
+        current_end = min(current_start + window_frames, total_frames)
+        windows.append((current_start, current_end))
+
+        # Move to next window with overlap
+        if current_end >= total_frames:
+            break
+        current_start = current_end - overlap_frames
+
+    return windows
+
+
+def resolve_video_path(video_root: str, video_id: str) -> str:
+    """Path of a video under the HD-EPIC layout <video_root>/<person_id>/<video_id>.mp4."""
+    person_id = video_id.split('-')[0]
+    return os.path.join(video_root, f"{person_id}", f"{video_id}.mp4")
+
+
+def object_ids_path(output_dir: str, video_id: str) -> str:
+    """Where the assoc_id -> SAM 2 object id mapping of a video is persisted."""
+    return os.path.join(output_dir, f"object_ids_{video_id}.json")
+
+
+def merged_output_path(output_dir: str, video_id: str) -> str:
+    """Merged dense annotations of a video; only written once all its windows are tracked."""
+    return os.path.join(output_dir, f"dense_annotations_{video_id}.jsonl")
+
+
+def video_finished(args, video_id: str) -> bool:
+    """Whether a previous run already merged all outputs of video_id (checkpoints may be gone)."""
+    if not os.path.exists(merged_output_path(args.output_dir, video_id)):
+        return False
+    # The mask index is written after the annotations, so a run preempted in between is not finished
+    return not args.save_masks or os.path.exists(
+        os.path.join(args.output_dir, f"dense_masks_{video_id}.rle.npz"))
+
+
+def collect_window_prompts(video_assoc_info: Dict, video_mask_info: Dict,
+                           start_frame: int, end_frame: int, object_ids: Dict[str, int]) -> List[Dict]:
+    """
+    Collect the box prompts of every object that has a mask inside a window.
+
+    Args:
+        video_assoc_info: assoc_info entry of one video (assoc_id -> name and tracks)
+        video_mask_info: mask_info entry of the same video (mask_id -> frame_number and bbox)
+        start_frame: First frame of the window
+        end_frame: End of the window (exclusive)
+        object_ids: assoc_id -> SAM 2 object id (see ObjectIdAllocator)
+
+    Returns:
+        List of {"assoc_id", "assoc_name", "obj_id", "prompts"} for objects with at least one
+        prompt; prompt frame indices are relative to start_frame and bboxes are in original
+        video coordinates.
+    """
+    window_objects = []
+    for assoc_id, assoc_data in video_assoc_info.items():
+        window_prompts = []
+        for track in assoc_data['tracks']:
+            for mask_id in track['masks']:
+                if mask_id in video_mask_info:
+                    m_data = video_mask_info[mask_id]
+                    frame_num = m_data['frame_number']
+                    if start_frame <= frame_num < end_frame:
+                        window_prompts.append({
+                            "frame_idx": frame_num - start_frame,  # Adjust for window
+                            "bbox": m_data['bbox']
+                        })
+
+        if window_prompts:
+            window_objects.append({
+                "assoc_id": assoc_id,
+                "assoc_name": assoc_data['name'],
+                "obj_id": object_ids[assoc_id],
+                "prompts": window_prompts,
+            })
+    return window_objects
+
+
+class FullVideoStrategy:
+    """Track the whole video in one predictor state at its original resolution."""
+
+    name = "full"
+
+    def __init__(self, args, video_info: Tuple[int, int, float, int], segment_dir: Optional[str] = None):
+        """
+        Args:
+            args: Processing arguments (video_id, video_path, window and scale settings)
+            video_info: (width, height, fps, total_frames) of the source video
+            segment_dir: Directory for re-encoded segments (default: system temp directory)
+        """
+        self.args = args
+        self.width, self.height, self.fps, self.total_frames = video_info
+        self.segment_dir = segment_dir or tempfile.gettempdir()
+        self.size = (self.width, self.height)
+
+    @property
+    def scale(self) -> Tuple[float, float]:
+        """(x, y) factors from original video coordinates to tracked video coordinates."""
+        return self.size[0] / self.width, self.size[1] / self.height
+
+    def plan(self) -> List[Tuple[int, int]]:
+        return [(0, self.total_frames)]
+
+    def create_segment(self, window_idx: int, start_frame: int, end_frame: int) -> Optional[str]:
+        """Video file the predictor tracks for a planned window, or None if it could not be created."""
+        return self.args.video_path
+
+    def _segment_path(self, window_idx: int) -> str:
+        os.makedirs(self.segment_dir, exist_ok=True)
+        return os.path.join(self.segment_dir, f"{self.args.video_id}_window_{window_idx}_{os.getpid()}.mp4")
+
+    def remove_segment(self, segment_path: str):
+        """Delete a segment created by create_segment; the source video is never removed."""
+        if segment_path == self.args.video_path or not os.path.exists(segment_path):
+            return
+        try:
+            os.remove(segment_path)
+            print(f"Cleaned up: {segment_path}")
+        except Exception as e:
+            print(f"Warning: Could not remove {segment_path}: {e}")
+
+
+class ProxyScaledStrategy(FullVideoStrategy):
+    """Track the whole video on a proxy downscaled by --video_scale_factor."""
+
+    name = "proxy"
+
+    def __init__(self, args, video_info: Tuple[int, int, float, int], segment_dir: Optional[str] = None):
+        super().__init__(args, video_info, segment_dir)
+        if args.video_scale_factor < 1.0:
+            self.size = scaled_resolution(self.width, self.height, args.video_scale_factor)
+
+    def _needs_reencode(self) -> bool:
+        return self.size != (self.width, self.height)
+
+    def create_segment(self, window_idx: int, start_frame: int, end_frame: int) -> Optional[str]:
+        if not self._needs_reencode():
+            return self.args.video_path
+        proxy_path = self._segment_path(window_idx)
+        if not create_video_segment(self.args.video_path, proxy_path, size=self.size):
+            return None
+        print(f"Created proxy video {self.size[0]}x{self.size[1]} "
+              f"(scale factor: {self.args.video_scale_factor})")
+        return proxy_path
+
+
+class WindowedStrategy(ProxyScaledStrategy):
+    """Track overlapping temporal windows, each cut (and downscaled) into its own segment."""
+
+    name = "windowed"
+
+    def plan(self) -> List[Tuple[int, int]]:
+        window_frames = int(self.args.window_duration * self.fps)
+        overlap_frames = int(self.args.window_overlap * self.fps)
+        print(f"Window config: {self.args.window_duration}s ({window_frames} frames) "
+              f"with {self.args.window_overlap}s ({overlap_frames} frames) overlap")
+        return plan_temporal_windows(self.total_frames, window_frames, overlap_frames)
+
+    def create_segment(self, window_idx: int, start_frame: int, end_frame: int) -> Optional[str]:
+        segment_path = self._segment_path(window_idx)
+        size = self.size if self._needs_reencode() else None
+        if not create_video_segment(self.args.video_path, segment_path, start_frame, end_frame, self.fps, size):
+            print(f"Failed to create window {window_idx}, skipping")
+            return None
+        print(f"Created window {window_idx}: frames {start_frame}-{end_frame} "
+              f"({(end_frame-start_frame)/self.fps:.1f}s)")
+        return segment_path
+
+
+STRATEGIES = {
+    FullVideoStrategy.name: FullVideoStrategy,
+    ProxyScaledStrategy.name: ProxyScaledStrategy,
+    WindowedStrategy.name: WindowedStrategy,
+}
+
+
+def make_strategy(args, video_info: Tuple[int, int, float, int], segment_dir: Optional[str] = None):
+    """Instantiate the tracking strategy selected by args.strategy."""
+    return STRATEGIES[args.strategy](args, video_info, segment_dir)
+
+
+def checkpoint_config(args, planned_windows: List[Tuple[int, int]]) -> Dict:
+    """Processing parameters recorded in (and checked against) the window checkpoint."""
+    return {
+        "strategy": args.strategy,
+        "frame_interval": args.frame_interval,
+        "video_scale_factor": args.video_scale_factor,
+        "window_duration": args.window_duration,
+        "window_overlap": args.window_overlap,
+        "save_masks": args.save_masks,
+        "windows": planned_windows,
+    }
+
+
+def prepare_video(args, video_assoc_info: Dict, video_mask_info: Dict,
+                  segment_dir: Optional[str] = None) -> Dict:
+    """
+    CPU-side preparation of one video: stationary objects, window plan and per-window prompts.
+
+    Only needs the video's own assoc_info/mask_info entries, so it can run in a worker process
+    (see dense_annotations_job_runner.py) while the GPU tracks another video.
+
+    Args:
+        args: Processing arguments with video_id and the resolved video_path
+        video_assoc_info: assoc_info entry of the video
+        video_mask_info: mask_info entry of the video
+        segment_dir: If set, also create the video segments of all windows not yet completed
+            in an existing checkpoint, in this directory. Otherwise segments are created
+            lazily while processing.
+
+    Returns:
+        Dictionary with video_id, tracked (False if there is no movement data), video_info
+        (width, height, fps, total_frames), object_ids {assoc_id: obj_id}, windows [(start_frame, end_frame)],
+        prompts {window_idx: [...]}, segments {window_idx: path} and timing (stage summary
+        of the preparation).
+    """
+    timer = StageTimer()
+    prepared = {"video_id": args.video_id, "tracked": False, "video_info": None, "object_ids": {}, "windows": [],
+                "prompts": {}, "segments": {}, "timing": {}}
+
+    # Save stationary objects
+    with timer.stage("stationary"):
+        os.makedirs(args.output_dir, exist_ok=True)
+        scene_graph_path = os.path.join(args.scene_graph_dir,
+                                       f"scene_graphs_{args.video_id}.jsonl")
+        stationary = get_stationary_objects(scene_graph_path, {args.video_id: video_assoc_info}, args.video_id)
+        stationary_file = os.path.join(args.output_dir,
+                                      f"stationary_objects_{args.video_id}.txt")
+        with open(stationary_file, 'w') as f:
+            for obj in stationary:
+                f.write(f"{obj}\n")
+        print(f"Saved stationary objects to {stationary_file}")
+
+    if not video_assoc_info:
+        prepared["timing"] = timer.summary()
+        return prepared
+    prepared["tracked"] = True
+
+    # Plan windows with the selected strategy
+    with timer.stage("probe"):
+        prepared["video_info"] = get_video_info(args.video_path)
+        width, height, fps, total_frames = prepared["video_info"]
+        print(f"Video info: {width}x{height}, {fps:.2f} fps, "
+              f"{total_frames} frames, {total_frames / fps:.1f}s duration")
+        strategy = make_strategy(args, prepared["video_info"], segment_dir)
+        prepared["windows"] = strategy.plan()
+
+    with timer.stage("prompts"):
+        # Stable ids, persisted next to the outputs and reused by resumed or repeated runs
+        object_ids = ObjectIdAllocator.for_video(
+            video_assoc_info.keys(), object_ids_path(args.output_dir, args.video_id))
+        prepared["object_ids"] = object_ids.mapping
+        for i, (start_frame, end_frame) in enumerate(prepared["windows"]):
+            prepared["prompts"][i] = collect_window_prompts(video_assoc_info, video_mask_info,
+                                                            start_frame, end_frame, object_ids.mapping)
+
+    if segment_dir is not None:
+        completed = set()
+        if args.resume:
+            completed = peek_completed_windows(
+                os.path.join(args.output_dir, f"windows_{args.video_id}"),
+                args.video_id, checkpoint_config(args, prepared["windows"]))
+        for i, (start_frame, end_frame) in enumerate(prepared["windows"]):
+            if i in completed:
+                continue
+            with timer.stage("segment"):
+                segment_path = strategy.create_segment(i, start_frame, end_frame)
+            if segment_path is not None:
+                prepared["segments"][i] = segment_path
+
+    prepared["timing"] = timer.summary()
+    return prepared
+
+
+class DenseAnnotationEngine:
+    """Tracks the windows planned by a strategy, checkpoints them and merges the results."""
+
+    def __init__(self, args, assoc_info: Dict, mask_info: Dict, predictor: Optional[VideoPredictor] = None):
+        self.args = args
+        self.assoc_info = assoc_info
+        self.mask_info = mask_info
+
+        # Initialize the video predictor (SAM 2 unless one is passed in, e.g. a mock for benchmarks)
+        self.predictor = predictor or build_video_predictor(
+            args.predictor, sam2_config=args.sam2_config, sam2_checkpoint=args.sam2_checkpoint)
+
+    def _cleanup_memory(self):
+        """Aggressive memory cleanup."""
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        gc.collect()
+
+    def _track_window(self, segment_path: str, start_frame: int, window_objects: List[Dict],
+                      scale: Tuple[float, float], timer: StageTimer, writer: JSONLFrameWriter,
+                      mask_writer: Optional[MaskRLEWriter] = None):
+        """
+        Track one window and stream its sampled frames to writer.
+
+        Args:
+            segment_path: Video the predictor tracks (the source video, a proxy or a window segment)
+            start_frame: Frame of the source video where the segment starts
+            window_objects: Objects prompted in this window (see collect_window_prompts)
+            scale: (x, y) factors from original video coordinates to segment coordinates
+            timer: Receives the time per stage
+            writer: Streaming writer for the window's {"frame_number", "objects"} lines
+            mask_writer: If given, each object's mask is also written to it as RLE
+        """
+        scale_x, scale_y = scale
+
+        # Initialize inference state for this window
+        self._cleanup_memory()
+        print(f"Initializing inference state for {segment_path}")
+
+        with self.predictor.autocast():
+            with timer.stage("init_state"):
+                inference_state = self.predictor.init_state(
+                    video_path=segment_path,
+                    offload_video_to_cpu=True,
+                    offload_state_to_cpu=False
+                )
+
+            if torch.cuda.is_available():
+                print(f"Inference state initialized. GPU memory: "
+                      f"{torch.cuda.memory_allocated() / 1024**3:.2f} GB")
+
+            # Add prompts for objects that have data in this window
+            obj_id_to_assoc_id = {}
+            assoc_id_to_name = {}
+
+            for window_object in window_objects:
+                obj_id = window_object['obj_id']
+                obj_id_to_assoc_id[obj_id] = window_object['assoc_id']
+                assoc_id_to_name[window_object['assoc_id']] = window_object['assoc_name']
+                print(f"Adding {len(window_object['prompts'])} prompts for {window_object['assoc_name']}")
+
+                # Prompts are in original video coordinates
+                with timer.stage("prompts"):
+                    for prompt in window_object['prompts']:
+                        xmin, ymin, xmax, ymax = prompt['bbox']
+                        scaled_bbox = [xmin * scale_x, ymin * scale_y, xmax * scale_x, ymax * scale_y]
+                        self.predictor.add_new_points_or_box(
+                            inference_state=inference_state,
+                            frame_idx=prompt['frame_idx'],
+                            obj_id=obj_id,
+                            box=np.array(scaled_bbox, dtype=np.float32),
+                        )
+
+            # Propagate through window. The tracker sees every frame, but only frames on
+            # the frame_interval grid are yielded for post-processing.
+            print("Starting propagation...")
+            frame_count = 0
+            last_print = -1
+
+            for global_frame_idx, out_frame_idx, out_obj_ids, out_mask_logits in iter_sampled_frames(
+                    self.predictor.propagate_in_video(inference_state), self.args.frame_interval,
+                    frame_offset=start_frame, timer=timer):
+                frame_count += 1
+
+                # Print progress
+                if global_frame_idx - last_print >= 100 * self.args.frame_interval or frame_count == 1:
+                    print(f"Frame {global_frame_idx} (local: {out_frame_idx}) - "
+                          f"processed {frame_count} frames")
+                    last_print = global_frame_idx
+
+                # Process detected objects: convert all masks of this frame to bboxes
+                # at once, so only N x 4 values leave the GPU
+                with timer.stage("bbox"):
+                    bboxes, valid = masks_to_bboxes(out_mask_logits)
+                if mask_writer is not None:
+                    with timer.stage("rle"):
+                        rles = masks_to_rle(out_mask_logits)
+                        mask_size = tuple(out_mask_logits.shape[-2:])
+                        for i, out_obj_id in enumerate(out_obj_ids):
+                            if valid[i]:
+                                assoc_id = obj_id_to_assoc_id.get(out_obj_id, str(out_obj_id))
+                                mask_writer.add(global_frame_idx, assoc_id, rles[i], mask_size)
+                del out_mask_logits
+
+                with timer.stage("results"):
+                    objects = []
+                    for i, out_obj_id in enumerate(out_obj_ids):
+                        if valid[i]:
+                            # Scale bbox back to original video coordinates
+                            xmin, ymin, xmax, ymax = (float(coord) for coord in bboxes[i])
+                            assoc_id = obj_id_to_assoc_id.get(out_obj_id, str(out_obj_id))
+                            objects.append({
+                                "assoc_id": assoc_id,
+                                "assoc_name": assoc_id_to_name.get(assoc_id, assoc_id),
+                                "bbox": [xmin / scale_x, ymin / scale_y, xmax / scale_x, ymax / scale_y]
+                            })
+                    if objects:
+                        writer.write_frame(global_frame_idx, objects)
+
+            print(f"Window completed: {frame_count} frames processed")
+
+            # Clean up inference state
+            self.predictor.reset_state(inference_state)
+
+    def process_video(self, prepared: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Track, checkpoint and merge all windows of self.args.video_id.
+
+        Args:
+            prepared: Result of prepare_video for this video, e.g. computed ahead of time
+                in a worker process by the job runner. Prepared here when not given.
+
+        Returns:
+            Stage timing summary, or None if the video was skipped or is not complete yet
+        """
+        print(f"Starting {self.args.strategy} processing for video: {self.args.video_id}")
+
+        # Create output directory
+        os.makedirs(self.args.output_dir, exist_ok=True)
+
+        if self.args.resume and video_finished(self.args, self.args.video_id):
+            print(f"{self.args.video_id} was already merged to "
+                  f"{merged_output_path(self.args.output_dir, self.args.video_id)}. Skipping.")
+            return None
+
+        if prepared is None:
+            prepared = prepare_video(self.args,
+                                     self.assoc_info.get(self.args.video_id, {}),
+                                     self.mask_info.get(self.args.video_id, {}))
+
+        if not prepared["tracked"]:
+            print(f"No movement data for {self.args.video_id}. Skipping tracking.")
+            return None
+
+        # Windows without a prepared segment are created lazily, so finished windows cost nothing on resume
+        strategy = make_strategy(self.args, prepared["video_info"])
+        planned_windows = prepared["windows"]
+        prepared_segments = prepared["segments"]
+        print(f"Planned {len(planned_windows)} window(s) "
+              f"({len(prepared_segments)} segments prepared ahead), tracking at "
+              f"{strategy.size[0]}x{strategy.size[1]}")
+
+        # Completed windows are checkpointed to disk as soon as they finish
+        checkpoint = WindowCheckpoint(
+            checkpoint_dir=os.path.join(self.args.output_dir, f"windows_{self.args.video_id}"),
+            video_id=self.args.video_id,
+            config=checkpoint_config(self.args, planned_windows),
+            resume=self.args.resume,
+        )
+
+        # Time per stage; with --profile_stages the GPU is synchronized at stage boundaries
+        # so asynchronous kernels are attributed to the stage that launched them
+        sync = torch.cuda.synchronize if (self.args.profile_stages and torch.cuda.is_available()) else None
+        self.stage_timer = StageTimer(sync=sync)
+
+        for i, (start_frame, end_frame) in enumerate(planned_windows):
+            print(f"\n{'='*60}")
+            print(f"PROCESSING WINDOW {i+1}/{len(planned_windows)}: frames {start_frame}-{end_frame}")
+            print(f"{'='*60}")
+
+            segment_path = prepared_segments.get(i)
+            if checkpoint.is_complete(i, start_frame, end_frame):
+                print(f"Window {i} already completed, skipping")
+                if segment_path is not None:
+                    strategy.remove_segment(segment_path)
+                continue
+
+            if segment_path is None or not os.path.exists(segment_path):
+                with self.stage_timer.stage("segment"):
+                    segment_path = strategy.create_segment(i, start_frame, end_frame)
+                if segment_path is None:
+                    continue
+
+            # Check memory before processing
+            if torch.cuda.is_available():
+                memory_before = torch.cuda.memory_allocated() / 1024**3
+                print(f"GPU memory before window {i}: {memory_before:.2f} GB")
+
+            window_timer = StageTimer(sync=sync)
+            mask_writer = None
+            if self.args.save_masks:
+                # Masks stay at the resolution the predictor ran at; the scale is recorded for readers
+                mask_writer = MaskRLEWriter(
+                    checkpoint.mask_prefix(i, start_frame, end_frame),
+                    metadata={"video_id": self.args.video_id, "strategy": strategy.name,
+                              "video_scale_factor": self.args.video_scale_factor,
+                              "scale": list(strategy.scale)},
+                )
+            try:
+                with checkpoint.window_writer(i, start_frame, end_frame) as writer:
+                    self._track_window(segment_path, start_frame, prepared["prompts"][i],
+                                       strategy.scale, window_timer, writer, mask_writer)
+            finally:
+                if mask_writer is not None:
+                    mask_writer.close()
+                strategy.remove_segment(segment_path)
+
+            with window_timer.stage("checkpoint"):
+                shard_path = checkpoint.complete_window(i, start_frame, end_frame, writer.num_frames,
+                                                        masks_written=mask_writer is not None)
+            print(f"Saved window {i} results to {shard_path}")
+
+            window_timer.report(f"Window {i} stage timing")
+            self.stage_timer.merge(window_timer)
+
+            # Check memory after processing
+            if torch.cuda.is_available():
+                memory_after = torch.cuda.memory_allocated() / 1024**3
+                print(f"GPU memory after window {i}: {memory_after:.2f} GB")
+
+            # Aggressive cleanup between windows
+            self._cleanup_memory()
+
+        completed = checkpoint.completed_windows()
+        if len(completed) < len(planned_windows):
+            print(f"\nOnly {len(completed)}/{len(planned_windows)} windows completed; "
+                  f"rerun with --resume to finish the remaining windows")
+            return None
+
+        # Merge window shards into the final file using streaming approach
+        output_file = merged_output_path(self.args.output_dir, self.args.video_id)
+
+        print(f"\nWriting results to {output_file}")
+        with self.stage_timer.stage("merge"), JSONLFrameWriter(output_file) as writer:
+            for frame_data in checkpoint.iter_merged_frames(self.args.overlap_merge,
+                                                            self.args.merge_iou_threshold):
+                writer.write_frame(frame_data["frame_number"], frame_data["objects"])
+
+        if self.args.save_masks:
+            mask_prefix = os.path.join(self.args.output_dir, f"dense_masks_{self.args.video_id}")
+            with self.stage_timer.stage("merge"):
+                num_masks = checkpoint.merge_masks(mask_prefix)
+            print(f"Saved {num_masks} RLE masks to {mask_prefix}.rle.bin (index: {mask_prefix}.rle.npz)")
+
+        if not self.args.keep_window_shards:
+            checkpoint.cleanup()
+
+        print(f"\nProcessing completed successfully!")
+        print(f"Results saved to: {output_file} ({writer.num_frames} frames)")
+        print(f"Total windows processed: {len(planned_windows)}")
+        self.stage_timer.report(f"Stage timing for {self.args.video_id}")
+        return self.stage_timer.summary()
+
+
+def add_processing_args(parser: argparse.ArgumentParser):
+    """Arguments shared by generate_dense_annotations.py and dense_annotations_job_runner.py."""
+    parser.add_argument("--video_path", type=str,
+                       default="/coc/flash5/kvr6/data/hd-epic-data-files/HD-EPIC/Videos")
+    parser.add_argument("--scene_graph_dir", type=str, default="outputs/scene_graphs")
+    parser.add_argument("--assoc_info", type=str,
+                       default="scene-and-object-movements/assoc_info.json")
+    parser.add_argument("--mask_info", type=str,
+                       default="scene-and-object-movements/mask_info.json")
+    parser.add_argument("--output_dir", type=str, default="outputs/dense_annotations")
+    parser.add_argument("--strategy", type=str, default="windowed", choices=list(STRATEGIES),
+                        help="full: whole video at original resolution; proxy: whole video downscaled by "
+                             "--video_scale_factor; windowed: downscaled temporal windows (default: windowed)")
+    parser.add_argument("--predictor", type=str, default="sam2", choices=PREDICTORS,
+                        help="Video predictor: SAM 2, or a CPU mock with constant-velocity boxes for "
+                             "profiling the rest of the pipeline (default: sam2)")
+    parser.add_argument("--sam2_config", type=str, default=DEFAULT_SAM2_CONFIG)
+    parser.add_argument("--sam2_checkpoint", type=str, default=DEFAULT_SAM2_CHECKPOINT)
+    parser.add_argument("--frame_interval", type=int, default=30,
+                        help="Annotate every Nth frame (default: 30)")
+    parser.add_argument("--video_scale_factor", type=float, default=0.5,
+                        help="Scale factor for video resolution with the proxy and windowed strategies "
+                             "(0.1 to 1.0, default: 0.5)")
+    parser.add_argument("--window_duration", type=int, default=300,
+                        help="Temporal window duration in seconds (default: 300 = 5 minutes)")
+    parser.add_argument("--window_overlap", type=int, default=30,
+                        help="Overlap between consecutive windows in seconds (default: 30)")
+    parser.add_argument("--overlap_merge", type=str, default="boundary", choices=list(MERGE_POLICIES),
+                        help="How duplicate objects in window overlaps are resolved: keep the window farther "
+                             "from its boundary, or also fuse agreeing boxes (default: boundary)")
+    parser.add_argument("--merge_iou_threshold", type=float, default=0.5,
+                        help="Minimum IoU for fusing boxes with --overlap_merge iou_fuse (default: 0.5)")
+    parser.add_argument("--save_masks", action="store_true",
+                        help="Also save every object mask as COCO-style RLE in dense_masks_<video_id>.rle.{bin,npz}")
+    parser.add_argument("--profile_stages", action="store_true",
+                        help="Synchronize the GPU at stage boundaries for accurate per-stage timing")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip videos and windows completed by a previous (preempted) run")
+    parser.add_argument("--keep_window_shards", action="store_true",
+                        help="Keep per-window result shards after they are merged")
+
+
+def validate_processing_args(parser: argparse.ArgumentParser, args):
+    """Validate the arguments added by add_processing_args."""
+    # Validate scale factor
+    if args.video_scale_factor < 0.1 or args.video_scale_factor > 1.0:
+        parser.error("--video_scale_factor must be between 0.1 and 1.0")
+    if args.strategy == "full" and args.video_scale_factor < 1.0:
+        print(f"Note: --strategy full tracks at original resolution; "
+              f"--video_scale_factor {args.video_scale_factor} is ignored (use --strategy proxy)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dense object annotations with a video predictor")
+    parser.add_argument("--video_id", type=str, required=True)
+    add_processing_args(parser)
+    args = parser.parse_args()
+    validate_processing_args(parser, args)
+
+    args.video_path = resolve_video_path(args.video_path, args.video_id)
+    print(f"Video path: {args.video_path}")
+
+    with open(args.assoc_info, 'r') as f:
+        assoc_info = json.load(f)
+    with open(args.mask_info, 'r') as f:
+        mask_info = json.load(f)
+
+    engine = DenseAnnotationEngine(args, assoc_info, mask_info)
+    engine.process_video()
@@ -0,0 +1,525 @@
+"""
+Shared helpers for the dense annotation scripts.
+
+Window checkpoints: every temporal window's results are streamed to their own
+JSONL shard (JSONLFrameWriter) while it is tracked, and a manifest records which
+windows are complete. A preempted or OOM-killed job can then be restarted with
+--resume and only the unfinished windows are tracked again.
+
+Window merging: consecutive windows overlap, so frames in the overlap are
+tracked twice. The shards are merged with a streaming k-way merge on frame
+number and duplicate assoc_ids in the overlap are resolved per object, so
+the merge only ever holds one frame per shard in memory. Optional RLE mask
+side files (see mask_utils) are written per window and merged the same way.
+
+Object ids: SAM 2 needs an integer id per tracked object. ObjectIdAllocator
+assigns dense ids 0..N-1 in sorted assoc_id order and persists the mapping, so
+ids never depend on Python's randomized string hashing, never collide, and
+stay the same on resume.
+
+Output sampling and stage timing: SAM 2 has to track every frame, but with
+--frame_interval N only every Nth frame is written. iter_sampled_frames drops
+the other frames' outputs as soon as the tracker yields them, and StageTimer
+records where the wall time of a run goes.
+"""
+
+import os
+import json
+import heapq
+import itertools
+import time
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Iterator, Iterable, Optional, Set, Tuple
+
+from mask_utils import MaskRLEReader, MaskRLEWriter
+
+
+MANIFEST_NAME = "manifest.json"
+MERGE_POLICIES = ("boundary", "iou_fuse")
+
+
+def _atomic_write_json(path: str, data: Dict):
+    """Write JSON to a temporary file and rename it, so readers never see a partial file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JSONLFrameWriter:
+    """
+    Streams {"frame_number", "objects"} lines in increasing frame order to a JSONL file.
+
+    Lines go to <path>.tmp, which replaces path only on close(), so readers never see a
+    partial file. Used as a context manager, the temporary file is discarded on error.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.num_frames = 0
+        self._last_frame = None
+        self._file = open(self.tmp_path, 'w')
+
+    def write_frame(self, frame_number: int, objects: List[Dict]):
+        if self._last_frame is not None and frame_number <= self._last_frame:
+            raise ValueError(f"Frames must be written in increasing order ({frame_number} after {self._last_frame})")
+        self._file.write(json.dumps({"frame_number": frame_number, "objects": objects}) + "\n")
+        self._last_frame = frame_number
+        self.num_frames += 1
+
+    def close(self):
+        """Flush to disk and move the file into place."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Discard everything written so far."""
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class WindowCheckpoint:
+    """Per-window result shards plus a manifest of completed windows for one video."""
+
+    def __init__(self, checkpoint_dir: str, video_id: str, config: Dict, resume: bool = False):
+        """
+        Open (or start) the checkpoint for a video.
+
+        Args:
+            checkpoint_dir: Directory holding the manifest and window shards
+            video_id: Video the windows belong to
+            config: Processing parameters that affect the results (frame interval,
+                scale factor, window layout). Resuming with a different config is refused.
+            resume: Keep completed windows from a previous run instead of starting over
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.video_id = video_id
+        # Round-trip through JSON so the comparison matches what is stored on disk
+        self.config = json.loads(json.dumps(config))
+        self.manifest_path = os.path.join(checkpoint_dir, MANIFEST_NAME)
+
+        if resume and os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("video_id") != video_id or self.manifest.get("config") != self.config:
+                raise ValueError(
+                    f"Checkpoint in {checkpoint_dir} was created with different settings "
+                    f"({self.manifest.get('config')}); rerun without --resume to start over"
+                )
+            print(f"Resuming from checkpoint: {len(self.manifest['windows'])} window(s) already completed")
+        else:
+            if os.path.exists(checkpoint_dir):
+                shutil.rmtree(checkpoint_dir)
+            self.manifest = {
+                "video_id": video_id,
+                "config": self.config,
+                "windows": {},
+            }
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            _atomic_write_json(self.manifest_path, self.manifest)
+
+    def is_complete(self, window_idx: int, start_frame: int, end_frame: int) -> bool:
+        """Return True if this window was finished by a previous run and its shard still exists."""
+        entry = self.manifest["windows"].get(str(window_idx))
+        if entry is None:
+            return False
+        if entry["start_frame"] != start_frame or entry["end_frame"] != end_frame:
+            return False
+        if entry.get("masks") and not os.path.exists(os.path.join(self.checkpoint_dir, entry["masks"] + ".rle.npz")):
+            return False
+        return os.path.exists(os.path.join(self.checkpoint_dir, entry["shard"]))
+
+    def mask_prefix(self, window_idx: int, start_frame: int, end_frame: int) -> str:
+        """Path prefix for this window's RLE mask side file."""
+        return os.path.join(self.checkpoint_dir, f"window_{window_idx:04d}_{start_frame}_{end_frame}")
+
+    def shard_path(self, window_idx: int, start_frame: int, end_frame: int) -> str:
+        """Path of this window's JSONL result shard."""
+        return os.path.join(self.checkpoint_dir, f"window_{window_idx:04d}_{start_frame}_{end_frame}.jsonl")
+
+    def window_writer(self, window_idx: int, start_frame: int, end_frame: int) -> "JSONLFrameWriter":
+        """Streaming writer for this window's shard; call complete_window once it is closed."""
+        return JSONLFrameWriter(self.shard_path(window_idx, start_frame, end_frame))
+
+    def complete_window(self, window_idx: int, start_frame: int, end_frame: int,
+                        num_frames: int, masks_written: bool = False) -> str:
+        """
+        Mark a window complete after its shard has been written.
+
+        The shard is written before the manifest is updated, so a crash in between
+        only costs recomputing this window. Set masks_written if the window's RLE masks
+        were written to mask_prefix(...), so they are merged with the shards.
+
+        Returns:
+            Path to the window's shard
+        """
+        shard_path = self.shard_path(window_idx, start_frame, end_frame)
+        self.manifest["windows"][str(window_idx)] = {
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "shard": os.path.basename(shard_path),
+            "num_frames": num_frames,
+            "masks": os.path.basename(self.mask_prefix(window_idx, start_frame, end_frame)) if masks_written else None,
+            "completed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        _atomic_write_json(self.manifest_path, self.manifest)
+        return shard_path
+
+    def write_window(self, window_idx: int, start_frame: int, end_frame: int,
+                     window_results: Dict[int, List[Dict]], masks_written: bool = False) -> str:
+        """Write one window's results ({frame_idx: objects}) to its shard and mark the window complete."""
+        with self.window_writer(window_idx, start_frame, end_frame) as writer:
+            for frame_idx in sorted(window_results.keys()):
+                writer.write_frame(frame_idx, window_results[frame_idx])
+        return self.complete_window(window_idx, start_frame, end_frame, writer.num_frames, masks_written)
+
+    def completed_windows(self) -> List[Dict]:
+        """Return manifest entries of completed windows ordered by window index."""
+        return [
+            {"window_idx": int(idx), **entry}
+            for idx, entry in sorted(self.manifest["windows"].items(), key=lambda item: int(item[0]))
+        ]
+
+    def iter_merged_frames(self, policy: str = "boundary", iou_threshold: float = 0.5) -> Iterator[Dict]:
+        """Yield merged frame entries across all completed windows, in frame order."""
+        return merge_window_shards(self.checkpoint_dir, self.completed_windows(), policy, iou_threshold)
+
+    def merge_masks(self, output_prefix: str) -> int:
+        """Merge the windows' RLE mask files into one side file; returns the number of masks."""
+        return merge_mask_shards(self.checkpoint_dir, self.completed_windows(), output_prefix)
+
+    def cleanup(self):
+        """Remove the manifest and all shards once the merged output has been written."""
+        if os.path.exists(self.checkpoint_dir):
+            shutil.rmtree(self.checkpoint_dir)
+            print(f"Removed window checkpoint: {self.checkpoint_dir}")
+
+
+class ObjectIdAllocator:
+    """Dense, deterministic mapping between a video's assoc_ids and SAM 2 object ids."""
+
+    def __init__(self, mapping: Dict[str, int]):
+        """
+        Args:
+            mapping: assoc_id -> object id; ids must be distinct non-negative integers
+        """
+        seen = {}
+        for assoc_id, obj_id in mapping.items():
+            if not isinstance(obj_id, int) or obj_id < 0:
+                raise ValueError(f"Invalid object id {obj_id!r} for assoc_id {assoc_id}")
+            if obj_id in seen:
+                raise ValueError(f"Object id collision: {seen[obj_id]} and {assoc_id} both map to {obj_id}")
+            seen[obj_id] = assoc_id
+        self.mapping = dict(mapping)
+        self._assoc_ids = seen
+
+    @classmethod
+    def for_video(cls, assoc_ids: Iterable[str], path: Optional[str] = None) -> "ObjectIdAllocator":
+        """
+        Ids for a video's assoc_ids, reusing the mapping persisted at path if there is one.
+
+        New assoc_ids get the next free ids in sorted order, so existing objects keep their
+        ids when assoc_info grows. The (possibly extended) mapping is written back to path.
+        """
+        mapping = {}
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                mapping = json.load(f)["object_ids"]
+        next_id = max(mapping.values(), default=-1) + 1
+        new_assoc_ids = sorted(set(assoc_ids) - set(mapping))
+        for assoc_id in new_assoc_ids:
+            mapping[assoc_id] = next_id
+            next_id += 1
+
+        allocator = cls(mapping)
+        if path is not None and (new_assoc_ids or not os.path.exists(path)):
+            _atomic_write_json(path, {"object_ids": allocator.mapping})
+        return allocator
+
+    def obj_id(self, assoc_id: str) -> int:
+        return self.mapping[assoc_id]
+
+    def assoc_id(self, obj_id: int) -> str:
+        return self._assoc_ids[obj_id]
+
+    def __len__(self):
+        return len(self.mapping)
+
+
+def peek_completed_windows(checkpoint_dir: str, video_id: str, config: Dict) -> Set[int]:
+    """
+    Indices of windows a resumed run would skip, read without modifying the checkpoint.
+
+    Returns an empty set if there is no checkpoint or it was created with a different config.
+    """
+    manifest_path = os.path.join(checkpoint_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return set()
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get("video_id") != video_id or manifest.get("config") != json.loads(json.dumps(config)):
+        return set()
+    return {
+        int(idx) for idx, entry in manifest["windows"].items()
+        if os.path.exists(os.path.join(checkpoint_dir, entry["shard"]))
+    }
+
+
+def bbox_iou(bbox_a: List[float], bbox_b: List[float]) -> float:
+    """Intersection over union of two [xmin, ymin, xmax, ymax] boxes."""
+    ix_min = max(bbox_a[0], bbox_b[0])
+    iy_min = max(bbox_a[1], bbox_b[1])
+    ix_max = min(bbox_a[2], bbox_b[2])
+    iy_max = min(bbox_a[3], bbox_b[3])
+    intersection = max(0.0, ix_max - ix_min) * max(0.0, iy_max - iy_min)
+    area_a = max(0.0, bbox_a[2] - bbox_a[0]) * max(0.0, bbox_a[3] - bbox_a[1])
+    area_b = max(0.0, bbox_b[2] - bbox_b[0]) * max(0.0, bbox_b[3] - bbox_b[1])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def _boundary_distance(frame_idx: int, start_frame: int, end_frame: int, video_end_frame: int) -> float:
+    """
+    Distance in frames from frame_idx to the nearest window boundary. The start and end of
+    the video are not boundaries (nothing is cut there), so they count as infinitely far.
+    """
+    to_start = frame_idx - start_frame if start_frame > 0 else float("inf")
+    to_end = end_frame - 1 - frame_idx if end_frame < video_end_frame else float("inf")
+    return min(to_start, to_end)
+
+
+def _iter_shard(shard_path: str, window_idx: int, start_frame: int, end_frame: int) -> Iterator[Tuple]:
+    """Yield (frame_number, window_idx, start_frame, end_frame, objects) for a frame-sorted shard."""
+    with open(shard_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                frame_data = json.loads(line)
+                yield frame_data["frame_number"], window_idx, start_frame, end_frame, frame_data["objects"]
+
+
+def resolve_overlap(frame_idx: int, candidates: List[Tuple[int, int, List[Dict]]], video_end_frame: int,
+                    policy: str = "boundary", iou_threshold: float = 0.5) -> Tuple[List[Dict], int]:
+    """
+    Resolve one frame that was produced by several windows.
+
+    Args:
+        frame_idx: Frame number in original video coordinates
+        candidates: (start_frame, end_frame, objects) for each window that produced the frame
+        video_end_frame: End frame of the last window (the video end is not a boundary)
+        policy: "boundary" keeps each assoc_id from the window where the frame is farthest
+            from a window boundary; "iou_fuse" additionally averages the boxes (weighted by
+            boundary distance) when the windows agree with IoU >= iou_threshold
+        iou_threshold: Minimum IoU for fusing boxes under the "iou_fuse" policy
+
+    Returns:
+        Tuple of (objects with one entry per assoc_id, number of duplicate entries dropped)
+    """
+    # assoc_id -> list of (boundary_distance, object), in first-seen order
+    per_object = {}
+    for start_frame, end_frame, objects in candidates:
+        distance = _boundary_distance(frame_idx, start_frame, end_frame, video_end_frame)
+        for obj in objects:
+            per_object.setdefault(obj["assoc_id"], []).append((distance, obj))
+
+    merged = []
+    num_dropped = 0
+    for assoc_id, entries in per_object.items():
+        num_dropped += len(entries) - 1
+        best_distance, best_obj = max(entries, key=lambda entry: entry[0])
+        if policy == "iou_fuse" and len(entries) > 1:
+            agreeing = [(d, o) for d, o in entries if bbox_iou(o["bbox"], best_obj["bbox"]) >= iou_threshold]
+            # Frames at the video edges have infinite distance and are never fused
+            if len(agreeing) > 1 and best_distance != float("inf"):
+                weights = [d + 1.0 for d, _ in agreeing]
+                total = sum(weights)
+                fused_bbox = [
+                    sum(w * o["bbox"][k] for w, (_, o) in zip(weights, agreeing)) / total
+                    for k in range(4)
+                ]
+                best_obj = {**best_obj, "bbox": fused_bbox}
+        merged.append(best_obj)
+    return merged, num_dropped
+
+
+def merge_window_shards(checkpoint_dir: str, windows: List[Dict], policy: str = "boundary",
+                        iou_threshold: float = 0.5) -> Iterator[Dict]:
+    """
+    Streaming k-way merge of frame-sorted window shards.
+
+    Args:
+        checkpoint_dir: Directory containing the shards
+        windows: Completed window entries (window_idx, start_frame, end_frame, shard)
+        policy: Duplicate resolution policy for overlapping frames, see resolve_overlap
+        iou_threshold: IoU threshold for the "iou_fuse" policy
+
+    Yields:
+        {"frame_number": ..., "objects": [...]} dictionaries in frame order
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown merge policy: {policy} (expected one of {MERGE_POLICIES})")
+    if not windows:
+        return
+    video_end_frame = max(entry["end_frame"] for entry in windows)
+
+    shard_iters = [
+        _iter_shard(os.path.join(checkpoint_dir, entry["shard"]),
+                    entry["window_idx"], entry["start_frame"], entry["end_frame"])
+        for entry in windows
+    ]
+    # Ties on frame number are broken by window index, so the objects list is never compared
+    merged_iter = heapq.merge(*shard_iters, key=lambda item: (item[0], item[1]))
+
+    num_overlap_frames = 0
+    num_dropped_total = 0
+    for frame_idx, group in itertools.groupby(merged_iter, key=lambda item: item[0]):
+        candidates = [(start_frame, end_frame, objects) for _, _, start_frame, end_frame, objects in group]
+        if len(candidates) > 1:
+            num_overlap_frames += 1
+            merged_objects, num_dropped = resolve_overlap(
+                frame_idx, candidates, video_end_frame, policy, iou_threshold)
+            num_dropped_total += num_dropped
+        else:
+            merged_objects = candidates[0][2]
+        yield {"frame_number": frame_idx, "objects": merged_objects}
+
+    print(f"Merged {len(windows)} window shard(s): {num_overlap_frames} overlapping frames, "
+          f"{num_dropped_total} duplicate object entries resolved ({policy})")
+
+
+class StageTimer:
+    """Accumulates wall time and call counts per named pipeline stage."""
+
+    def __init__(self, sync: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            sync: Called at every stage boundary when set, e.g. torch.cuda.synchronize,
+                so asynchronous GPU work is attributed to the stage that launched it
+        """
+        self.sync = sync
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, name: str, seconds: float, count: int = 1):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as one call of the given stage."""
+        if self.sync is not None:
+            self.sync()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.sync is not None:
+                self.sync()
+            self.add(name, time.perf_counter() - start)
+
+    def merge(self, other: "StageTimer"):
+        """Add another timer's totals (e.g. one window's) into this one."""
+        for name, seconds in other.totals.items():
+            self.add(name, seconds, other.counts[name])
+
+    def summary(self) -> Dict[str, Dict]:
+        """Return {stage: {"seconds", "calls"}} in insertion order."""
+        return {
+            name: {"seconds": round(seconds, 3), "calls": self.counts[name]}
+            for name, seconds in self.totals.items()
+        }
+
+    def report(self, title: str = "Stage timing"):
+        """Print the time spent per stage and its share of the total."""
+        total = sum(self.totals.values())
+        print(f"{title} (total {total:.1f}s):")
+        for name, seconds in self.totals.items():
+            share = 100.0 * seconds / total if total > 0 else 0.0
+            print(f"  {name:<16} {seconds:9.2f}s {share:5.1f}%  ({self.counts[name]} calls)")
+
+
+def iter_sampled_frames(propagation: Iterable[Tuple], frame_interval: int, frame_offset: int = 0,
+                        timer: Optional[StageTimer] = None) -> Iterator[Tuple]:
+    """
+    Consume a propagate_in_video generator and yield only the sampled frames.
+
+    The tracker still runs on every frame (the generator is fully consumed), but the
+    outputs of non-sampled frames are released immediately: no thresholding, bbox
+    extraction or host transfer is ever done for them.
+
+    Args:
+        propagation: Iterator of (frame_idx, obj_ids, mask_logits) from the predictor
+        frame_interval: Keep frames whose global index is a multiple of this
+        frame_offset: Added to frame_idx to get the global frame index (window start)
+        timer: Optional StageTimer; tracking time is recorded under "track"
+
+    Yields:
+        (global_frame_idx, local_frame_idx, obj_ids, mask_logits) for sampled frames
+    """
+    iterator = iter(propagation)
+    while True:
+        start = time.perf_counter()
+        try:
+            frame_idx, obj_ids, mask_logits = next(iterator)
+        except StopIteration:
+            break
+        if timer is not None:
+            if timer.sync is not None:
+                timer.sync()
+            timer.add("track", time.perf_counter() - start)
+
+        global_frame_idx = frame_idx + frame_offset
+        if global_frame_idx % frame_interval != 0:
+            # Drop the reference right away so the device tensor can be reused
+            del mask_logits
+            continue
+        yield global_frame_idx, frame_idx, obj_ids, mask_logits
+
+
+def merge_mask_shards(checkpoint_dir: str, windows: List[Dict], output_prefix: str) -> int:
+    """
+    Merge per-window RLE mask files into a single file ordered by (frame, assoc_id).
+
+    Masks in window overlaps are taken from the window where the frame is farthest from
+    a window boundary, the same window the "boundary" bbox merge keeps. Only the indexes
+    are held in memory; counts are copied from the windows' memory maps.
+
+    Returns:
+        Number of masks written
+    """
+    windows = [entry for entry in windows if entry.get("masks")]
+    if not windows:
+        return 0
+    video_end_frame = max(entry["end_frame"] for entry in windows)
+
+    readers = [MaskRLEReader(os.path.join(checkpoint_dir, entry["masks"])) for entry in windows]
+    # (frame, assoc_id) -> (boundary distance, reader position)
+    selected = {}
+    for pos, (entry, reader) in enumerate(zip(windows, readers)):
+        for key in reader.keys():
+            distance = _boundary_distance(key[0], entry["start_frame"], entry["end_frame"], video_end_frame)
+            if key not in selected or distance > selected[key][0]:
+                selected[key] = (distance, pos)
+
+    with MaskRLEWriter(output_prefix, metadata=readers[0].metadata) as writer:
+        for frame_number, assoc_id in sorted(selected):
+            reader = readers[selected[(frame_number, assoc_id)][1]]
+            writer.add(frame_number, assoc_id, reader.get_counts(frame_number, assoc_id),
+                       reader.get_size(frame_number, assoc_id))
+    return len(selected)
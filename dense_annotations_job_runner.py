@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Run dense annotations for a queue of videos on one GPU job.
+
+dense_annotations_slurm_optimized.sh used to start the dense annotation script
+once per video, so every video reloaded SAM 2 and the annotation JSON files, and the GPU
+sat idle while ffmpeg created window segments. This runner keeps one process and one
+predictor for the whole queue. CPU-side preparation (window planning, prompt extraction,
+video segment creation; see prepare_video) for the next --prefetch_videos videos runs in a
+pool of worker processes while the GPU tracks the current video.
+
+A per-video timing report is appended to --timing_report as JSON lines. With --resume,
+videos whose merged output already exists (e.g. finished before the job was requeued) are
+dropped from the queue before anything is prepared for them.
+
+Usage:
+    python dense_annotations_job_runner.py --video_ids_file video_ids_twentyExamples.txt --resume
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from dense_annotation_engine import (
+    DenseAnnotationEngine,
+    add_processing_args,
+    validate_processing_args,
+    resolve_video_path,
+    prepare_video,
+    video_finished,
+)
+
+
+def load_video_ids(path: str):
+    """Video IDs from a text file, one per line; empty lines are skipped."""
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def video_args(args, video_id: str, video_root: str):
+    """Copy of the job arguments for a single video."""
+    per_video = argparse.Namespace(**vars(args))
+    per_video.video_id = video_id
+    per_video.video_path = resolve_video_path(video_root, video_id)
+    return per_video
+
+
+def append_report(path: str, entry: dict):
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dense annotations for a queue of videos on one GPU")
+    parser.add_argument("--video_ids_file", type=str, default="video_ids_twentyExamples.txt")
+    add_processing_args(parser)
+    parser.add_argument("--prep_workers", type=int, default=4,
+                        help="Worker processes for CPU-side video preparation (default: 4)")
+    parser.add_argument("--prefetch_videos", type=int, default=2,
+                        help="Number of upcoming videos prepared while the GPU is busy (default: 2)")
+    parser.add_argument("--segment_dir", type=str, default=None,
+                        help="Directory for prepared window segments (default: system temp directory)")
+    parser.add_argument("--timing_report", type=str, default=None,
+                        help="JSONL file for per-video timings (default: <output_dir>/job_timing_report.jsonl)")
+    args = parser.parse_args()
+    validate_processing_args(parser, args)
+
+    video_ids = load_video_ids(args.video_ids_file)
+    if args.resume:
+        # Checkpoints of merged videos are deleted, so the merged output is what marks them done
+        finished = {video_id for video_id in video_ids if video_finished(args, video_id)}
+        if finished:
+            print(f"Skipping {len(finished)} videos merged by a previous run")
+            video_ids = [video_id for video_id in video_ids if video_id not in finished]
+    video_root = args.video_path
+    segment_root = args.segment_dir or os.path.join(tempfile.gettempdir(), f"dense_segments_{os.getpid()}")
+    timing_report = args.timing_report or os.path.join(args.output_dir, "job_timing_report.jsonl")
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Queued {len(video_ids)} videos; preparing up to {args.prefetch_videos} ahead "
+          f"with {args.prep_workers} workers")
+    print(f"Timing report: {timing_report}")
+
+    job_start = time.perf_counter()
+
+    # Start the workers before SAM 2 touches CUDA; spawn so they never inherit a CUDA context
+    pool = ProcessPoolExecutor(max_workers=args.prep_workers,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+    with open(args.assoc_info, 'r') as f:
+        assoc_info = json.load(f)
+    with open(args.mask_info, 'r') as f:
+        mask_info = json.load(f)
+
+    # Workers only receive the entries of their own video
+    futures = {}
+
+    def submit(idx):
+        video_id = video_ids[idx]
+        per_video = video_args(args, video_id, video_root)
+        futures[video_id] = pool.submit(
+            prepare_video, per_video,
+            assoc_info.get(video_id, {}), mask_info.get(video_id, {}),
+            os.path.join(segment_root, video_id))
+
+    next_submit = 0
+    engine = None
+    gpu_seconds = 0.0
+    wait_seconds = 0.0
+
+    try:
+        for idx, video_id in enumerate(video_ids):
+            # Keep the preparation queue filled
+            while next_submit < len(video_ids) and next_submit <= idx + args.prefetch_videos:
+                submit(next_submit)
+                next_submit += 1
+
+            # SAM 2 is loaded once, while the first videos are being prepared
+            if engine is None:
+                engine = DenseAnnotationEngine(args, assoc_info, mask_info)
+
+            print(f"\n{'#'*60}")
+            print(f"VIDEO {idx+1}/{len(video_ids)}: {video_id}")
+            print(f"{'#'*60}")
+
+            entry = {"video_id": video_id, "status": "ok",
+                     "started_at": datetime.now().isoformat(timespec="seconds")}
+            future = futures.pop(video_id)
+
+            # Time the GPU sits idle waiting for this video's preparation
+            wait_start = time.perf_counter()
+            try:
+                prepared = future.result()
+            except Exception as e:
+                print(f"Error preparing video_id {video_id}: {e}")
+                entry.update(status="prep_failed", error=str(e))
+                shutil.rmtree(os.path.join(segment_root, video_id), ignore_errors=True)
+                append_report(timing_report, entry)
+                continue
+            entry["prep_wait_seconds"] = round(time.perf_counter() - wait_start, 3)
+            entry["prep_seconds"] = round(sum(stage["seconds"] for stage in prepared["timing"].values()), 3)
+            entry["prep_stages"] = prepared["timing"]
+            entry["num_windows"] = len(prepared["windows"])
+            entry["prepared_segments"] = len(prepared["segments"])
+            wait_seconds += entry["prep_wait_seconds"]
+
+            process_start = time.perf_counter()
+            try:
+                engine.args = video_args(args, video_id, video_root)
+                stages = engine.process_video(prepared)
+                if stages is None:
+                    entry["status"] = "skipped" if not prepared["tracked"] else "incomplete"
+                else:
+                    entry["stages"] = stages
+            except Exception as e:
+                print(f"Error processing video_id {video_id}: {e}")
+                entry.update(status="failed", error=str(e))
+            finally:
+                shutil.rmtree(os.path.join(segment_root, video_id), ignore_errors=True)
+            entry["process_seconds"] = round(time.perf_counter() - process_start, 3)
+            gpu_seconds += entry["process_seconds"]
+
+            append_report(timing_report, entry)
+            print(f"{video_id}: {entry['status']} - prepared in {entry['prep_seconds']:.1f}s "
+                  f"(GPU waited {entry['prep_wait_seconds']:.1f}s), processed in {entry['process_seconds']:.1f}s")
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        if args.segment_dir is None:
+            shutil.rmtree(segment_root, ignore_errors=True)
+
+    total = time.perf_counter() - job_start
+    print(f"\nJob finished in {total:.1f}s: {gpu_seconds:.1f}s processing, "
+          f"{wait_seconds:.1f}s waiting for preparation")
+    print(f"Per-video timings written to {timing_report}")
+
+
+if __name__ == "__main__":
+    main()
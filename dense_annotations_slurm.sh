@@ -37,6 +37,7 @@ while IFS= read -r video_id || [ -n "$video_id" ]; do
         --assoc_info scene-and-object-movements/assoc_info.json \
         --mask_info scene-and-object-movements/mask_info.json \
         --output_dir outputs/dense_annotations \
+        --strategy proxy \
         --video_scale_factor 0.5 \
         --frame_interval $FRAME_INTERVAL"
     
@@ -6,6 +6,7 @@
 #SBATCH --cpus-per-task=64
 #SBATCH --gpus=a40:1
 #SBATCH --qos=long
+#SBATCH --requeue
 #SBATCH --output=logs/R-%x.%j.out
 #SBATCH --error=logs/R-%x.%j.err
 
@@ -21,6 +22,10 @@ VIDEO_SCALE_FACTOR=0.5
 WINDOW_DURATION=300  # 5 minutes
 WINDOW_OVERLAP=30    # 30 seconds
 
+# CPU-side preparation of upcoming videos
+PREP_WORKERS=8       # worker processes (ffmpeg uses several threads each)
+PREFETCH_VIDEOS=2    # videos prepared ahead of the one on the GPU
+
 # Read video IDs from file and loop over them
 VIDEO_IDS_FILE="video_ids_twentyExamples.txt"
 
@@ -37,40 +42,37 @@ echo "  - Temporal window processing (5-minute windows)"
 echo "  - Video offloading to CPU"
 echo "  - Streaming result management"
 echo "  - Aggressive memory cleanup between windows"
+echo "  - Per-window checkpoints (requeued jobs resume from the last completed window)"
+echo "  - CPU-side preparation of upcoming videos in $PREP_WORKERS worker processes"
 echo "Expected memory reduction: 70-85%"
 echo ""
 
-while IFS= read -r video_id || [ -n "$video_id" ]; do
-    # Skip empty lines
-    [ -z "$video_id" ] && continue
-    
-    echo "Processing video_id: $video_id"
-    echo "Estimated memory usage: ~7-14GB (down from ~48GB)"
-    
-    # Run the optimized dense annotation script
-    CMD="$PYTHONPATH -u generate_dense_annotations_optimized.py \
-        --video_id $video_id \
-        --video_path $VIDEO_DATA_DIR \
-        --scene_graph_dir outputs/scene_graphs \
-        --assoc_info scene-and-object-movements/assoc_info.json \
-        --mask_info scene-and-object-movements/mask_info.json \
-        --output_dir outputs/dense_annotations \
-        --video_scale_factor $VIDEO_SCALE_FACTOR \
-        --frame_interval $FRAME_INTERVAL \
-        --window_duration $WINDOW_DURATION \
-        --window_overlap $WINDOW_OVERLAP"
-    
-    echo "Executing: $CMD"
-    eval $CMD
-    
-    # Check if command was successful
-    if [ $? -ne 0 ]; then
-        echo "Error processing video_id: $video_id"
-    else
-        echo "Successfully processed video_id: $video_id"
-    fi
-    echo "---"
-done < "$VIDEO_IDS_FILE"
+# One process for the whole queue: SAM 2 is loaded once and upcoming videos are prepared
+# (window planning, prompts, ffmpeg segments) on the allocated CPUs while the GPU tracks
+CMD="$PYTHONPATH -u dense_annotations_job_runner.py \
+    --video_ids_file $VIDEO_IDS_FILE \
+    --video_path $VIDEO_DATA_DIR \
+    --scene_graph_dir outputs/scene_graphs \
+    --assoc_info scene-and-object-movements/assoc_info.json \
+    --mask_info scene-and-object-movements/mask_info.json \
+    --output_dir outputs/dense_annotations \
+    --strategy windowed \
+    --video_scale_factor $VIDEO_SCALE_FACTOR \
+    --frame_interval $FRAME_INTERVAL \
+    --window_duration $WINDOW_DURATION \
+    --window_overlap $WINDOW_OVERLAP \
+    --prep_workers $PREP_WORKERS \
+    --prefetch_videos $PREFETCH_VIDEOS \
+    --resume"
+
+echo "Executing: $CMD"
+eval $CMD
+
+if [ $? -ne 0 ]; then
+    echo "Error running dense annotation job"
+fi
+echo "---"
 
 echo "Memory-optimized processing completed!"
 echo "Check outputs/dense_annotations/ for results"
+echo "Per-video timings: outputs/dense_annotations/job_timing_report.jsonl"
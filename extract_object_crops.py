@@ -7,19 +7,48 @@ Usage:
         --video_path /path/to/video/P01-20240202-171220.mp4 \
         --output_dir outputs/object_crops_P01-20240202-171220
 
+    # Many views per object from the SAM 2 tracks, one crop per object every 10 s at most
+    python extract_object_crops.py \
+        --dense_annotations outputs/dense_annotations/dense_annotations_P01-20240202-171220.jsonl \
+        --video_path /path/to/video/P01-20240202-171220.mp4 --track_stride 300 --max_crops_per_track 20
+
+    # Batch mode: many videos across worker processes
+    python extract_object_crops.py --video_ids_file video_ids_long.txt --workers 8 [--source dense]
+
+In batch mode the video is <video_root>/<person_id>/<video_id>.mp4 and the scene graphs are
+<scene_graph_dir>/scene_graphs_<video_id>.jsonl (the dense annotation layout). mask_info.json
+is split once into per-video shards under --mask_info_shard_dir, so each worker only loads the
+masks of its own video. Every worker process keeps one VideoCapture and one encoder thread pool
+for all the videos it is given. Crops of a video go to <output_dir>/<video_id>. With
+--source dense the crops come from <dense_annotation_dir>/dense_annotations_<video_id>.jsonl.
+
 The script will:
-1. Read mask_ids from the scene graphs JSONL file
+1. Read mask_ids from the scene graphs JSONL file (or sample frames of the dense annotation
+   tracks, see dense_track_crop_requests)
 2. Look up frame numbers and bounding boxes from mask_info.json
-3. Extract crops from the video at the specified frames
-4. Save crops as PNG files in the output directory
+3. Extract crops from the video at the specified frames in one monotonic decode pass
+   (seeking only across large gaps, see frame_reader.py)
+4. Encode and save crops (PNG, JPEG or WebP) on a thread pool while decoding continues,
+   as one file per crop or, with --output_format shards, packed into tar shards with an
+   index for random access (see crop_io.py)
+5. Record the stored crops in crop_manifest.json: entries with the same mask, frame and bbox
+   share one crop, and reruns only extract crops that are new or whose frame or bbox changed
 """
 
 import os
 import json
+import time
 import cv2
 import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from crop_io import (
+    CROP_FORMATS, CropManifest, CropWriter, ShardedCropWriter, crop_key, crop_key_tag, load_shard_index
+)
+from frame_reader import DEFAULT_MAX_GRAB_GAP, iter_frames, plan_frame_fetches, summarize_plan
+
 
 def load_scene_graphs(jsonl_path):
     """Load scene graphs from JSONL file."""
@@ -31,9 +60,26 @@ def load_scene_graphs(jsonl_path):
     return entries
 
 
-def load_mask_info(video_id):
-    """Load mask info for a specific video."""
-    with open("scene-and-object-movements/mask_info.json", 'r', encoding='utf-8') as f:
+DEFAULT_MASK_INFO = "scene-and-object-movements/mask_info.json"
+
+
+def load_mask_info(video_id, mask_info_path=DEFAULT_MASK_INFO, shard_dir=None):
+    """
+    Load mask info for a specific video.
+
+    Args:
+        video_id: Video to load
+        mask_info_path: The full mask_info.json
+        shard_dir: If set, read <shard_dir>/<video_id>.json written by shard_mask_info instead
+    """
+    if shard_dir is not None:
+        shard_path = os.path.join(shard_dir, f"{video_id}.json")
+        if not os.path.exists(shard_path):
+            raise ValueError(f"Video ID {video_id} not found in mask_info.json")
+        with open(shard_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    with open(mask_info_path, 'r', encoding='utf-8') as f:
         mask_info_all = json.load(f)
     
     if video_id not in mask_info_all:
@@ -42,21 +88,57 @@ def load_mask_info(video_id):
     return mask_info_all[video_id]
 
 
-def extract_crops_from_video(video_path, mask_info, scene_graphs, output_dir):
-    """Extract object crops from video using mask IDs."""
-    # Open video
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise ValueError(f"Could not open video: {video_path}")
-    
-    # Get video properties
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    print(f"Video properties: {total_frames} frames, {fps:.2f} fps")
-    
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
-    
+def shard_mask_info(mask_info_path, shard_dir, video_ids):
+    """
+    Split mask_info.json into one <video_id>.json per video.
+
+    Shards that exist and are newer than mask_info.json are kept, so the full file is only
+    parsed when it changed or a video has no shard yet.
+
+    Returns:
+        Number of shards written
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    source_mtime = os.path.getmtime(mask_info_path)
+    missing = [vid for vid in video_ids
+               if not os.path.exists(os.path.join(shard_dir, f"{vid}.json"))
+               or os.path.getmtime(os.path.join(shard_dir, f"{vid}.json")) < source_mtime]
+    if not missing:
+        return 0
+
+    with open(mask_info_path, 'r', encoding='utf-8') as f:
+        mask_info_all = json.load(f)
+    written = 0
+    for vid in missing:
+        if vid not in mask_info_all:
+            continue
+        shard_path = os.path.join(shard_dir, f"{vid}.json")
+        with open(shard_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(mask_info_all[vid], f)
+        os.replace(shard_path + ".tmp", shard_path)
+        written += 1
+    return written
+
+
+def video_path_for(video_root, video_id):
+    """<video_root>/<person_id>/<video_id>.mp4, as dense_annotation_engine.resolve_video_path."""
+    person_id = video_id.split('-')[0]
+    return os.path.join(video_root, person_id, f"{video_id}.mp4")
+
+
+def scene_graph_path_for(scene_graph_dir, video_id):
+    """Scene graphs written by generate_scene_graphs.py for a video."""
+    return os.path.join(scene_graph_dir, f"scene_graphs_{video_id}.jsonl")
+
+
+def scene_graph_crop_requests(scene_graphs, mask_info):
+    """
+    Crops for the masks referenced by scene-graph entries.
+
+    Returns:
+        One {"mask_id", "frame", "bbox", "object_name", "action", "time"} per entry whose mask
+        is in mask_info
+    """
     # Collect all mask_ids from scene graphs
     mask_entries = []
     for entry in scene_graphs:
@@ -64,67 +146,241 @@ def extract_crops_from_video(video_path, mask_info, scene_graphs, output_dir):
         if mask_id and mask_id != "unknown" and mask_id is not None:
             object_name = entry.get("object_name", "unknown")
             action = entry.get("action", "unknown")
-            time = entry.get("time", 0)
+            mask_time = entry.get("time", 0)
             mask_entries.append({
                 "mask_id": mask_id,
                 "object_name": object_name,
                 "action": action,
-                "time": time
+                "time": mask_time
             })
     
     print(f"Found {len(mask_entries)} mask IDs to process")
     
-    # Group by frame number for efficiency
-    frame_to_masks = {}
+    requests = []
     missing_masks = []
-    
     for entry in mask_entries:
         mask_id = entry["mask_id"]
         if mask_id not in mask_info:
             missing_masks.append(mask_id)
             continue
-        
-        frame_number = mask_info[mask_id]["frame_number"]
-        bbox = mask_info[mask_id]["bbox"]
-        
-        if frame_number not in frame_to_masks:
-            frame_to_masks[frame_number] = []
-        
-        frame_to_masks[frame_number].append({
-            "mask_id": mask_id,
-            "bbox": bbox,
-            "object_name": entry["object_name"],
-            "action": entry["action"],
-            "time": entry["time"]
+        requests.append({
+            **entry,
+            "frame": mask_info[mask_id]["frame_number"],
+            "bbox": mask_info[mask_id]["bbox"],
         })
     
     if missing_masks:
         print(f"Warning: {len(missing_masks)} mask IDs not found in mask_info.json")
         print(f"Sample missing IDs: {missing_masks[:5]}")
+    return requests
+
+
+def dense_track_crop_requests(dense_path, track_stride=300, max_crops_per_track=20):
+    """
+    Crops sampled from the per-frame tracks of a dense_annotations_<video_id>.jsonl file.
+
+    Frames are bucketed on a global grid (frame_number // track_stride) and each object
+    (assoc_id) is taken at the first frame it appears in per bucket, so objects visible
+    together share sampled frames and cost one decode between them. If an object has more
+    than max_crops_per_track samples, only every 2nd, 4th, ... bucket is kept until it fits
+    (0 keeps all); the kept buckets are nested across objects, so thinning keeps frames
+    shared too (a track left only on odd multiples is spaced evenly instead). The file is streamed, so only the sampled boxes are held in memory.
+
+    Returns:
+        Crop requests with mask_id = assoc_id, action "track" and time None (filled in from
+        the video fps)
+    """
+    tracks = {}
+    last_bucket = {}
+    with open(dense_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            frame = json.loads(line)
+            frame_number = frame["frame_number"]
+            bucket = frame_number // track_stride
+            for obj in frame["objects"]:
+                assoc_id = obj["assoc_id"]
+                if last_bucket.get(assoc_id) == bucket:
+                    continue
+                last_bucket[assoc_id] = bucket
+                tracks.setdefault(assoc_id, []).append((bucket, {
+                    "mask_id": assoc_id,
+                    "frame": frame_number,
+                    "bbox": obj["bbox"],
+                    "object_name": obj.get("assoc_name", assoc_id),
+                    "action": "track",
+                    "time": None,
+                }))
+
+    requests = []
+    for samples in tracks.values():
+        step = 1
+        while max_crops_per_track and len(samples) > max_crops_per_track:
+            thinned = [sample for sample in samples if sample[0] % (2 * step) == 0]
+            if not thinned:
+                # Only odd multiples of step left: fall back to evenly spaced samples
+                spacing = (len(samples) - 1) / max(max_crops_per_track - 1, 1)
+                samples = [samples[round(i * spacing)] for i in range(max_crops_per_track)]
+                break
+            samples, step = thinned, step * 2
+        requests.extend(request for _, request in samples)
+    print(f"Sampled {len(requests)} track crops of {len(tracks)} objects from {dense_path} "
+          f"(stride {track_stride} frames, at most {max_crops_per_track or 'all'} per track)")
+    return requests
+
+
+def extract_crops_from_video(video_path, crop_requests, output_dir, video_id=None,
+                             max_grab_gap=DEFAULT_MAX_GRAB_GAP,
+                             image_format="png", quality=None, writer_threads=4, max_pending=64,
+                             output_format="files", shard_size_mb=256, index_format="json",
+                             cap=None, executor=None):
+    """
+    Extract object crops from video.
+
+    crop_requests come from scene_graph_crop_requests or dense_track_crop_requests; all
+    crops of a frame are cut from a single decode of it.
+
+    Frames are fetched in increasing order; gaps of up to max_grab_gap frames are decoded
+    forward instead of seeking. Crops are encoded and written by a CropWriter thread pool;
+    the decode loop only blocks when max_pending crops are waiting. With output_format
+    "shards" they are packed into tar shards of at most shard_size_mb with an index_format
+    index instead of one file each.
+
+    Requests with the same (video_id, mask_id, frame, bbox) are stored as one crop, and
+    crops already recorded in the output directory's CropManifest are not extracted again.
+    Crops that are no longer referenced are removed.
+
+    A batch worker passes its own cap (reopened on video_path and left open) and encoder
+    executor, so neither is recreated per video.
+
+    Returns:
+        Counts of crops written, reused and removed, bytes, frames decoded and seconds taken
+    """
+    # Open video, reusing the caller's capture if given
+    owns_cap = cap is None
+    if owns_cap:
+        cap = cv2.VideoCapture(video_path)
+    else:
+        cap.open(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
     
-    print(f"Processing {len(frame_to_masks)} unique frames")
+    # Get video properties
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    print(f"Video properties: {total_frames} frames, {fps:.2f} fps")
     
-    # Process frames (sorted for efficient sequential reading)
-    processed_count = 0
-    sorted_frames = sorted(frame_to_masks.keys())
+    # Collapse requests that refer to the same crop (mask, frame and bbox)
+    crops = {}
+    for request in crop_requests:
+        key = crop_key(video_id, request["mask_id"], request["frame"], request["bbox"])
+        if key not in crops:
+            crops[key] = {"mask_id": request["mask_id"], "frame": request["frame"],
+                          "bbox": request["bbox"], "references": []}
+        crops[key]["references"].append({
+            "object_name": request["object_name"],
+            "action": request["action"],
+            "time": request["time"] if request["time"] is not None else request["frame"] / fps
+        })
     
-    for frame_num in sorted_frames:
-        # Seek directly to the frame (more efficient than reading sequentially)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-        
-        # Read the target frame
-        ret, frame = cap.read()
-        if not ret:
-            print(f"Warning: Could not read frame {frame_num}")
+    num_references = sum(len(crop["references"]) for crop in crops.values())
+    print(f"{len(crops)} unique crops for {num_references} references")
+    
+    # Reuse crops recorded by a previous run with the same config
+    config = {"output_format": output_format, "image_format": image_format, "quality": quality}
+    if output_format == "shards":
+        config["index_format"] = index_format
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = CropManifest(output_dir, video_id, config)
+    existing_records = {}
+    if output_format == "shards" and manifest.crops:
+        existing_records = {record["key"]: record for record in load_shard_index(output_dir)
+                            if os.path.exists(os.path.join(output_dir, record["shard"]))}
+    
+    stored = {}
+    for key in crops:
+        name = manifest.stored(key)
+        if name is None:
             continue
-        
+        if name in existing_records or (output_format == "files" and os.path.exists(os.path.join(output_dir, name))):
+            stored[key] = name
+    
+    # Group the crops still to extract by frame number for efficiency
+    frame_to_masks = {}
+    for key, crop in crops.items():
+        if key in stored:
+            continue
+        frame_to_masks.setdefault(crop["frame"], []).append({
+            "crop_key": key,
+            "mask_id": crop["mask_id"],
+            "bbox": crop["bbox"],
+            **crop["references"][0]
+        })
+    
+    print(f"Reusing {len(stored)} crops from {manifest.path}; "
+          f"extracting {len(crops) - len(stored)} from {len(frame_to_masks)} unique frames")
+    
+    # Process frames in one monotonic pass: seek across large gaps, grab forward across small ones
+    plan_summary = summarize_plan(plan_frame_fetches(frame_to_masks.keys(), max_grab_gap))
+    print(f"Fetch plan: {plan_summary['seeks']} seeks, {plan_summary['grabbed']} frames decoded forward "
+          f"(max grab gap {max_grab_gap})")
+    fetch_stats = {}
+    start_time = time.perf_counter()
+    if output_format == "shards":
+        kept_records = [existing_records[name] for name in stored.values()]
+        writer = ShardedCropWriter(output_dir, image_format, quality, writer_threads, max_pending, executor,
+                                   max_shard_bytes=shard_size_mb * 1024**2, index_format=index_format,
+                                   existing_records=kept_records)
+    else:
+        writer = CropWriter(output_dir, image_format, quality, writer_threads, max_pending, executor)
+    
+    try:
+        stored.update(extract_frame_crops(cap, frame_to_masks, max_grab_gap, fetch_stats, writer))
+    finally:
+        if owns_cap:
+            cap.release()
+        writer.close()
+    
+    # Drop crops no longer referenced; a new crop may have reused a stale crop's file name
+    removed = [entry["stored"] for key, entry in manifest.crops.items() if key not in crops]
+    if output_format == "files":
+        in_use = set(stored.values())
+        for name in removed:
+            if name not in in_use and os.path.exists(os.path.join(output_dir, name)):
+                os.remove(os.path.join(output_dir, name))
+    manifest.crops = {key: {**crops[key], "stored": name} for key, name in stored.items()}
+    manifest.save()
+    
+    elapsed = time.perf_counter() - start_time
+    print(f"\nExtracted {writer.stats['crops']} object crops to {output_dir} in {elapsed:.1f}s "
+          f"({len(stored) - writer.stats['crops']} reused, {len(removed)} removed)")
+    print(f"Decoder: {fetch_stats['seeks']} seeks, {fetch_stats['grabbed']} frames grabbed, "
+          f"{fetch_stats['retrieved']} retrieved, {fetch_stats['failed']} failed")
+    writer.report()
+    return {"crops": writer.stats["crops"], "reused": len(stored) - writer.stats["crops"],
+            "removed": len(removed), "bytes": writer.stats["bytes"],
+            "frames": fetch_stats["retrieved"], "failed_frames": fetch_stats["failed"],
+            "seconds": round(elapsed, 3)}
+
+
+def extract_frame_crops(cap, frame_to_masks, max_grab_gap, fetch_stats, writer):
+    """
+    Decode the frames of frame_to_masks and submit their crops to writer.
+
+    Returns:
+        crop_key -> stored file name (or shard sample key) of every submitted crop
+    """
+    processed_count = 0
+    stored = {}
+    for frame_num, frame in iter_frames(cap, frame_to_masks.keys(), max_grab_gap, fetch_stats):
         # Extract crops for all masks in this frame
         for mask_data in frame_to_masks[frame_num]:
             mask_id = mask_data["mask_id"]
             bbox = mask_data["bbox"]
             object_name = mask_data["object_name"]
             action = mask_data["action"]
-            time = mask_data["time"]
+            mask_time = mask_data["time"]
             
             # Extract bounding box coordinates
             xmin, ymin, xmax, ymax = bbox
@@ -140,7 +396,8 @@ def extract_crops_from_video(video_path, mask_info, scene_graphs, output_dir):
             # Extract crop
             crop = frame[ymin:ymax, xmin:xmax]
             
-            # Create filename: mask_id_objectname_action_time_frame.png
+            # Create filename: mask_id_objectname_action_time_frame_tag.<ext>, where the crop_key tag
+            # keeps crops of the same mask and frame with different boxes apart
             # Sanitize object name for filename
             if object_name:
                 safe_object_name = object_name.replace(" ", "_").replace("/", "_").replace("'", "")
@@ -153,18 +410,115 @@ def extract_crops_from_video(video_path, mask_info, scene_graphs, output_dir):
             if len(safe_object_name) > 50:
                 safe_object_name = safe_object_name[:50]
             
-            filename = f"{mask_id}_{safe_object_name}_{action}_{time:.2f}s_frame{frame_num}.png"
-            filepath = os.path.join(output_dir, filename)
+            filename = (f"{mask_id}_{safe_object_name}_{action}_{mask_time:.2f}s_frame{frame_num}_"
+                        f"{crop_key_tag(mask_data['crop_key'])}")
             
-            # Save crop
-            cv2.imwrite(filepath, crop)
+            # Queue crop for encoding; blocks only when the writer is max_pending crops behind
+            stored[mask_data["crop_key"]] = os.path.basename(writer.submit(filename, crop, {
+                "mask_id": mask_id,
+                "object_name": object_name,
+                "action": action,
+                "time": mask_time,
+                "frame": frame_num,
+                "bbox": [xmin, ymin, xmax, ymax],
+            }))
             processed_count += 1
             
             if processed_count % 100 == 0:
                 print(f"Processed {processed_count} crops...")
-    
-    cap.release()
-    print(f"\nExtracted {processed_count} object crops to {output_dir}")
+    return stored
+
+
+# Per-process state of batch workers: one capture and one encoder pool reused for every video
+_worker_state = {}
+
+
+def _init_batch_worker(writer_threads, opencv_threads):
+    """Worker process initializer."""
+    cv2.setNumThreads(opencv_threads)
+    _worker_state["cap"] = cv2.VideoCapture()
+    _worker_state["executor"] = ThreadPoolExecutor(max_workers=writer_threads)
+
+
+def _extract_video_worker(video_id, options):
+    """Extract the crops of one video in a batch worker."""
+    if options["source"] == "dense":
+        dense_path = os.path.join(options["dense_annotation_dir"], f"dense_annotations_{video_id}.jsonl")
+        crop_requests = dense_track_crop_requests(dense_path, options["track_stride"],
+                                                  options["max_crops_per_track"])
+    else:
+        scene_graphs = load_scene_graphs(scene_graph_path_for(options["scene_graph_dir"], video_id))
+        mask_info = load_mask_info(video_id, shard_dir=options["mask_info_shard_dir"])
+        crop_requests = scene_graph_crop_requests(scene_graphs, mask_info)
+    result = extract_crops_from_video(
+        video_path_for(options["video_root"], video_id), crop_requests,
+        os.path.join(options["output_dir"], video_id), video_id, options["max_grab_gap"],
+        options["image_format"], options["quality"], options["writer_threads"], options["max_pending"],
+        options["output_format"], options["shard_size_mb"], options["index_format"],
+        cap=_worker_state["cap"], executor=_worker_state["executor"])
+    _worker_state["cap"].release()
+    return result
+
+
+def default_output_root(source):
+    """Track crops go to their own directories, so the two manifests never replace each other."""
+    return "outputs/object_track_crops" if source == "dense" else "outputs/object_crops"
+
+
+def run_batch(args):
+    """Extract crops for every video in args.video_ids_file across args.workers processes."""
+    with open(args.video_ids_file, 'r') as f:
+        video_ids = [line.strip() for line in f if line.strip()]
+    print(f"Batch: {len(video_ids)} videos, {args.workers} workers x {args.writer_threads} encoder threads")
+
+    if args.source == "scene_graphs":
+        written = shard_mask_info(args.mask_info, args.mask_info_shard_dir, video_ids)
+        print(f"Mask info shards in {args.mask_info_shard_dir} ({written} written)")
+
+    options = {
+        "video_root": args.video_root,
+        "scene_graph_dir": args.scene_graph_dir,
+        "mask_info_shard_dir": args.mask_info_shard_dir,
+        "output_dir": args.output_dir or default_output_root(args.source),
+        "source": args.source,
+        "dense_annotation_dir": args.dense_annotation_dir,
+        "track_stride": args.track_stride,
+        "max_crops_per_track": args.max_crops_per_track,
+        "max_grab_gap": args.max_grab_gap,
+        "image_format": args.image_format,
+        "quality": args.quality,
+        "writer_threads": args.writer_threads,
+        "max_pending": args.max_pending,
+        "output_format": args.output_format,
+        "shard_size_mb": args.shard_size_mb,
+        "index_format": args.index_format,
+    }
+    start_time = time.perf_counter()
+    totals = {"crops": 0, "bytes": 0, "frames": 0}
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_batch_worker,
+                             initargs=(args.writer_threads, args.opencv_threads)) as pool:
+        futures = {pool.submit(_extract_video_worker, vid, options): vid for vid in video_ids}
+        for done, future in enumerate(as_completed(futures), 1):
+            video_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[{done}/{len(video_ids)}] {video_id}: failed: {e}")
+                failed.append(video_id)
+                continue
+            for key in totals:
+                totals[key] += result[key]
+            print(f"[{done}/{len(video_ids)}] {video_id}: {result['crops']} crops "
+                  f"({result['reused']} reused) in {result['seconds']:.1f}s")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\nBatch done: {totals['crops']} crops from {totals['frames']} frames of "
+          f"{len(video_ids) - len(failed)} videos, {totals['bytes'] / 1024**2:.1f} MB in {elapsed:.1f}s "
+          f"({totals['crops'] / max(elapsed, 1e-9):.1f} crops/s)")
+    if failed:
+        print(f"Failed videos ({len(failed)}): {', '.join(failed)}")
 
 
 def main():
@@ -174,47 +528,197 @@ def main():
     parser.add_argument(
         '--jsonl_path',
         type=str,
-        required=True,
-        help='Path to scene graphs JSONL file'
+        default=None,
+        help='Path to scene graphs JSONL file (single-video mode)'
+    )
+    parser.add_argument(
+        '--dense_annotations',
+        type=str,
+        default=None,
+        help='Crop from a dense_annotations_<video_id>.jsonl file instead of scene graphs '
+             '(single-video mode)'
     )
     parser.add_argument(
         '--video_path',
         type=str,
-        required=True,
-        help='Path to video file'
+        default=None,
+        help='Path to video file (single-video mode)'
     )
     parser.add_argument(
         '--output_dir',
         type=str,
         default=None,
-        help='Output directory for crops (default: outputs/object_crops/<video_id>)'
+        help='Output directory for crops (default: outputs/object_crops/<video_id>, or '
+             'outputs/object_track_crops/<video_id> for dense annotations; in batch mode the parent '
+             'of the per-video directories)'
+    )
+    parser.add_argument(
+        '--video_ids_file',
+        type=str,
+        default=None,
+        help='Batch mode: text file with one video ID per line'
+    )
+    parser.add_argument(
+        '--source',
+        type=str,
+        default='scene_graphs',
+        choices=['scene_graphs', 'dense'],
+        help='Batch mode: crop at the scene-graph masks or along the dense annotation tracks '
+             '(default: scene_graphs)'
+    )
+    parser.add_argument(
+        '--dense_annotation_dir',
+        type=str,
+        default='outputs/dense_annotations',
+        help='Batch mode: directory with dense_annotations_<video_id>.jsonl'
+    )
+    parser.add_argument(
+        '--track_stride',
+        type=int,
+        default=300,
+        help='Dense annotations: at most one crop per object every this many frames, on a grid shared by all objects (default: 300)'
+    )
+    parser.add_argument(
+        '--max_crops_per_track',
+        type=int,
+        default=20,
+        help='Dense annotations: at most this many crops per object, evenly spaced; 0 for no limit '
+             '(default: 20)'
+    )
+    parser.add_argument(
+        '--video_root',
+        type=str,
+        default='/coc/flash5/kvr6/data/hd-epic-data-files/HD-EPIC/Videos',
+        help='Batch mode: directory with <person_id>/<video_id>.mp4'
+    )
+    parser.add_argument(
+        '--scene_graph_dir',
+        type=str,
+        default='outputs/scene_graphs',
+        help='Batch mode: directory with scene_graphs_<video_id>.jsonl'
+    )
+    parser.add_argument(
+        '--mask_info',
+        type=str,
+        default=DEFAULT_MASK_INFO,
+        help='Path to mask_info.json'
+    )
+    parser.add_argument(
+        '--mask_info_shard_dir',
+        type=str,
+        default='outputs/mask_info_shards',
+        help='Batch mode: directory for the per-video mask_info shards'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Batch mode: worker processes, one video each at a time (default: 4)'
+    )
+    parser.add_argument(
+        '--opencv_threads',
+        type=int,
+        default=2,
+        help='Batch mode: OpenCV threads per worker, to avoid oversubscribing cores (default: 2)'
+    )
+    parser.add_argument(
+        '--max_grab_gap',
+        type=int,
+        default=DEFAULT_MAX_GRAB_GAP,
+        help='Decode forward instead of seeking when the next frame is at most this many '
+             f'frames ahead (default: {DEFAULT_MAX_GRAB_GAP}; 0 always seeks)'
+    )
+    parser.add_argument(
+        '--image_format',
+        type=str,
+        default='png',
+        choices=list(CROP_FORMATS),
+        help='Crop image format (default: png)'
+    )
+    parser.add_argument(
+        '--output_format',
+        type=str,
+        default='files',
+        choices=['files', 'shards'],
+        help='files: one image per crop; shards: tar shards (WebDataset layout) plus an index '
+             'of mask_id, object_name, action, time, frame, bbox, shard and offset (default: files)'
+    )
+    parser.add_argument(
+        '--shard_size_mb',
+        type=int,
+        default=256,
+        help='Maximum size of a tar shard in MB (default: 256)'
+    )
+    parser.add_argument(
+        '--index_format',
+        type=str,
+        default='json',
+        choices=['json', 'parquet'],
+        help='Shard index format; parquet needs pandas with pyarrow (default: json)'
+    )
+    parser.add_argument(
+        '--quality',
+        type=int,
+        default=None,
+        help='PNG compression level 0-9, or JPEG/WebP quality 0-100 '
+             '(default: ' + ', '.join(f'{fmt} {spec[2]}' for fmt, spec in CROP_FORMATS.items()) + ')'
+    )
+    parser.add_argument(
+        '--writer_threads',
+        type=int,
+        default=4,
+        help='Threads encoding and writing crops (default: 4)'
+    )
+    parser.add_argument(
+        '--max_pending',
+        type=int,
+        default=64,
+        help='Crops queued for the writer before decoding waits (default: 64)'
     )
     
     args = parser.parse_args()
     
-    # Load scene graphs
-    print(f"Loading scene graphs from {args.jsonl_path}")
-    scene_graphs = load_scene_graphs(args.jsonl_path)
+    if args.video_ids_file is not None:
+        run_batch(args)
+        return
+    if args.video_path is None or (args.jsonl_path is None) == (args.dense_annotations is None):
+        parser.error("--video_path and one of --jsonl_path or --dense_annotations are required "
+                     "unless --video_ids_file is given")
     
-    # Extract video_id from JSONL (from first entry)
-    if not scene_graphs:
-        raise ValueError("No entries found in JSONL file")
-    video_id = scene_graphs[0]["video_id"]
-    print(f"Video ID: {video_id}")
-    
-    # Load mask info
-    mask_info = load_mask_info(video_id)
-    print(f"Loaded {len(mask_info)} mask entries")
+    if args.dense_annotations is not None:
+        video_id = Path(args.video_path).stem
+        print(f"Video ID: {video_id}")
+        crop_requests = dense_track_crop_requests(args.dense_annotations, args.track_stride,
+                                                  args.max_crops_per_track)
+        source = "dense"
+    else:
+        # Load scene graphs
+        print(f"Loading scene graphs from {args.jsonl_path}")
+        scene_graphs = load_scene_graphs(args.jsonl_path)
+        
+        # Extract video_id from JSONL (from first entry)
+        if not scene_graphs:
+            raise ValueError("No entries found in JSONL file")
+        video_id = scene_graphs[0]["video_id"]
+        print(f"Video ID: {video_id}")
+        
+        # Load mask info
+        mask_info = load_mask_info(video_id, args.mask_info)
+        print(f"Loaded {len(mask_info)} mask entries")
+        crop_requests = scene_graph_crop_requests(scene_graphs, mask_info)
+        source = "scene_graphs"
     
     # Determine output directory
     if args.output_dir is None:
-        output_dir = f"outputs/object_crops/{video_id}"
+        output_dir = os.path.join(default_output_root(source), video_id)
     else:
         output_dir = args.output_dir
     
     # Extract crops
     print(f"Extracting crops from video: {args.video_path}")
-    extract_crops_from_video(args.video_path, mask_info, scene_graphs, output_dir)
+    extract_crops_from_video(args.video_path, crop_requests, output_dir, video_id, args.max_grab_gap,
+                             args.image_format, args.quality, args.writer_threads, args.max_pending,
+                             args.output_format, args.shard_size_mb, args.index_format)
     
     print("Done!")
 
@@ -0,0 +1,100 @@
+"""
+Frame-accurate reading of a sparse set of frames from a video with OpenCV.
+
+Seeking with cap.set(CAP_PROP_POS_FRAMES) makes the H.264 decoder start again from the
+previous keyframe, every time. For frames that are close together it is cheaper to keep
+decoding forward: cap.grab() decodes a frame without converting it to BGR, and only the
+requested frames are retrieved. plan_frame_fetches decides per gap whether to seek or to
+grab forward, and iter_frames fetches all requested frames in one monotonic pass.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# Gaps up to this many frames are decoded forward instead of seeking. Roughly the keyframe
+# interval of our recordings: a seek decodes on average half a GOP plus seek overhead.
+DEFAULT_MAX_GRAB_GAP = 120
+
+
+def plan_frame_fetches(frame_numbers: Iterable[int], max_grab_gap: int = DEFAULT_MAX_GRAB_GAP,
+                       start_position: int = 0) -> List[Tuple[int, int, bool]]:
+    """
+    Plan how to reach each requested frame from the previous one.
+
+    Args:
+        frame_numbers: Requested frames, in any order; duplicates are fetched once
+        max_grab_gap: Largest number of skipped frames that is decoded forward
+        start_position: Index of the next frame the decoder would return
+
+    Returns:
+        (frame_number, frames_to_skip, seek) in increasing frame order. With seek the decoder
+        is positioned on frame_number directly; otherwise frames_to_skip frames are grabbed
+        and dropped first.
+    """
+    plan = []
+    position = start_position
+    for frame_number in sorted(set(frame_numbers)):
+        gap = frame_number - position
+        if gap < 0 or gap > max_grab_gap:
+            plan.append((frame_number, 0, True))
+        else:
+            plan.append((frame_number, gap, False))
+        position = frame_number + 1
+    return plan
+
+
+def summarize_plan(plan: List[Tuple[int, int, bool]]) -> Dict[str, int]:
+    """Number of frames, seeks and skipped (grabbed but not retrieved) frames of a plan."""
+    return {
+        "frames": len(plan),
+        "seeks": sum(1 for _, _, seek in plan if seek),
+        "grabbed": sum(skip for _, skip, seek in plan if not seek),
+    }
+
+
+def iter_frames(cap: "cv2.VideoCapture", frame_numbers: Iterable[int],
+                max_grab_gap: int = DEFAULT_MAX_GRAB_GAP,
+                stats: Optional[Dict[str, int]] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (frame_number, BGR image) for the requested frames in increasing order.
+
+    Args:
+        cap: Open video capture; it is left positioned after the last fetched frame
+        frame_numbers: Requested frames, in any order
+        max_grab_gap: Largest number of skipped frames that is decoded forward
+        stats: Optional dict that receives counts of seeks, grabbed, retrieved and failed frames
+
+    Frames that cannot be decoded are skipped with a warning.
+    """
+    if stats is None:
+        stats = {}
+    for key in ("seeks", "grabbed", "retrieved", "failed"):
+        stats.setdefault(key, 0)
+
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    for frame_number in sorted(set(frame_numbers)):
+        gap = frame_number - position
+        if gap < 0 or gap > max_grab_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            stats["seeks"] += 1
+        else:
+            for _ in range(gap):
+                if not cap.grab():
+                    break
+                stats["grabbed"] += 1
+
+        ok = cap.grab()
+        if ok:
+            ok, frame = cap.retrieve()
+        if not ok:
+            print(f"Warning: Could not read frame {frame_number}")
+            stats["failed"] += 1
+            position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            continue
+
+        stats["retrieved"] += 1
+        position = frame_number + 1
+        yield frame_number, frame
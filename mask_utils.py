@@ -0,0 +1,282 @@
+"""
+Mask helpers shared by the dense annotation scripts.
+
+masks_to_bboxes converts the mask logits SAM 2 returns for all objects of a
+frame into bounding boxes in one batched operation. On the GPU only the
+N x 4 result is copied to the host instead of every full-resolution mask.
+
+masks_to_rle encodes the same masks as COCO-style run-length counts
+(column-major, starting with a run of zeros). MaskRLEWriter stores them in a
+binary side file with a columnar (frame, assoc_id) index, and MaskRLEReader
+decodes individual masks lazily from a memory map.
+"""
+
+import os
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+
+def _masks_to_bboxes_numpy(masks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Batched bbox extraction for boolean masks of shape (N, H, W)."""
+    num_masks, height, width = masks.shape
+    rows = masks.any(axis=2)  # (N, H): row contains a foreground pixel
+    cols = masks.any(axis=1)  # (N, W): column contains a foreground pixel
+    valid = rows.any(axis=1)
+
+    row_idx = np.arange(height)
+    col_idx = np.arange(width)
+    bboxes = np.stack([
+        np.where(cols, col_idx, width).min(axis=1),
+        np.where(rows, row_idx, height).min(axis=1),
+        np.where(cols, col_idx, -1).max(axis=1),
+        np.where(rows, row_idx, -1).max(axis=1),
+    ], axis=1).astype(np.float32)
+    return bboxes, valid
+
+
+def _masks_to_bboxes_torch(masks: "torch.Tensor") -> Tuple[np.ndarray, np.ndarray]:
+    """Batched bbox extraction for boolean masks of shape (N, H, W) on any torch device."""
+    num_masks, height, width = masks.shape
+    rows = masks.any(dim=2)
+    cols = masks.any(dim=1)
+    valid = rows.any(dim=1)
+
+    row_idx = torch.arange(height, device=masks.device)
+    col_idx = torch.arange(width, device=masks.device)
+    extents = torch.stack([
+        torch.where(cols, col_idx, width).amin(dim=1),
+        torch.where(rows, row_idx, height).amin(dim=1),
+        torch.where(cols, col_idx, -1).amax(dim=1),
+        torch.where(rows, row_idx, -1).amax(dim=1),
+        valid.long(),
+    ], dim=1)
+
+    # Single device-to-host copy of an (N, 5) tensor
+    extents = extents.cpu().numpy()
+    return extents[:, :4].astype(np.float32), extents[:, 4].astype(bool)
+
+
+def masks_to_bboxes(mask_logits, threshold: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert per-object mask logits to [xmin, ymin, xmax, ymax] boxes.
+
+    Args:
+        mask_logits: Tensor or array of shape (N, 1, H, W) or (N, H, W), as returned
+            by SAM 2's propagate_in_video / add_new_points_or_box
+        threshold: Logit threshold for foreground pixels (default: 0.0)
+
+    Returns:
+        Tuple of (bboxes, valid): bboxes is an (N, 4) float32 array in mask pixel
+        coordinates, valid is an (N,) bool array that is False for empty masks
+        (their bbox row is meaningless).
+    """
+    if mask_logits.shape[0] == 0:
+        # A frame without tracked objects; reshape cannot infer -1 from zero elements
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=bool)
+    if TORCH_AVAILABLE and isinstance(mask_logits, torch.Tensor):
+        masks = mask_logits > threshold
+        masks = masks.reshape(masks.shape[0], -1, *masks.shape[-2:]).any(dim=1)
+        if masks.device.type == "cpu":
+            # CPU tensors share memory with NumPy, which reduces faster here
+            return _masks_to_bboxes_numpy(masks.numpy())
+        return _masks_to_bboxes_torch(masks)
+
+    masks = np.asarray(mask_logits) > threshold
+    masks = masks.reshape(masks.shape[0], -1, *masks.shape[-2:]).any(axis=1)
+    return _masks_to_bboxes_numpy(masks)
+
+
+def encode_rle(mask: np.ndarray) -> np.ndarray:
+    """
+    COCO-style RLE counts of a single (H, W) boolean mask.
+
+    Pixels are read in column-major order and counts alternate between runs of
+    zeros and ones, starting with zeros (a leading 0 if the first pixel is set).
+    """
+    flat = np.asarray(mask, dtype=bool).ravel(order='F')
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate([[0], changes, [flat.size]]))
+    if flat.size and flat[0]:
+        counts = np.concatenate([[0], counts])
+    return counts.astype(np.uint32)
+
+
+def decode_rle(counts, size: Tuple[int, int]) -> np.ndarray:
+    """Decode COCO-style RLE counts back to an (H, W) boolean mask."""
+    height, width = size
+    counts = np.asarray(counts, dtype=np.int64)
+    values = (np.arange(len(counts)) % 2).astype(bool)
+    return np.repeat(values, counts).reshape((height, width), order='F')
+
+
+def masks_to_rle(mask_logits, threshold: float = 0.0) -> List[np.ndarray]:
+    """
+    Encode the masks of all objects of a frame as COCO-style RLE counts.
+
+    On the GPU the run boundaries are found on the device, so only the change
+    positions (proportional to the mask perimeter) are copied to the host.
+
+    Args:
+        mask_logits: Tensor or array of shape (N, 1, H, W) or (N, H, W)
+        threshold: Logit threshold for foreground pixels (default: 0.0)
+
+    Returns:
+        List of N uint32 count arrays
+    """
+    if mask_logits.shape[0] == 0:
+        return []
+    if TORCH_AVAILABLE and isinstance(mask_logits, torch.Tensor):
+        masks = mask_logits > threshold
+        masks = masks.reshape(masks.shape[0], -1, *masks.shape[-2:]).any(dim=1)
+        num_masks, height, width = masks.shape
+        # Column-major flattening, as in COCO RLE
+        flat = masks.transpose(1, 2).reshape(num_masks, height * width)
+        obj_idx, positions = torch.nonzero(flat[:, 1:] != flat[:, :-1], as_tuple=True)
+        first_pixel = flat[:, 0].cpu().numpy()
+        obj_idx = obj_idx.cpu().numpy()
+        positions = positions.cpu().numpy() + 1
+    else:
+        masks = np.asarray(mask_logits) > threshold
+        masks = masks.reshape(masks.shape[0], -1, *masks.shape[-2:]).any(axis=1)
+        num_masks, height, width = masks.shape
+        flat = masks.transpose(0, 2, 1).reshape(num_masks, height * width)
+        obj_idx, positions = np.nonzero(flat[:, 1:] != flat[:, :-1])
+        first_pixel = flat[:, 0]
+        positions = positions + 1
+
+    # nonzero returns positions grouped by object in row-major order
+    splits = np.cumsum(np.bincount(obj_idx, minlength=num_masks))[:-1]
+    rles = []
+    for i, changes in enumerate(np.split(positions, splits)):
+        counts = np.diff(np.concatenate([[0], changes, [height * width]]))
+        if first_pixel[i]:
+            counts = np.concatenate([[0], counts])
+        rles.append(counts.astype(np.uint32))
+    return rles
+
+
+class MaskRLEWriter:
+    """
+    Append-only writer for RLE masks of one video (or one window of it).
+
+    Writes <path_prefix>.rle.bin with the concatenated uint32 counts and, on close,
+    <path_prefix>.rle.npz with one row per mask: frame_number, assoc_idx, offset and
+    length into the counts, and the mask height/width. assoc_ids are stored once.
+    """
+
+    def __init__(self, path_prefix: str, metadata: Dict = None):
+        self.path_prefix = path_prefix
+        self.metadata = metadata or {}
+        self._data_file = open(path_prefix + ".rle.bin", 'wb')
+        self._offset = 0
+        self._assoc_to_idx = {}
+        self._rows = {"frame_number": [], "assoc_idx": [], "offset": [], "length": [], "height": [], "width": []}
+
+    def add(self, frame_number: int, assoc_id: str, counts: np.ndarray, size: Tuple[int, int]):
+        """Append one mask's RLE counts."""
+        counts = np.asarray(counts, dtype='<u4')
+        assoc_idx = self._assoc_to_idx.setdefault(assoc_id, len(self._assoc_to_idx))
+        self._data_file.write(counts.tobytes())
+        self._rows["frame_number"].append(frame_number)
+        self._rows["assoc_idx"].append(assoc_idx)
+        self._rows["offset"].append(self._offset)
+        self._rows["length"].append(len(counts))
+        self._rows["height"].append(size[0])
+        self._rows["width"].append(size[1])
+        self._offset += len(counts)
+
+    def close(self):
+        """Flush the counts and write the index."""
+        self._data_file.close()
+        assoc_ids = sorted(self._assoc_to_idx, key=self._assoc_to_idx.get)
+        np.savez(
+            self.path_prefix + ".rle.npz",
+            frame_number=np.asarray(self._rows["frame_number"], dtype=np.int64),
+            assoc_idx=np.asarray(self._rows["assoc_idx"], dtype=np.int32),
+            offset=np.asarray(self._rows["offset"], dtype=np.int64),
+            length=np.asarray(self._rows["length"], dtype=np.int32),
+            height=np.asarray(self._rows["height"], dtype=np.int32),
+            width=np.asarray(self._rows["width"], dtype=np.int32),
+            assoc_ids=np.asarray(assoc_ids, dtype=str),
+            metadata=np.asarray(json.dumps(self.metadata)),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MaskRLEReader:
+    """
+    Lazy reader for files written by MaskRLEWriter.
+
+    Only the index is loaded up front; counts are read from a memory map and decoded
+    when a mask is requested.
+    """
+
+    def __init__(self, path_prefix: str):
+        self.path_prefix = path_prefix
+        index = np.load(path_prefix + ".rle.npz")
+        self.frame_number = index["frame_number"]
+        self.assoc_idx = index["assoc_idx"]
+        self.offset = index["offset"]
+        self.length = index["length"]
+        self.height = index["height"]
+        self.width = index["width"]
+        self.assoc_ids = [str(a) for a in index["assoc_ids"]]
+        self.metadata = json.loads(str(index["metadata"]))
+
+        data_path = path_prefix + ".rle.bin"
+        if os.path.getsize(data_path) > 0:
+            self._counts = np.memmap(data_path, dtype='<u4', mode='r')
+        else:
+            self._counts = np.zeros(0, dtype='<u4')
+        self._rows = {
+            (int(frame), self.assoc_ids[assoc]): row
+            for row, (frame, assoc) in enumerate(zip(self.frame_number, self.assoc_idx))
+        }
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key: Tuple[int, str]) -> bool:
+        return key in self._rows
+
+    def keys(self) -> List[Tuple[int, str]]:
+        """All (frame_number, assoc_id) pairs with a stored mask."""
+        return list(self._rows.keys())
+
+    def frames(self) -> List[int]:
+        """Sorted frame numbers with at least one stored mask."""
+        return sorted(set(int(frame) for frame in self.frame_number))
+
+    def get_size(self, frame_number: int, assoc_id: str) -> Tuple[int, int]:
+        """(height, width) of the stored mask, i.e. the resolution SAM 2 ran at."""
+        row = self._rows[(frame_number, assoc_id)]
+        return int(self.height[row]), int(self.width[row])
+
+    def get_counts(self, frame_number: int, assoc_id: str) -> np.ndarray:
+        row = self._rows[(frame_number, assoc_id)]
+        start = self.offset[row]
+        return np.asarray(self._counts[start:start + self.length[row]])
+
+    def get_rle(self, frame_number: int, assoc_id: str) -> Dict:
+        """COCO-style uncompressed RLE: {"size": [h, w], "counts": [...]}."""
+        return {
+            "size": list(self.get_size(frame_number, assoc_id)),
+            "counts": self.get_counts(frame_number, assoc_id).tolist(),
+        }
+
+    def get_mask(self, frame_number: int, assoc_id: str) -> np.ndarray:
+        """Decode one mask to an (H, W) boolean array."""
+        return decode_rle(self.get_counts(frame_number, assoc_id), self.get_size(frame_number, assoc_id))
@@ -0,0 +1,368 @@
+"""
+Answer the object_motion VQA questions from our own object movement annotations.
+
+The three object_motion tasks of the benchmark ask about one object, given by a box at a time
+(<BBOX ...> seen at <TIME ...>):
+
+    object_motion_object_movement_counting        how many times the object changed locations
+    object_motion_object_movement_itinerary       where it was moved from/to throughout the video
+    object_motion_stationary_object_localization  from which time it stays static for > N seconds
+
+For every question the object is identified in assoc_info/mask_info: the masks of all tracks
+within --time_tolerance of the question time are compared to the question box by IoU (without
+mask_info or an overlapping box, the association with the pick/drop closest to the question
+time, if it is within --time_tolerance too; otherwise the question is left unanswered). Its
+itinerary is then replayed from the time-wise scene graphs of generate_time_wise_scene_graphs
+(each PICK moves the object from its current node to the Human, each DROP to a fixture), and
+every choice is scored against it. Questions are grouped by video and each worker process
+builds the scene graphs and the mask index of a video once for all of its questions.
+
+Objects whose itinerary replayed from the scene graphs differs from the one read directly from
+their tracks' pick/drop masks are counted as scene graph mismatches, as a consistency check.
+
+Usage:
+    python object_motion_vqa.py --workers 16 --output outputs/object_motion_vqa.json
+"""
+
+import io
+import os
+import re
+import json
+import contextlib
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from utils import generate_time_wise_scene_graphs
+from vqa_benchmark import DEFAULT_BENCHMARK_DIR, load_vqa_benchmark
+
+
+OBJECT_MOTION_TASKS = [
+    "object_motion_object_movement_counting",
+    "object_motion_object_movement_itinerary",
+    "object_motion_stationary_object_localization",
+]
+VIDEO_FPS = 30
+FREE_SPACE = "Free Space"
+DEFAULT_TIME_TOLERANCE = 0.5
+
+STATIC_THRESHOLD = re.compile(r"more than ([\d.]+) seconds")
+ITINERARY_LEG = re.compile(r"from (.+?) to (.+)$")
+
+
+def _fixture_node(mask_id: str, mask_fixtures: Dict) -> str:
+    """Scene graph node of a mask, as generate_time_wise_scene_graphs assigns it."""
+    if mask_id not in mask_fixtures:
+        return FREE_SPACE
+    fixture = mask_fixtures[mask_id]["fixture"]
+    return FREE_SPACE if fixture is None or fixture == "Null" else fixture
+
+
+def bbox_iou(a, b) -> float:
+    """Intersection over union of two [xmin, ymin, xmax, ymax] boxes."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def scene_graph_itineraries(scene_graphs: List[Dict]) -> Dict[str, List[Tuple[float, str, float, str]]]:
+    """
+    Itinerary of every object in time-wise scene graphs.
+
+    Returns:
+        {object_name: [(pick_time, from_node, drop_time, to_node), ...]} in time order, where
+        from_node is the node holding the object in the snapshot before its PICK
+    """
+    location = {}
+    if scene_graphs and scene_graphs[0]["action"] == "INITIAL":
+        for node, objects in scene_graphs[0]["scene_graph"].items():
+            for object_name in objects:
+                location[object_name] = node
+
+    itineraries = defaultdict(list)
+    open_picks = {}
+    for entry in scene_graphs:
+        object_name = entry["object_name"]
+        if entry["action"] == "PICK":
+            open_picks[object_name] = (entry["time"], location.get(object_name, FREE_SPACE))
+            location[object_name] = "Human"
+        elif entry["action"] == "DROP":
+            pick_time, from_node = open_picks.pop(object_name, (entry["time"], location.get(object_name, FREE_SPACE)))
+            to_node = next((node for node, objects in entry["scene_graph"].items()
+                            if node != "Human" and object_name in objects), FREE_SPACE)
+            itineraries[object_name].append((pick_time, from_node, entry["time"], to_node))
+            location[object_name] = to_node
+    return itineraries
+
+
+def track_itinerary(association: Dict, mask_fixtures: Dict) -> List[Tuple[float, str, float, str]]:
+    """Itinerary of an association read directly from its tracks' pick and drop masks."""
+    itinerary = []
+    for track in sorted(association["tracks"], key=lambda track: track["time_segment"][0]):
+        masks = track["masks"]
+        from_node = _fixture_node(masks[0], mask_fixtures) if masks else FREE_SPACE
+        to_node = _fixture_node(masks[1], mask_fixtures) if len(masks) > 1 else FREE_SPACE
+        itinerary.append((track["time_segment"][0], from_node, track["time_segment"][1], to_node))
+    return itinerary
+
+
+class VideoMotionIndex:
+    """Scene graph itineraries and mask lookup of one video, shared by all of its questions."""
+
+    def __init__(self, object_movements: Dict, mask_fixtures: Dict):
+        self.object_movements = object_movements
+        self.mask_fixtures = mask_fixtures
+        self.itineraries = scene_graph_itineraries(generate_time_wise_scene_graphs(object_movements, mask_fixtures))
+        # (time, association id, mask bbox or None) of every pick/drop mask
+        self.masks = []
+        for association_id, association in object_movements.items():
+            for track in association["tracks"]:
+                for i, mask_id in enumerate(track["masks"][:2]):
+                    mask = mask_fixtures.get(mask_id)
+                    if mask is not None:
+                        self.masks.append((mask["frame_number"] / VIDEO_FPS, association_id, mask["bbox"]))
+                    else:
+                        self.masks.append((track["time_segment"][i], association_id, None))
+
+    def find_object(self, time: float, bbox, time_tolerance: float = DEFAULT_TIME_TOLERANCE) -> Tuple[Optional[str], str]:
+        """
+        Association of the object with the question box at the question time.
+
+        Both the masks compared by IoU and the pick/drop of the time fallback must be within
+        time_tolerance of the question time.
+
+        Returns:
+            (association id or None, "bbox" or "time" for how it was matched)
+        """
+        best, best_score = None, None
+        for mask_time, association_id, mask_bbox in self.masks:
+            if abs(mask_time - time) > time_tolerance or mask_bbox is None or bbox is None:
+                continue
+            score = (bbox_iou(bbox, mask_bbox), -abs(mask_time - time))
+            if best_score is None or score > best_score:
+                best, best_score = association_id, score
+        if best is not None and best_score[0] > 0:
+            return best, "bbox"
+
+        # No overlapping mask box: the association with the closest pick/drop
+        closest = min(self.masks, key=lambda mask: abs(mask[0] - time), default=None)
+        if closest is None or abs(closest[0] - time) > time_tolerance:
+            return None, "time"
+        return closest[1], "time"
+
+    def itinerary(self, association_id: str) -> Tuple[List[Tuple[float, str, float, str]], bool]:
+        """
+        Itinerary of an association, replayed from the scene graphs.
+
+        Returns:
+            (itinerary, whether it matches the itinerary read from the tracks). Objects that
+            the scene graphs skip (names starting with "Track") use the track itinerary.
+        """
+        association = self.object_movements[association_id]
+        from_tracks = track_itinerary(association, self.mask_fixtures)
+        from_graph = self.itineraries.get(association["name"])
+        if from_graph is None:
+            return from_tracks, True
+        consistent = [(f, t) for _, f, _, t in from_graph] == [(f, t) for _, f, _, t in from_tracks]
+        return from_graph, consistent
+
+
+def _fixture_type(node: str) -> Optional[str]:
+    """Type of a fixture node: 'P01_cupboard.009' -> 'cupboard'; None for Human/Free Space."""
+    if node in (FREE_SPACE, "Human"):
+        return None
+    name = re.sub(r"\.\d+$", "", re.sub(r"^P\d+_", "", node))
+    return re.split(r"[_\s]+", name.lower())[0]
+
+
+def _location_pattern(locations: List[str]) -> List[int]:
+    """Locations relabeled by first occurrence: [a, b, a, c] -> [0, 1, 0, 2]."""
+    labels = {}
+    return [labels.setdefault(location, len(labels)) for location in locations]
+
+
+def score_counting(choices: List[str], itinerary) -> List[float]:
+    """Choices closer to the number of movements score higher."""
+    scores = []
+    for choice in choices:
+        try:
+            scores.append(-abs(int(choice) - len(itinerary)))
+        except ValueError:
+            scores.append(float("-inf"))
+    return scores
+
+
+def score_itinerary(choices: List[str], itinerary) -> List[float]:
+    """
+    Score "from A to B, then from B to C" choices against the itinerary.
+
+    The fixture names of mask_info ('P01_cupboard.009') are not the names of the choices
+    ('cupboard left of fridge'), so a choice is scored by its number of moves, the pattern of
+    revisited locations and the fixture types of its locations. Moves to the same fixture are
+    left out, as the benchmark itineraries do; Free Space is not a known location, so moves
+    from and to it are kept.
+    """
+    moves = [(from_node, to_node) for _, from_node, _, to_node in itinerary
+             if from_node != to_node or from_node == FREE_SPACE]
+    nodes = [node for move in moves for node in move]
+    scores = []
+    for choice in choices:
+        legs = [ITINERARY_LEG.match(leg) for leg in choice.split(", then ")]
+        if not all(legs):
+            scores.append(float("-inf"))
+            continue
+        locations = [location for leg in legs for location in leg.groups()]
+        score = -2.0 * abs(len(legs) - len(moves))
+        if len(locations) == len(nodes):
+            score += float(_location_pattern(locations) == _location_pattern(nodes))
+            typed = [(location.split()[0].lower(), _fixture_type(node)) for location, node in zip(locations, nodes)
+                     if _fixture_type(node) is not None]
+            if typed:
+                score += sum(word == fixture_type for word, fixture_type in typed) / len(typed)
+        scores.append(score)
+    return scores
+
+
+def score_stationary(choice_times: List[List[Tuple[float, str]]], itinerary, threshold: float) -> List[float]:
+    """
+    Score choice times by how well [time, time + threshold] fits in a static period.
+
+    Static periods run from each drop to the next pick (the last one until the end of the
+    video); a choice scores its smallest margin to the period bounds, negative if it does not fit.
+    """
+    periods = [(itinerary[i][2], itinerary[i + 1][0] if i + 1 < len(itinerary) else float("inf"))
+               for i in range(len(itinerary))]
+    scores = []
+    for times in choice_times:
+        if not times or not periods:
+            scores.append(float("-inf"))
+            continue
+        time = times[0][0]
+        scores.append(max(min(time - drop, pick - time - threshold) for drop, pick in periods))
+    return scores
+
+
+def solve_question(question: Dict, index: VideoMotionIndex, time_tolerance: float = DEFAULT_TIME_TOLERANCE) -> Dict:
+    """Predicted choice of one object_motion question, with the object it was matched to."""
+    result = {"qid": question["qid"], "task": question["task"], "video_id": question["video_ids"][0],
+              "correct_idx": question["correct_idx"], "pred_idx": None}
+    if not question["times"]:
+        return result
+    association_id, matched_by = index.find_object(
+        question["times"][0][0], question["bboxes"][0] if question["bboxes"] else None, time_tolerance)
+    if association_id is None:
+        return result
+    itinerary, consistent = index.itinerary(association_id)
+
+    task = question["task"]
+    if task == "object_motion_object_movement_counting":
+        scores = score_counting(question["choices"], itinerary)
+    elif task == "object_motion_object_movement_itinerary":
+        scores = score_itinerary(question["choices"], itinerary)
+    else:
+        match = STATIC_THRESHOLD.search(question["question"])
+        scores = score_stationary(question["choice_times"], itinerary, float(match.group(1)) if match else 0.0)
+
+    result.update({
+        "object_name": index.object_movements[association_id]["name"],
+        "association_id": association_id,
+        "matched_by": matched_by,
+        "movements": len(itinerary),
+        "scene_graph_consistent": consistent,
+        "scores": scores,
+        "pred_idx": max(range(len(scores)), key=lambda i: scores[i]),
+    })
+    return result
+
+
+def solve_video(questions: List[Dict], object_movements: Dict, mask_fixtures: Dict,
+                time_tolerance: float = DEFAULT_TIME_TOLERANCE) -> List[Dict]:
+    """Answer all questions about one video with a single index; runs in a worker process."""
+    # Keep the per-track warnings of the scene graph generation out of the batch log
+    with contextlib.redirect_stdout(io.StringIO()):
+        index = VideoMotionIndex(object_movements, mask_fixtures)
+    return [solve_question(question, index, time_tolerance) for question in questions]
+
+
+def accuracy_report(results: List[Dict]) -> Dict:
+    """Accuracy, matching and scene graph consistency counts per task."""
+    report = {}
+    for task in sorted({result["task"] for result in results}):
+        task_results = [result for result in results if result["task"] == task]
+        answered = [result for result in task_results if result["pred_idx"] is not None]
+        correct = sum(result["pred_idx"] == result["correct_idx"] for result in answered)
+        report[task] = {
+            "questions": len(task_results),
+            "answered": len(answered),
+            "correct": correct,
+            "accuracy": round(correct / len(task_results), 4) if task_results else None,
+            "matched_by": dict(Counter(result["matched_by"] for result in answered)),
+            "scene_graph_mismatches": sum(not result["scene_graph_consistent"] for result in answered),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer object_motion VQA questions from scene graphs")
+    parser.add_argument("--benchmark_dir", default=DEFAULT_BENCHMARK_DIR, help="Directory with the <task>.json files")
+    parser.add_argument("--assoc_info", default="scene-and-object-movements/assoc_info.json")
+    parser.add_argument("--mask_info", default="scene-and-object-movements/mask_info.json",
+                        help="Without it, objects are matched by time only and all fixtures are Free Space")
+    parser.add_argument("--tasks", nargs="+", default=OBJECT_MOTION_TASKS, choices=OBJECT_MOTION_TASKS)
+    parser.add_argument("--time_tolerance", type=float, default=DEFAULT_TIME_TOLERANCE,
+                        help="Largest distance in seconds between the question time and a matched mask or "
+                             "pick/drop; questions without one are left unanswered")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--output", default="outputs/object_motion_vqa.json",
+                        help="Accuracy report and per-question predictions")
+    args = parser.parse_args()
+
+    benchmark = load_vqa_benchmark(args.benchmark_dir, args.tasks)
+    questions_by_video = defaultdict(list)
+    for question in benchmark:
+        questions_by_video[question["video_ids"][0]].append(question)
+
+    # Shared data is loaded once; each video only gets its own entries
+    with open(args.assoc_info, "r", encoding="utf-8") as f:
+        object_movements_all = json.load(f)
+    if os.path.exists(args.mask_info):
+        with open(args.mask_info, "r", encoding="utf-8") as f:
+            mask_fixtures_all = json.load(f)
+    else:
+        print(f"Warning: {args.mask_info} not found, matching objects by time only")
+        mask_fixtures_all = {}
+
+    print(f"Solving {len(benchmark)} questions about {len(questions_by_video)} videos with {args.workers} workers")
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {}
+        for video_id, questions in questions_by_video.items():
+            if video_id not in object_movements_all:
+                print(f"{video_id}: not in {args.assoc_info}, {len(questions)} questions unanswered")
+                results.extend({"qid": q["qid"], "task": q["task"], "video_id": video_id,
+                                "correct_idx": q["correct_idx"], "pred_idx": None} for q in questions)
+                continue
+            futures[pool.submit(solve_video, questions, object_movements_all[video_id],
+                                mask_fixtures_all.get(video_id, {}), args.time_tolerance)] = video_id
+        for future in as_completed(futures):
+            results.extend(future.result())
+
+    report = accuracy_report(results)
+    for task, stats in report.items():
+        print(f"{task:<46} {stats['correct']:>4}/{stats['questions']:<4} accuracy {stats['accuracy']:.3f}  "
+              f"answered {stats['answered']}  "
+              f"matched {stats['matched_by']}  scene graph mismatches {stats['scene_graph_mismatches']}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"report": report, "results": sorted(results, key=lambda result: result["qid"])}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,35 @@
+"""
+Plot object touches and LLM usage labels per video and save the combined object labels.
+
+For each video, writes plots/object_touches_usage_<video_id>.png,
+<object_labels_dir>/object_labels_<video_id>.json (the object_labels_array joining usage
+labels with scene-graph events) and <timeline_dir>/timeline_<video_id>.json, the compact
+interval data of the interactive viewer (object_timeline_viewer.html, copied into
+timeline_dir together with an index.json of all exported videos). Serve the folder, e.g.
+`python -m http.server -d outputs/object_timelines`, and open object_timeline_viewer.html.
+
+Usage:
+    python process_all_object_labels.py --video_id P01-20240202-171220
+    # Every video with a labels file in --object_usage_labels_folder, in parallel
+    python process_all_object_labels.py --all_videos --workers 8
+"""
+
 import os
+import re
+import glob
 import json
 import pickle
+import shutil
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use("Agg")  # figures are only saved; also safe in worker processes without a display
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PolyCollection
 from matplotlib.patches import Patch
 import pandas as pd
 import argparse
 from utils import extract_touches_from_track, seconds_to_minutes_seconds, return_event_history_sorted
-import pdb
-
-parser = argparse.ArgumentParser()
-parser.add_argument("--video_id", required=True, help="Video ID to process")
-parser.add_argument(
-    "--object_usage_labels_folder",
-    default="outputs/object_usage_labels",
-    help="Folder containing object usage labels jsonl files"
-)
-args = parser.parse_args()
 
 
 BAR_WIDTH = 0.5
@@ -64,119 +78,331 @@ def plot_object_usage_segments(object_labels_array, axis, all_object_labels):
         )
 
 
+def object_rows(all_object_labels: [str]) -> dict:
+    """Object name -> y row; a repeated name keeps its first row, like list.index."""
+    rows = {}
+    for row, name in enumerate(all_object_labels):
+        rows.setdefault(name, row)
+    return rows
+
+
+def render_object_timeline(axis, object_movements: dict, object_labels_array: [dict], all_object_labels: [str]):
+    """
+    Draw the same timeline as plot_object_touches and plot_object_usage_segments in a few batched artists.
+
+    One LineCollection holds the touch lines of all objects, two scatters hold the pick (x)
+    and drop (o) markers, and one PolyCollection holds all usage segments, instead of
+    three plot calls per object and one fill_betweenx per segment.
+    """
+    rows = object_rows(all_object_labels)
+
+    touch_lines, picks, drops = [], [], []
+    for association_data in object_movements.values():
+        if association_data["name"] not in rows:
+            continue
+        y_position = rows[association_data["name"]]
+        touch_points = extract_touches_from_track(association_data["tracks"])
+        line = []
+        for touch in touch_points:
+            picks.append((touch["pick"], y_position))
+            drops.append((touch["drop"], y_position))
+            line.extend([(touch["pick"], y_position), (touch["drop"], y_position)])
+        if line:
+            touch_lines.append(line)
+
+    usage_boxes = []
+    for object_label in object_labels_array:
+        if object_label["object_name"] not in rows:
+            continue
+        if object_label.get("is_used") is None:
+            print(f"WARNING: Object {object_label['object_name']} has invalid usage label between {object_label['time_start']} and {object_label['time_end']}")
+            continue
+        elif object_label["is_used"] == False: ## Skip if object was not used
+            continue
+        y_position = rows[object_label["object_name"]]
+        verbose_print(f"Object {object_label['object_name']} used between {object_label['time_start']} and {object_label['time_end']}")
+        y_low, y_high = y_position - BAR_WIDTH/2, y_position + BAR_WIDTH/2
+        usage_boxes.append([
+            (object_label["time_start"], y_low), (object_label["time_end"], y_low),
+            (object_label["time_end"], y_high), (object_label["time_start"], y_high),
+        ])
+
+    axis.add_collection(LineCollection(touch_lines, colors="black", linewidths=3, alpha=0.6))
+    if picks:
+        axis.scatter(*zip(*picks), marker="x", color="gray", s=100, alpha=0.8)
+    if drops:
+        axis.scatter(*zip(*drops), marker="o", color="gray", s=100, alpha=0.8)
+    axis.add_collection(PolyCollection(usage_boxes, facecolors="red", edgecolors="none", alpha=0.3))
+    axis.autoscale_view()
+
+
+TIMELINE_VIEWER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "object_timeline_viewer.html")
+
+
+def export_timeline(video_id: str, object_movements: dict, object_labels_array: [dict],
+                    all_object_labels: [str], end_time: float, timeline_dir: str) -> str:
+    """
+    Write the timeline of one video as compact JSON for object_timeline_viewer.html.
+
+    Per object row, intervals are flat [start0, end0, start1, end1, ...] arrays in seconds:
+    "touches" (pick, drop), "used" and "unknown" (usage labels with is_used true or invalid).
+    Returns the path of the written file.
+    """
+    rows = object_rows(all_object_labels)
+    touches = [[] for _ in all_object_labels]
+    used = [[] for _ in all_object_labels]
+    unknown = [[] for _ in all_object_labels]
+    for association_data in object_movements.values():
+        if association_data["name"] in rows:
+            for touch in extract_touches_from_track(association_data["tracks"]):
+                touches[rows[association_data["name"]]].extend([round(touch["pick"], 2), round(touch["drop"], 2)])
+    for object_label in object_labels_array:
+        if object_label["object_name"] not in rows or object_label.get("is_used") == False:
+            continue
+        intervals = unknown if object_label.get("is_used") is None else used
+        intervals[rows[object_label["object_name"]]].extend(
+            [round(object_label["time_start"], 2), round(object_label["time_end"], 2)]
+        )
+
+    os.makedirs(timeline_dir, exist_ok=True)
+    path = os.path.join(timeline_dir, f"timeline_{video_id}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "video_id": video_id,
+            "end_time": round(float(end_time), 2),
+            "objects": all_object_labels,
+            "touches": touches,
+            "used": used,
+            "unknown": unknown,
+        }, f, separators=(",", ":"))
+    return path
+
+
+def write_timeline_index(timeline_dir: str):
+    """List all exported timelines in index.json and copy the viewer next to them."""
+    videos = []
+    for path in sorted(glob.glob(os.path.join(timeline_dir, "timeline_*.json"))):
+        with open(path, "r") as f:
+            timeline = json.load(f)
+        videos.append({
+            "video_id": timeline["video_id"],
+            "end_time": timeline["end_time"],
+            "num_objects": len(timeline["objects"]),
+            "num_used": sum(len(intervals) // 2 for intervals in timeline["used"]),
+        })
+    with open(os.path.join(timeline_dir, "index.json"), "w") as f:
+        json.dump({"videos": videos}, f, separators=(",", ":"))
+    shutil.copy(TIMELINE_VIEWER, timeline_dir)
+
+
+def build_scene_graph_event_index(scene_graphs: [dict]) -> dict:
+    """
+    Index scene-graph events by object for time-range lookups.
+
+    Entries without a time and INITIAL entries are left out, as in the label join.
+    Returns {object_name: (times, events)}, with events as (time, position in scene_graphs,
+    scene_graph) sorted by time and times the matching sorted time list for bisect.
+    """
+    events_by_object = {}
+    for position, scene_graph in enumerate(scene_graphs):
+        if scene_graph.get("time") is None or scene_graph.get("action") == "INITIAL":
+            continue
+        events_by_object.setdefault(scene_graph.get("object_name"), []).append(
+            (scene_graph["time"], position, scene_graph)
+        )
+
+    event_index = {}
+    for object_name, events in events_by_object.items():
+        events.sort(key=lambda event: (event[0], event[1]))
+        event_index[object_name] = ([event[0] for event in events], events)
+    return event_index
+
+
+def events_between(event_index: dict, object_name: str, start_timestamp: float, end_timestamp: float) -> [dict]:
+    """Scene graphs of object_name with start_timestamp <= time <= end_timestamp, in scene-graph order."""
+    if object_name not in event_index:
+        return []
+    times, events = event_index[object_name]
+    matched = events[bisect_left(times, start_timestamp):bisect_right(times, end_timestamp)]
+    return [scene_graph for _, _, scene_graph in sorted(matched, key=lambda event: event[1])]
+
+
+def _mask_frame_id(scene_graph: dict, mask_fixtures: dict) -> dict:
+    mask_id = scene_graph["mask_id"]
+    return {
+        "time": scene_graph["time"],
+        "action_type": scene_graph["action"],
+        "mask_id": mask_id,
+        "frame_number": mask_fixtures[mask_id]["frame_number"] if mask_id in mask_fixtures else None,
+        "mask_bbox": mask_fixtures[mask_id]["bbox"] if mask_id in mask_fixtures else None,
+    }
+
+
+def _object_label(usage_label: dict, mask_frame_ids: [dict]) -> dict:
+    return {
+        "object_name": usage_label["object_name"],
+        "time_start": usage_label["time_start"],
+        "time_end": usage_label["time_end"],
+        "is_used": usage_label.get("llm_response_json", {}).get("is_used", None),
+        "_explanation": usage_label.get("llm_response_json").get("explanation"),
+        "mask_frame_ids": mask_frame_ids,
+    }
+
+
 def combine_object_labels_from_usage_labels(object_usage_labels: [dict], scene_graphs: [dict], mask_fixtures: dict) -> dict:
     """
     Process object_usage_labels jsonl entries to create object_labels_array.
     Includes all entries regardless of is_used status.
     Uses scene graphs instead of event_history to extract mask_frame_ids.
+    The scene-graph events of each label are found with a per-object bisect index, built once.
     """
+    event_index = build_scene_graph_event_index(scene_graphs)
     object_labels_array = []
     
     for i, usage_label in enumerate(object_usage_labels):
         if i % 10 == 0:
             print(f"[Getting inuse segments] Processing usage label {i} of {len(object_usage_labels)}")
         
-        object_name = usage_label["object_name"]
-        start_timestamp = usage_label["time_start"]
-        end_timestamp = usage_label["time_end"]
-        
-        # Filter scene graphs for this object and time range
-        scene_graphs_trimmed = [
-            sg for sg in scene_graphs
-            if sg.get("object_name") == object_name
-            and sg.get("time") is not None
-            and start_timestamp <= sg["time"] <= end_timestamp
-            and sg.get("action") != "INITIAL"  # Skip INITIAL entries
+        # Scene graphs for this object and time range
+        scene_graphs_trimmed = events_between(
+            event_index, usage_label["object_name"], usage_label["time_start"], usage_label["time_end"]
+        )
+        mask_frame_ids = [
+            _mask_frame_id(scene_graph, mask_fixtures)
+            for scene_graph in scene_graphs_trimmed
+            if scene_graph.get("mask_id") is not None
         ]
-        
-        mask_frame_ids = []
-        for scene_graph in scene_graphs_trimmed:
-            mask_id = scene_graph.get("mask_id")
-            if mask_id is None:
-                continue
-            
-            frame_number = mask_fixtures[mask_id]["frame_number"] if mask_id in mask_fixtures else None
-            mask_bbox = mask_fixtures[mask_id]["bbox"] if mask_id in mask_fixtures else None
-            mask_frame_ids.append({
-                "time": scene_graph["time"],
-                "action_type": scene_graph["action"],
-                "mask_id": mask_id,
-                "frame_number": frame_number,
-                "mask_bbox": mask_bbox,
-            })
-        
-        object_labels_array.append({
-            "object_name": object_name,
-            "time_start": start_timestamp,
-            "time_end": end_timestamp,
-            "is_used": usage_label.get("llm_response_json", {}).get("is_used", None),
-            "_explanation": usage_label.get("llm_response_json").get("explanation"),
-            "mask_frame_ids": mask_frame_ids,
-        })
+        object_labels_array.append(_object_label(usage_label, mask_frame_ids))
     
     return object_labels_array
 
 
-def main():
-    with open("scene-and-object-movements/assoc_info.json", encoding='utf-8') as f:
-        object_movements_all = json.load(f)
+def combine_object_labels_vectorized(object_usage_labels: [dict], scene_graphs: [dict], mask_fixtures: dict) -> dict:
+    """
+    Same result as combine_object_labels_from_usage_labels, computed as one pandas merge.
 
-    with open("scene-and-object-movements/mask_info.json", "r", encoding='utf-8') as f:
-        mask_fixtures_all = json.load(f)
+    Labels and events are joined on object name and filtered to the label time ranges in
+    pandas; only building the per-label mask_frame_ids lists remains in Python.
+    """
+    # Explicit dtypes: empty columns would default to float64 and fail the merge on object_name
+    labels = pd.DataFrame({
+        "label_position": pd.Series(range(len(object_usage_labels)), dtype="int64"),
+        "object_name": pd.Series([label["object_name"] for label in object_usage_labels], dtype=object),
+        "time_start": pd.Series([label["time_start"] for label in object_usage_labels], dtype="float64"),
+        "time_end": pd.Series([label["time_end"] for label in object_usage_labels], dtype="float64"),
+    })
+    event_rows = [
+        (position, sg.get("object_name"), sg["time"])
+        for position, sg in enumerate(scene_graphs)
+        if sg.get("time") is not None and sg.get("action") != "INITIAL" and sg.get("mask_id") is not None
+    ]
+    events = pd.DataFrame({
+        "event_position": pd.Series([row[0] for row in event_rows], dtype="int64"),
+        "object_name": pd.Series([row[1] for row in event_rows], dtype=object),
+        "time": pd.Series([row[2] for row in event_rows], dtype="float64"),
+    })
 
-    with open("narrations-and-action-segments/HD_EPIC_Narrations.pkl", "rb") as f:
-        action_narrations_all = pickle.load(f)
+    joined = labels.merge(events, on="object_name", how="inner")
+    joined = joined[(joined["time"] >= joined["time_start"]) & (joined["time"] <= joined["time_end"])]
+    joined = joined.sort_values(["label_position", "event_position"], kind="stable")
 
-    # Read object usage labels from jsonl file
-    object_usage_labels_path = f"{args.object_usage_labels_folder}/object_usage_labels_{args.video_id}.jsonl"
-    if not os.path.exists(object_usage_labels_path):
-        raise FileNotFoundError(f"Object usage labels file not found: {object_usage_labels_path}")
-    
-    with open(object_usage_labels_path, "r") as f:
-        object_usage_labels = [json.loads(line) for line in f]
+    frame_numbers = {mask_id: fixture["frame_number"] for mask_id, fixture in mask_fixtures.items()}
+    bboxes = {mask_id: fixture["bbox"] for mask_id, fixture in mask_fixtures.items()}
+    mask_frame_ids = [[] for _ in object_usage_labels]
+    for label_position, event_position in zip(joined["label_position"].tolist(), joined["event_position"].tolist()):
+        scene_graph = scene_graphs[event_position]
+        mask_id = scene_graph["mask_id"]
+        mask_frame_ids[label_position].append({
+            "time": scene_graph["time"],
+            "action_type": scene_graph["action"],
+            "mask_id": mask_id,
+            "frame_number": frame_numbers.get(mask_id),
+            "mask_bbox": bboxes.get(mask_id),
+        })
 
-    # Read scene graphs from jsonl file
-    scene_graphs_path = f"outputs/scene_graphs/scene_graphs_{args.video_id}.jsonl"
-    if not os.path.exists(scene_graphs_path):
-        raise FileNotFoundError(f"Scene graphs file not found: {scene_graphs_path}")
-    
-    with open(scene_graphs_path, "r") as f:
-        scene_graphs = [json.loads(line) for line in f]
+    return [
+        _object_label(usage_label, label_mask_frame_ids)
+        for usage_label, label_mask_frame_ids in zip(object_usage_labels, mask_frame_ids)
+    ]
 
-    object_movements = object_movements_all[args.video_id]
-    ## Sort object movements by start timestamp
-    sorted_keys = sorted(object_movements.keys(), key=lambda elem: object_movements[elem]["tracks"][0]["time_segment"][0])
-    object_movements = {k: object_movements[k] for k in sorted_keys}
-    mask_fixtures = mask_fixtures_all[args.video_id]
 
-    action_narrations = action_narrations_all[action_narrations_all.unique_narration_id.str.startswith(args.video_id)]
+def load_jsonl_file(path: str, description: str) -> [dict]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{description} file not found: {path}")
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f]
+
+
+def find_labeled_videos(object_usage_labels_folder: str) -> [str]:
+    """Video IDs of all object_usage_labels_<video_id>.jsonl files in a folder."""
+    paths = glob.glob(os.path.join(object_usage_labels_folder, "object_usage_labels_*.jsonl"))
+    return sorted(re.sub(r"^object_usage_labels_|\.jsonl$", "", os.path.basename(path)) for path in paths)
+
+
+def video_end_time(action_narrations_all: pd.DataFrame, video_id: str) -> float:
+    """End of the last narration of a video, used as the extent of the time axis."""
+    action_narrations = action_narrations_all[action_narrations_all.unique_narration_id.str.startswith(video_id)]
     action_narrations = action_narrations.sort_values(by="start_timestamp")
+    return action_narrations.iloc[-1]["end_timestamp"]
 
-    os.makedirs("plots", exist_ok=True)
 
-    try:    
-        object_labels_array = combine_object_labels_from_usage_labels(object_usage_labels, scene_graphs, mask_fixtures)
+def process_video(video_id: str, object_movements: dict, mask_fixtures: dict, end_time: float,
+                  object_usage_labels_folder: str, scene_graph_dir: str, object_labels_dir: str,
+                  join: str = "index", renderer: str = "collections", figure_format: str = "png",
+                  timeline_dir: str = None) -> str:
+    """
+    Combine the usage labels of one video with its scene graphs, save them and plot them.
+
+    Only receives the video's own assoc_info/mask_info entries, so it can run in a worker
+    process. Returns the path of the saved figure.
+
+    renderer "collections" draws with render_object_timeline, "per_object" with the
+    original per-object plot calls. figure_format "svg" or "pdf" saves a vector figure,
+    which stays small with the batched artists. If timeline_dir is set, the viewer data is
+    exported there too (see export_timeline).
+    """
+    object_usage_labels = load_jsonl_file(
+        f"{object_usage_labels_folder}/object_usage_labels_{video_id}.jsonl", "Object usage labels"
+    )
+    scene_graphs = load_jsonl_file(f"{scene_graph_dir}/scene_graphs_{video_id}.jsonl", "Scene graphs")
+
+    ## Sort object movements by start timestamp
+    sorted_keys = sorted(object_movements.keys(), key=lambda elem: object_movements[elem]["tracks"][0]["time_segment"][0])
+    object_movements = {k: object_movements[k] for k in sorted_keys}
+
+    try:
+        combine = combine_object_labels_vectorized if join == "pandas" else combine_object_labels_from_usage_labels
+        object_labels_array = combine(object_usage_labels, scene_graphs, mask_fixtures)
     except Exception as e:
         print(f"Error returning inuse segments per object: {e}")
-        pdb.set_trace()
+        raise
+
+    os.makedirs(object_labels_dir, exist_ok=True)
+    with open(os.path.join(object_labels_dir, f"object_labels_{video_id}.json"), "w") as f:
+        json.dump(object_labels_array, f)
 
     fig, ax = plt.subplots(figsize=(25, 15))
     all_object_labels = list(
         [label["name"] for label in object_movements.values() if not label["name"].startswith("Track")]
     )
-    for _, association_data in object_movements.items():
-        if not association_data["name"] in all_object_labels:
-            continue
-        plot_object_touches(
-            track_sequence=association_data["tracks"], axis=ax, y_position=all_object_labels.index(association_data["name"])
-        )
-    plot_object_usage_segments(object_labels_array, ax, all_object_labels)
+    if timeline_dir:
+        export_timeline(video_id, object_movements, object_labels_array, all_object_labels, end_time, timeline_dir)
+
+    if renderer == "collections":
+        render_object_timeline(ax, object_movements, object_labels_array, all_object_labels)
+    else:
+        for _, association_data in object_movements.items():
+            if not association_data["name"] in all_object_labels:
+                continue
+            plot_object_touches(
+                track_sequence=association_data["tracks"], axis=ax, y_position=all_object_labels.index(association_data["name"])
+            )
+        plot_object_usage_segments(object_labels_array, ax, all_object_labels)
 
     ax.set_xlabel("Time (minutes:seconds)")
-    video_end_time = action_narrations.iloc[-1]["end_timestamp"]
     # ## convert x-axis to minutes:seconds
     tick_interval = 30  # seconds
-    xticks = [i for i in range(0, int(video_end_time)+tick_interval, tick_interval)]
+    xticks = [i for i in range(0, int(end_time)+tick_interval, tick_interval)]
     ax.set_xticks(xticks)
     ax.set_xticklabels([seconds_to_minutes_seconds(i) for i in xticks], rotation=60)
 
@@ -188,7 +414,100 @@ def main():
     fig.tight_layout()
     ## turn on grid
     ax.grid(True)
-    fig.savefig(f"plots/object_touches_usage_{args.video_id}.png")
+    os.makedirs("plots", exist_ok=True)
+    figure_path = f"plots/object_touches_usage_{video_id}.{figure_format}"
+    fig.savefig(figure_path)
+    plt.close(fig)
+    return figure_path
+
+
+def _process_video_quietly(*process_args):
+    """process_video in a batch worker, without the per-segment logging."""
+    global VERBOSE
+    VERBOSE = False
+    return process_video(*process_args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video_id", help="Video ID to process")
+    parser.add_argument("--all_videos", action="store_true",
+                        help="Process every video with a labels file in --object_usage_labels_folder")
+    parser.add_argument(
+        "--object_usage_labels_folder",
+        default="outputs/object_usage_labels",
+        help="Folder containing object usage labels jsonl files"
+    )
+    parser.add_argument("--scene_graph_dir", default="outputs/scene_graphs",
+                        help="Folder containing scene_graphs_<video_id>.jsonl files")
+    parser.add_argument("--object_labels_dir", default="outputs/object_labels",
+                        help="Output folder for the combined object_labels_<video_id>.json files")
+    parser.add_argument(
+        "--join",
+        choices=["index", "pandas"],
+        default="index",
+        help="How usage labels are joined with scene-graph events: per-object bisect index or pandas merge"
+    )
+    parser.add_argument("--renderer", choices=["collections", "per_object"], default="collections",
+                        help="collections: batched artists for all objects; per_object: one plot call per object")
+    parser.add_argument("--figure_format", choices=["png", "svg", "pdf"], default="png",
+                        help="Figure file format; svg/pdf give lightweight vector timelines")
+    parser.add_argument("--timeline_dir", default="outputs/object_timelines",
+                        help="Folder for the interactive timeline viewer and its per-video JSON; empty to skip")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Worker processes for --all_videos")
+    args = parser.parse_args()
+    if args.all_videos == (args.video_id is not None):
+        parser.error("Pass exactly one of --video_id and --all_videos")
+
+    video_ids = find_labeled_videos(args.object_usage_labels_folder) if args.all_videos else [args.video_id]
+    if not video_ids:
+        raise FileNotFoundError(f"No object usage labels files in {args.object_usage_labels_folder}")
+
+    # Shared data is loaded once; each video only gets its own entries
+    with open("scene-and-object-movements/assoc_info.json", encoding='utf-8') as f:
+        object_movements_all = json.load(f)
+
+    with open("scene-and-object-movements/mask_info.json", "r", encoding='utf-8') as f:
+        mask_fixtures_all = json.load(f)
+
+    with open("narrations-and-action-segments/HD_EPIC_Narrations.pkl", "rb") as f:
+        action_narrations_all = pickle.load(f)
+
+    def video_task(video_id):
+        return (video_id, object_movements_all[video_id], mask_fixtures_all[video_id],
+                video_end_time(action_narrations_all, video_id), args.object_usage_labels_folder,
+                args.scene_graph_dir, args.object_labels_dir, args.join, args.renderer, args.figure_format,
+                args.timeline_dir)
+
+    if not args.all_videos:
+        print(f"Saved {process_video(*video_task(args.video_id))}")
+        if args.timeline_dir:
+            write_timeline_index(args.timeline_dir)
+        return
+
+    print(f"Processing {len(video_ids)} videos with {args.workers} workers")
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {}
+        for video_id in video_ids:
+            try:
+                futures[pool.submit(_process_video_quietly, *video_task(video_id))] = video_id
+            except (KeyError, IndexError) as e:
+                print(f"{video_id}: no annotations or narrations ({e!r}), skipping")
+                failed.append(video_id)
+        for done, future in enumerate(as_completed(futures), 1):
+            video_id = futures[future]
+            try:
+                print(f"[{done}/{len(video_ids)}] {video_id}: saved {future.result()}")
+            except Exception as e:
+                print(f"[{done}/{len(video_ids)}] {video_id}: failed: {e}")
+                failed.append(video_id)
+    if failed:
+        print(f"Failed videos ({len(failed)}): {', '.join(failed)}")
+    if args.timeline_dir:
+        write_timeline_index(args.timeline_dir)
+        print(f"Timeline viewer: {os.path.join(args.timeline_dir, os.path.basename(TIMELINE_VIEWER))}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,277 @@
+"""
+Aggregate object usage labels across videos and labeling runs.
+
+A labeling run is one outputs/object_usage_labels_model-... directory written by
+label_object_usage_llm.py. load_usage_table streams every object_usage_labels_<video_id>.jsonl
+of the given runs into one pandas table with a row per labeled segment:
+
+    run, video_id, participant, object_name, object_class, segment_category,
+    activity, time_start, time_end, duration, is_used
+
+object_class is the object name without instance suffixes ("plate2" -> "plate"), activity the
+high-level activity at the middle of the segment, and is_used 1/0, or -1 where the LLM
+response had no valid label. Only these columns are kept (the prompts are dropped), and the
+table of a run is cached next to its label files until one of them changes, so repeated
+aggregations over all runs take seconds. usage_summary computes grouped statistics on the
+table; last_trace_table does the same for the pre/last/after trace labels in
+plots/object_usage_labels.json.
+
+Usage:
+    python usage_statistics.py --runs "outputs/object_usage_labels*" --by object_class participant
+"""
+
+import os
+import re
+import glob
+import json
+import argparse
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (pandas Parquet engine)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+USAGE_COLUMNS = ["run", "video_id", "participant", "object_name", "object_class", "segment_category",
+                 "activity", "time_start", "time_end", "duration", "is_used"]
+CATEGORICAL_COLUMNS = ["run", "video_id", "participant", "object_name", "object_class", "segment_category",
+                       "activity"]
+GROUPINGS = ["run", "video_id", "participant", "object_name", "object_class", "segment_category", "activity"]
+TRACE_PHASES = ["pre_lastTrace", "lastTrace", "after_lastTrace"]
+CACHE_NAME = "usage_table"
+
+
+def object_class(object_name: str) -> str:
+    """Object name without instance numbering, lowercased: 'Plate 2' and 'plate2' -> 'plate'."""
+    return re.sub(r"[\s_]*\d+$", "", object_name.strip()).lower()
+
+
+def _label_files(run_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(run_dir, "object_usage_labels_*.jsonl")))
+
+
+def _video_id(path: str) -> str:
+    return re.sub(r"^object_usage_labels_|\.jsonl$", "", os.path.basename(path))
+
+
+def read_run(run_dir: str) -> pd.DataFrame:
+    """Usage table of one labeling run, without activities, parsed from its label files."""
+    run = os.path.basename(os.path.normpath(run_dir))
+    columns = {name: [] for name in ["video_id", "object_name", "segment_category", "time_start", "time_end", "is_used"]}
+    for path in _label_files(run_dir):
+        video_id = _video_id(path)
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                label = json.loads(line)
+                is_used = (label.get("llm_response_json") or {}).get("is_used")
+                columns["video_id"].append(video_id)
+                columns["object_name"].append(label["object_name"])
+                columns["segment_category"].append(label.get("segment_category"))
+                columns["time_start"].append(label["time_start"])
+                columns["time_end"].append(label["time_end"])
+                columns["is_used"].append(-1 if is_used is None else int(bool(is_used)))
+
+    table = pd.DataFrame({
+        "run": run,
+        "video_id": columns["video_id"],
+        "participant": [video_id.split("-")[0] for video_id in columns["video_id"]],
+        "object_name": columns["object_name"],
+        "object_class": [object_class(name) for name in columns["object_name"]],
+        "segment_category": columns["segment_category"],
+        "time_start": np.asarray(columns["time_start"], dtype=np.float64),
+        "time_end": np.asarray(columns["time_end"], dtype=np.float64),
+        "is_used": np.asarray(columns["is_used"], dtype=np.int8),
+    })
+    table["duration"] = table["time_end"] - table["time_start"]
+    return table
+
+
+def _cache_paths(run_dir: str):
+    extension = "parquet" if PARQUET_AVAILABLE else "pkl"
+    return os.path.join(run_dir, f"{CACHE_NAME}.{extension}"), os.path.join(run_dir, f"{CACHE_NAME}.json")
+
+
+def load_run(run_dir: str, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Usage table of one labeling run, from the cache if no label file changed since it was written.
+
+    The cache is Parquet if pyarrow is installed, a pandas pickle otherwise; its sidecar JSON
+    records the size and mtime of every label file it was built from.
+    """
+    table_path, state_path = _cache_paths(run_dir)
+    state = {os.path.basename(path): [os.path.getsize(path), os.path.getmtime(path)] for path in _label_files(run_dir)}
+    if use_cache and os.path.exists(table_path) and os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            if json.load(f) == state:
+                return pd.read_parquet(table_path) if PARQUET_AVAILABLE else pd.read_pickle(table_path)
+
+    table = read_run(run_dir)
+    if use_cache:
+        if PARQUET_AVAILABLE:
+            table.to_parquet(table_path + ".tmp", index=False)
+        else:
+            table.to_pickle(table_path + ".tmp")
+        os.replace(table_path + ".tmp", table_path)
+        with open(state_path, "w") as f:
+            json.dump(state, f)
+    return table
+
+
+def load_activities(activities_dir: str = "high-level/activities") -> pd.DataFrame:
+    """All <participant>_recipe_timestamps.csv files: video_id, activity, start_time, end_time."""
+    frames = [pd.read_csv(path) for path in sorted(glob.glob(os.path.join(activities_dir, "*_recipe_timestamps.csv")))]
+    if not frames:
+        return pd.DataFrame(columns=["video_id", "activity", "start_time", "end_time"])
+    activities = pd.concat(frames, ignore_index=True)
+    # "end" marks an activity that lasts until the end of the video
+    end_time = pd.to_numeric(activities["end_time"], errors="coerce").fillna(np.inf)
+    return pd.DataFrame({
+        "video_id": activities["video_id"].astype(str),
+        "activity": activities["high_level_activity_label"],
+        "start_time": activities["start_time"].astype(float),
+        "end_time": end_time,
+    })
+
+
+def assign_activities(table: pd.DataFrame, activities: pd.DataFrame) -> pd.Series:
+    """High-level activity at the middle of each segment (None outside all activities)."""
+    if len(activities) == 0:
+        return pd.Series(None, index=table.index, dtype=object)
+    segments = pd.DataFrame({
+        "row": np.arange(len(table)),
+        "video_id": table["video_id"].astype(str).to_numpy(),
+        "time": ((table["time_start"] + table["time_end"]) / 2).to_numpy(),
+    }).sort_values("time", kind="stable")
+    matched = pd.merge_asof(segments, activities.sort_values("start_time"), left_on="time",
+                            right_on="start_time", by="video_id", direction="backward")
+    inside = matched["time"] < matched["end_time"]
+    activity = matched["activity"].where(inside)
+    result = np.empty(len(table), dtype=object)
+    result[matched["row"].to_numpy()] = activity.to_numpy()
+    return pd.Series(result, index=table.index)
+
+
+def load_usage_table(run_dirs: Iterable[str], activities_dir: Optional[str] = "high-level/activities",
+                     use_cache: bool = True) -> pd.DataFrame:
+    """
+    Usage table of all given labeling runs (see the module docstring for the columns).
+
+    Args:
+        run_dirs: Directories with object_usage_labels_<video_id>.jsonl files
+        activities_dir: Folder of the high-level activity CSVs; None leaves activity empty
+        use_cache: Read and write the per-run table cache
+    """
+    tables = [load_run(run_dir, use_cache) for run_dir in run_dirs]
+    tables = [table for table in tables if len(table)]
+    if not tables:
+        return pd.DataFrame(columns=USAGE_COLUMNS)
+    table = pd.concat(tables, ignore_index=True)
+    table["activity"] = assign_activities(table, load_activities(activities_dir)) if activities_dir else None
+    for column in CATEGORICAL_COLUMNS:
+        table[column] = table[column].astype("category")
+    return table[USAGE_COLUMNS]
+
+
+def usage_summary(table: pd.DataFrame, by: List[str]) -> pd.DataFrame:
+    """
+    Usage statistics per group.
+
+    Columns: segments, used, invalid, fraction_used (of the segments with a valid label),
+    seconds, used_seconds and fraction_time_used, sorted by number of segments.
+    """
+    valid = table["is_used"] >= 0
+    used = table["is_used"] == 1
+    frame = pd.DataFrame({
+        **{column: table[column] for column in by},
+        "segments": 1,
+        "valid": valid.astype(np.int64),
+        "used": used.astype(np.int64),
+        "seconds": table["duration"].where(valid, 0.0),
+        "used_seconds": table["duration"].where(used, 0.0),
+    })
+    summary = frame.groupby(by, observed=True, dropna=False).sum()
+    summary["invalid"] = summary["segments"] - summary["valid"]
+    summary["fraction_used"] = summary["used"] / summary["valid"].replace(0, np.nan)
+    summary["fraction_time_used"] = summary["used_seconds"] / summary["seconds"].replace(0, np.nan)
+    columns = ["segments", "used", "invalid", "fraction_used", "seconds", "used_seconds", "fraction_time_used"]
+    return summary[columns].sort_values("segments", ascending=False)
+
+
+def last_trace_table(path: str = "plots/object_usage_labels.json") -> pd.DataFrame:
+    """
+    The pre/last/after trace labels of plots/object_usage_labels.json as one row per phase.
+
+    Columns: video_id, participant, object_name, object_class, association_id, phase, start,
+    end (NaN for the open-ended after_lastTrace phase) and label ("idle"/"inuse"). Skipped
+    objects are left out.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+    rows = []
+    for video_id, objects in labels.items():
+        for obj in objects:
+            if obj.get("skip"):
+                continue
+            for phase in TRACE_PHASES:
+                if f"{phase}_label" not in obj:
+                    continue
+                rows.append((video_id, video_id.split("-")[0], obj["object_name"], object_class(obj["object_name"]),
+                             obj.get("association_id"), phase, obj.get(f"{phase}_start", np.nan),
+                             obj.get(f"{phase}_end", np.nan), obj[f"{phase}_label"]))
+    columns = ["video_id", "participant", "object_name", "object_class", "association_id",
+               "phase", "start", "end", "label"]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def last_trace_summary(trace_table: pd.DataFrame, by: Optional[List[str]] = None) -> pd.DataFrame:
+    """Share of idle/inuse labels per phase (and per group in by)."""
+    keys = (by or []) + ["phase"]
+    counts = pd.crosstab([trace_table[key] for key in keys], trace_table["label"])
+    return counts.div(counts.sum(axis=1), axis=0).join(counts.sum(axis=1).rename("objects"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate object usage labels across videos and runs")
+    parser.add_argument("--runs", nargs="+", default=["outputs/object_usage_labels*"],
+                        help="Labeling run directories (glob patterns allowed)")
+    parser.add_argument("--by", nargs="+", default=["object_class"], choices=GROUPINGS,
+                        help="Columns to group by")
+    parser.add_argument("--activities_dir", default="high-level/activities")
+    parser.add_argument("--last_trace_labels", default="plots/object_usage_labels.json",
+                        help="pre/last/after trace labels to summarize; empty to skip")
+    parser.add_argument("--top", type=int, default=30, help="Rows of each summary to print")
+    parser.add_argument("--output_dir", default=None, help="Also write the table and summaries as CSV here")
+    parser.add_argument("--no_cache", action="store_true", help="Re-parse all label files")
+    args = parser.parse_args()
+
+    run_dirs = sorted({path for pattern in args.runs for path in glob.glob(pattern) if os.path.isdir(path)})
+    table = load_usage_table(run_dirs, args.activities_dir, use_cache=not args.no_cache)
+    print(f"{len(table)} labeled segments of {table['video_id'].nunique()} videos in {len(run_dirs)} runs")
+
+    pd.set_option("display.width", 200)
+    summaries: Dict[str, pd.DataFrame] = {}
+    if len(table):
+        summaries["usage_by_" + "_".join(args.by)] = usage_summary(table, args.by)
+    if args.last_trace_labels and os.path.exists(args.last_trace_labels):
+        summaries["last_trace"] = last_trace_summary(last_trace_table(args.last_trace_labels))
+
+    for name, summary in summaries.items():
+        print(f"\n{name}\n{summary.head(args.top).to_string(float_format=lambda v: f'{v:.3f}')}")
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        table.to_csv(os.path.join(args.output_dir, "usage_table.csv"), index=False)
+        for name, summary in summaries.items():
+            summary.to_csv(os.path.join(args.output_dir, f"{name}.csv"))
+        print(f"\nWrote CSVs to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -117,7 +117,8 @@ def generate_time_wise_scene_graphs(object_movements: dict, mask_fixtures: dict)
             continue
         if len(assoc_data["tracks"]) > 0:
             first_track = assoc_data["tracks"][0]
-            first_pick_mask_id = first_track["masks"][0]
+            # Tracks without masks start in Free Space, like unknown masks
+            first_pick_mask_id = first_track["masks"][0] if first_track["masks"] else "unknown"
             
             # Get fixture from mask_info
             if first_pick_mask_id in mask_fixtures:
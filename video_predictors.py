@@ -0,0 +1,274 @@
+"""
+Video predictors used by the dense annotation scripts.
+
+VideoPredictor is the subset of the SAM 2 video predictor API the pipeline uses
+(init_state, add_new_points_or_box, propagate_in_video, reset_state) plus an
+autocast() context for the predictor's mixed-precision setting.
+
+SAM2VideoPredictor wraps build_sam2_video_predictor. MockVideoPredictor runs on
+the CPU without model weights: every object's box moves with constant velocity
+between (and after) its prompts and is rendered as mask logits of the same
+shape SAM 2 returns. With the mock, window planning, video decoding, bbox
+extraction, checkpointing and merging can be profiled and regression-tested
+without a GPU.
+"""
+
+import json
+import subprocess
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Protocol, Tuple
+
+import numpy as np
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+try:
+    from sam2.build_sam import build_sam2_video_predictor
+    SAM2_AVAILABLE = True
+except ImportError:
+    SAM2_AVAILABLE = False
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+
+PREDICTORS = ("sam2", "mock")
+DEFAULT_SAM2_CHECKPOINT = "/coc/flash5/kvr6/repos/sam2/checkpoints/sam2.1_hiera_large.pt"
+DEFAULT_SAM2_CONFIG = "configs/sam2.1/sam2.1_hiera_l.yaml"
+
+
+class VideoPredictor(Protocol):
+    """Interface of the SAM 2 video predictor as used by the dense annotation pipeline."""
+
+    def init_state(self, video_path: str, offload_video_to_cpu: bool = False,
+                   offload_state_to_cpu: bool = False) -> Dict:
+        ...
+
+    def add_new_points_or_box(self, inference_state: Dict, frame_idx: int, obj_id: int,
+                              points=None, labels=None, box=None) -> Tuple[int, List[int], Any]:
+        ...
+
+    def propagate_in_video(self, inference_state: Dict, start_frame_idx: Optional[int] = None,
+                           max_frame_num_to_track: Optional[int] = None,
+                           reverse: bool = False) -> Iterator[Tuple[int, List[int], Any]]:
+        ...
+
+    def reset_state(self, inference_state: Dict):
+        ...
+
+    def autocast(self) -> ContextManager:
+        ...
+
+
+class SAM2VideoPredictor:
+    """SAM 2 video predictor with the pipeline's device and precision settings."""
+
+    def __init__(self, model_cfg: str = DEFAULT_SAM2_CONFIG, checkpoint: str = DEFAULT_SAM2_CHECKPOINT,
+                 device: Optional[str] = None):
+        """
+        Args:
+            model_cfg: SAM 2 model config (relative to the sam2 package)
+            checkpoint: Path to the matching checkpoint
+            device: Torch device (default: cuda if available, else cpu)
+        """
+        if not SAM2_AVAILABLE:
+            raise ImportError("SAM 2 not found. Please ensure it is installed.")
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.predictor = build_sam2_video_predictor(model_cfg, checkpoint, device=self.device)
+        print(f"SAM 2 predictor initialized on {self.device}")
+
+        # Enable optimizations
+        if self.device.type == "cuda":
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+
+    def init_state(self, video_path: str, offload_video_to_cpu: bool = False,
+                   offload_state_to_cpu: bool = False) -> Dict:
+        return self.predictor.init_state(
+            video_path=video_path,
+            offload_video_to_cpu=offload_video_to_cpu,
+            offload_state_to_cpu=offload_state_to_cpu,
+        )
+
+    def add_new_points_or_box(self, inference_state: Dict, frame_idx: int, obj_id: int,
+                              points=None, labels=None, box=None):
+        return self.predictor.add_new_points_or_box(
+            inference_state=inference_state, frame_idx=frame_idx, obj_id=obj_id,
+            points=points, labels=labels, box=box,
+        )
+
+    def propagate_in_video(self, inference_state: Dict, start_frame_idx: Optional[int] = None,
+                           max_frame_num_to_track: Optional[int] = None, reverse: bool = False):
+        return self.predictor.propagate_in_video(
+            inference_state, start_frame_idx=start_frame_idx,
+            max_frame_num_to_track=max_frame_num_to_track, reverse=reverse,
+        )
+
+    def reset_state(self, inference_state: Dict):
+        self.predictor.reset_state(inference_state)
+
+    def autocast(self) -> ContextManager:
+        """BFloat16 autocast on the GPU; no autocast on the CPU."""
+        if self.device.type == "cuda":
+            return torch.autocast(device_type="cuda", dtype=torch.bfloat16)
+        return nullcontext()
+
+
+def _probe_video(video_path: str) -> Tuple[int, int, int]:
+    """Return (num_frames, height, width) of a video file."""
+    if CV2_AVAILABLE:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        cap.release()
+        return num_frames, height, width
+
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+        '-show_entries', 'stream=width,height,nb_read_packets',
+        '-of', 'json', video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    stream = json.loads(result.stdout)['streams'][0]
+    return int(stream['nb_read_packets']), int(stream['height']), int(stream['width'])
+
+
+class MockVideoPredictor:
+    """
+    CPU stand-in for SAM2VideoPredictor with constant-velocity box tracking.
+
+    Between two prompts of an object its box is interpolated linearly; after the last
+    prompt it keeps moving with the velocity between the last two prompts (or stays put
+    if there is only one), and before its first prompt its mask is empty. Masks are
+    returned as (N, 1, H, W) logits, like SAM 2's; with render_every, frames the consumer
+    drops get an empty (N, 1, 0, 0) placeholder instead, so benchmarks time the pipeline
+    rather than the mock's own rendering.
+    """
+
+    def __init__(self, num_frames: Optional[int] = None, frame_size: Optional[Tuple[int, int]] = None,
+                 decode_frames: bool = True, render_every: Optional[int] = None):
+        """
+        Args:
+            num_frames: Fixed number of frames per video (synthetic mode, no file is opened)
+            frame_size: Fixed (height, width) of the masks (synthetic mode)
+            decode_frames: In file mode, decode every frame in init_state as SAM 2 does,
+                so decode time shows up in benchmarks (requires OpenCV)
+            render_every: Only render propagated frames whose index is a multiple of this,
+                e.g. the consumer's frame_interval when every segment starts on its grid
+        """
+        self.num_frames = num_frames
+        self.frame_size = frame_size
+        self.decode_frames = decode_frames
+        self.render_every = render_every
+        print("Mock video predictor initialized (CPU, constant-velocity boxes)")
+
+    def init_state(self, video_path: str, offload_video_to_cpu: bool = False,
+                   offload_state_to_cpu: bool = False) -> Dict:
+        if self.num_frames is not None and self.frame_size is not None:
+            num_frames, (height, width) = self.num_frames, self.frame_size
+        else:
+            num_frames, height, width = _probe_video(video_path)
+            if self.decode_frames and CV2_AVAILABLE:
+                cap = cv2.VideoCapture(video_path)
+                num_frames = 0
+                while cap.grab():
+                    cap.retrieve()
+                    num_frames += 1
+                cap.release()
+        return {"num_frames": num_frames, "height": height, "width": width, "prompts": {}}
+
+    def add_new_points_or_box(self, inference_state: Dict, frame_idx: int, obj_id: int,
+                              points=None, labels=None, box=None):
+        if box is None:
+            raise ValueError("MockVideoPredictor only supports box prompts")
+        inference_state["prompts"].setdefault(obj_id, {})[frame_idx] = np.asarray(box, dtype=np.float64)
+        obj_ids = list(inference_state["prompts"].keys())
+        return frame_idx, obj_ids, self._render(inference_state, frame_idx, obj_ids)
+
+    def propagate_in_video(self, inference_state: Dict, start_frame_idx: Optional[int] = None,
+                           max_frame_num_to_track: Optional[int] = None, reverse: bool = False):
+        if reverse:
+            raise ValueError("MockVideoPredictor only propagates forward")
+        prompts = inference_state["prompts"]
+        if not prompts:
+            return
+        if start_frame_idx is None:
+            start_frame_idx = min(min(frames) for frames in prompts.values())
+        end_frame_idx = inference_state["num_frames"]
+        if max_frame_num_to_track is not None:
+            end_frame_idx = min(end_frame_idx, start_frame_idx + max_frame_num_to_track + 1)
+
+        obj_ids = list(prompts.keys())
+        placeholder = np.empty((len(obj_ids), 1, 0, 0), dtype=np.float32)
+        if TORCH_AVAILABLE:
+            placeholder = torch.from_numpy(placeholder)
+        for frame_idx in range(start_frame_idx, end_frame_idx):
+            if self.render_every is not None and frame_idx % self.render_every != 0:
+                yield frame_idx, obj_ids, placeholder
+                continue
+            yield frame_idx, obj_ids, self._render(inference_state, frame_idx, obj_ids)
+
+    def reset_state(self, inference_state: Dict):
+        inference_state["prompts"].clear()
+
+    def autocast(self) -> ContextManager:
+        return nullcontext()
+
+    @staticmethod
+    def _box_at(obj_prompts: Dict[int, np.ndarray], frame_idx: int) -> Optional[np.ndarray]:
+        """Constant-velocity box of one object at frame_idx, or None before its first prompt."""
+        frames = sorted(obj_prompts)
+        if frame_idx < frames[0]:
+            return None
+        pos = np.searchsorted(frames, frame_idx, side='right')
+        if pos < len(frames):
+            f0, f1 = frames[pos - 1], frames[pos]
+        elif len(frames) > 1:
+            f0, f1 = frames[-2], frames[-1]
+        else:
+            return obj_prompts[frames[0]]
+        velocity = (obj_prompts[f1] - obj_prompts[f0]) / (f1 - f0)
+        return obj_prompts[f0] + velocity * (frame_idx - f0)
+
+    def _render(self, inference_state: Dict, frame_idx: int, obj_ids: List[int]):
+        height, width = inference_state["height"], inference_state["width"]
+        logits = np.full((len(obj_ids), 1, height, width), -10.0, dtype=np.float32)
+        for i, obj_id in enumerate(obj_ids):
+            box = self._box_at(inference_state["prompts"][obj_id], frame_idx)
+            if box is None:
+                continue
+            x0, y0 = max(int(round(box[0])), 0), max(int(round(box[1])), 0)
+            x1, y1 = min(int(round(box[2])), width - 1), min(int(round(box[3])), height - 1)
+            if x0 <= x1 and y0 <= y1:
+                logits[i, 0, y0:y1 + 1, x0:x1 + 1] = 10.0
+        if TORCH_AVAILABLE:
+            return torch.from_numpy(logits)
+        return logits
+
+
+def build_video_predictor(name: str = "sam2", sam2_config: str = DEFAULT_SAM2_CONFIG,
+                          sam2_checkpoint: str = DEFAULT_SAM2_CHECKPOINT, **mock_kwargs) -> VideoPredictor:
+    """
+    Create a predictor by name.
+
+    Args:
+        name: One of PREDICTORS ("sam2" or "mock")
+        sam2_config: SAM 2 model config, for "sam2"
+        sam2_checkpoint: SAM 2 checkpoint path, for "sam2"
+        **mock_kwargs: Passed to MockVideoPredictor, for "mock"
+    """
+    if name == "sam2":
+        return SAM2VideoPredictor(sam2_config, sam2_checkpoint)
+    if name == "mock":
+        return MockVideoPredictor(**mock_kwargs)
+    raise ValueError(f"Unknown predictor {name!r}; expected one of {PREDICTORS}")
@@ -0,0 +1,251 @@
+"""
+Indexed loader for the VQA benchmark (vqa-benchmark/<task>.json).
+
+Every benchmark file maps question ids to {inputs, question, choices, correct_idx}, with the
+times and boxes the question refers to embedded as tokens in the text:
+
+    <TIME 00:03:1.8 video 1>        a time (HH:MM:SS.s) in one of the inputs
+    <BBOX x1 y1 x2 y2>               a box in pixel coordinates of the full resolution video
+
+load_vqa_benchmark parses every question once into a plain record with these tokens already
+converted to numbers (times in seconds), and indexes the records by task, video id and
+participant. The parsed records of each task file are cached as <task>.pkl in
+<benchmark_dir>/.cache; a sidecar JSON records the size and mtime of every file they were
+built from, and only files that changed since are parsed and pickled again, so reloading the
+full benchmark takes milliseconds.
+
+Question record:
+
+    qid, task, question, choices, correct_idx
+    inputs       {"video 1": {"id", "start_time", "end_time", "time"}, ...}, times in seconds or None
+    video_ids    unique video ids of the inputs, in input order
+    participants unique participants (P01, ...) of video_ids
+    times        [(seconds, input name), ...] of the TIME tokens in the question
+    bboxes       [(x1, y1, x2, y2), ...] of the BBOX tokens in the question
+    choice_times [[(seconds, input name), ...], ...] of the TIME tokens in each choice
+    extra        any other fields of the question (stat, metadata)
+
+Usage:
+    python vqa_benchmark.py --benchmark_dir vqa-benchmark --task object_motion_object_movement_counting
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import pickle
+import argparse
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+DEFAULT_BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vqa-benchmark")
+CACHE_SUBDIR = ".cache"
+CACHE_NAME = "vqa_store"
+# Bumped whenever the record or cache layout changes, so old caches are rebuilt
+CACHE_VERSION = 2
+
+TIME_TOKEN = re.compile(r"<TIME (\d+):(\d+):([\d.]+) ((?:video|image) \d+)>")
+BBOX_TOKEN = re.compile(r"<BBOX ([-\d.e]+) ([-\d.e]+) ([-\d.e]+) ([-\d.e]+)>")
+QUESTION_FIELDS = {"inputs", "question", "choices", "correct_idx"}
+
+
+def parse_timestamp(timestamp: Optional[str]) -> Optional[float]:
+    """Seconds of an HH:MM:SS.sss timestamp (unpadded fields like 00:03:1.8 allowed), None for None."""
+    if timestamp is None:
+        return None
+    hours, minutes, seconds = timestamp.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_time_tokens(text: str) -> List[Tuple[float, str]]:
+    """(seconds, input name) of every <TIME ...> token in text, in order."""
+    return [(int(h) * 3600 + int(m) * 60 + float(s), sys.intern(ref)) for h, m, s, ref in TIME_TOKEN.findall(text)]
+
+
+def parse_bbox_tokens(text: str) -> List[Tuple[float, float, float, float]]:
+    """(x1, y1, x2, y2) of every <BBOX ...> token in text, in order."""
+    return [tuple(float(v) for v in match) for match in BBOX_TOKEN.findall(text)]
+
+
+def _choice_text(choice) -> str:
+    # Choices are strings, or lists of strings for ordering questions
+    return " ".join(choice) if isinstance(choice, list) else str(choice)
+
+
+def parse_question(qid: str, task: str, raw: Dict) -> Dict:
+    """Question record (see the module docstring) of one raw benchmark entry."""
+    inputs = {}
+    for name, visual_input in raw["inputs"].items():
+        inputs[sys.intern(name)] = {
+            "id": sys.intern(visual_input["id"]),
+            "start_time": parse_timestamp(visual_input.get("start_time")),
+            "end_time": parse_timestamp(visual_input.get("end_time")),
+            "time": parse_timestamp(visual_input.get("time")),
+        }
+    video_ids = list(dict.fromkeys(visual_input["id"] for visual_input in inputs.values()))
+    return {
+        "qid": qid,
+        "task": task,
+        "question": raw["question"],
+        "choices": raw["choices"],
+        "correct_idx": raw["correct_idx"],
+        "inputs": inputs,
+        "video_ids": video_ids,
+        "participants": list(dict.fromkeys(sys.intern(video_id.split("-")[0]) for video_id in video_ids)),
+        "times": parse_time_tokens(raw["question"]),
+        "bboxes": parse_bbox_tokens(raw["question"]),
+        "choice_times": [parse_time_tokens(_choice_text(choice)) for choice in raw["choices"]],
+        "extra": {key: value for key, value in raw.items() if key not in QUESTION_FIELDS},
+    }
+
+
+def parse_task_file(path: str) -> List[Dict]:
+    """Question records of one benchmark file, in file order."""
+    task = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "r", encoding="utf-8") as f:
+        raw_questions = json.load(f)
+    return [parse_question(qid, task, raw) for qid, raw in raw_questions.items()]
+
+
+class VQABenchmark:
+    """Parsed benchmark questions with indices by task, video id and participant."""
+
+    def __init__(self, questions: Iterable[Dict]):
+        self.questions: Dict[str, Dict] = {}
+        self.by_task: Dict[str, List[str]] = defaultdict(list)
+        self.by_video: Dict[str, List[str]] = defaultdict(list)
+        self.by_participant: Dict[str, List[str]] = defaultdict(list)
+        for question in questions:
+            qid = question["qid"]
+            self.questions[qid] = question
+            self.by_task[question["task"]].append(qid)
+            for video_id in question["video_ids"]:
+                self.by_video[video_id].append(qid)
+            for participant in question["participants"]:
+                self.by_participant[participant].append(qid)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.questions.values())
+
+    def __getitem__(self, qid: str) -> Dict:
+        return self.questions[qid]
+
+    @property
+    def tasks(self) -> List[str]:
+        return sorted(self.by_task)
+
+    def select(self, task: Optional[str] = None, video_id: Optional[str] = None,
+               participant: Optional[str] = None) -> List[Dict]:
+        """Questions matching all given filters, in benchmark order."""
+        candidates = None
+        for index, key in ((self.by_task, task), (self.by_video, video_id), (self.by_participant, participant)):
+            if key is None:
+                continue
+            qids = index.get(key, [])
+            if candidates is None:
+                candidates = qids
+            else:
+                selected = set(qids)
+                candidates = [qid for qid in candidates if qid in selected]
+        if candidates is None:
+            return list(self.questions.values())
+        return [self.questions[qid] for qid in candidates]
+
+
+def _task_files(benchmark_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(benchmark_dir, "*.json")))
+
+
+def _cache_dir(benchmark_dir: str, cache_dir: Optional[str]) -> str:
+    # A subdirectory, so the sidecar JSON is not picked up as a task file
+    return cache_dir or os.path.join(benchmark_dir, CACHE_SUBDIR)
+
+
+def load_vqa_benchmark(benchmark_dir: str = DEFAULT_BENCHMARK_DIR, tasks: Optional[Iterable[str]] = None,
+                       use_cache: bool = True, cache_dir: Optional[str] = None) -> VQABenchmark:
+    """
+    Parsed and indexed benchmark questions, reusing the cached records of unchanged files.
+
+    Args:
+        benchmark_dir: Directory with the <task>.json files
+        tasks: Only load these tasks (file names without .json); all by default
+        use_cache: Read and update the per-file pickle cache
+        cache_dir: Where the cache is kept (default: <benchmark_dir>/.cache)
+
+    Returns:
+        VQABenchmark over the questions of the selected tasks
+    """
+    paths = _task_files(benchmark_dir)
+    if tasks is not None:
+        tasks = set(tasks)
+        paths = [path for path in paths if os.path.splitext(os.path.basename(path))[0] in tasks]
+        missing = tasks - {os.path.splitext(os.path.basename(path))[0] for path in paths}
+        if missing:
+            raise ValueError(f"Unknown VQA task(s): {', '.join(sorted(missing))}")
+
+    cache_dir = _cache_dir(benchmark_dir, cache_dir)
+    state_path = os.path.join(cache_dir, f"{CACHE_NAME}.json")
+    cached_files = {}
+    if use_cache and os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            cached_state = json.load(f)
+        if cached_state.get("version") == CACHE_VERSION:
+            cached_files = cached_state["files"]
+
+    records, parsed = {}, 0
+    for path in paths:
+        name = os.path.basename(path)
+        pickle_path = os.path.join(cache_dir, os.path.splitext(name)[0] + ".pkl")
+        file_state = [os.path.getsize(path), os.path.getmtime(path)]
+        if cached_files.get(name) == file_state and os.path.exists(pickle_path):
+            with open(pickle_path, "rb") as f:
+                records[name] = pickle.load(f)
+            continue
+        records[name] = parse_task_file(path)
+        parsed += 1
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(pickle_path + ".tmp", "wb") as f:
+                pickle.dump(records[name], f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(pickle_path + ".tmp", pickle_path)
+            cached_files[name] = file_state
+
+    if use_cache and parsed:
+        # Entries of files outside this selection are kept
+        with open(state_path + ".tmp", "w") as f:
+            json.dump({"version": CACHE_VERSION, "files": cached_files}, f)
+        os.replace(state_path + ".tmp", state_path)
+
+    return VQABenchmark(question for path in paths for question in records[os.path.basename(path)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the VQA benchmark and summarize its questions")
+    parser.add_argument("--benchmark_dir", default=DEFAULT_BENCHMARK_DIR, help="Directory with the <task>.json files")
+    parser.add_argument("--task", nargs="*", default=None, help="Only load these tasks")
+    parser.add_argument("--video_id", default=None, help="Only summarize questions about this video")
+    parser.add_argument("--participant", default=None, help="Only summarize questions of this participant")
+    parser.add_argument("--cache_dir", default=None, help="Where the parsed records are cached (default: <benchmark_dir>/.cache)")
+    parser.add_argument("--no_cache", action="store_true", help="Parse all files again and do not write the cache")
+    args = parser.parse_args()
+
+    benchmark = load_vqa_benchmark(args.benchmark_dir, args.task, not args.no_cache, args.cache_dir)
+    questions = benchmark.select(video_id=args.video_id, participant=args.participant)
+    print(f"Loaded {len(benchmark)} questions of {len(benchmark.tasks)} tasks "
+          f"({len(benchmark.by_video)} videos, {len(benchmark.by_participant)} participants)")
+
+    counts = Counter(question["task"] for question in questions)
+    for task in sorted(counts):
+        task_questions = [question for question in questions if question["task"] == task]
+        with_time = sum(1 for question in task_questions if question["times"])
+        with_bbox = sum(1 for question in task_questions if question["bboxes"])
+        print(f"  {task:<50} {counts[task]:>5} questions  {with_time:>5} with TIME  {with_bbox:>5} with BBOX")
+
+
+if __name__ == "__main__":
+    main()